@@ -6,17 +6,33 @@ Supports multiple simulation types:
   operating_point  - Single operating point analysis
   sweep_throttle   - Sweep throttle from 0-100%
   sweep_panel_power - Sweep panel power from 100-0%
+  sweep_map        - Sweep throttle against panel power on a grid
   voyage           - Multi-segment voyage simulation
+  voyage_ensemble  - Monte Carlo ensemble of the voyage
+  energy_neutral   - Throttle at zero battery current per panel power, and sustainable voyage cruise throttle
+  real_time        - Stream predictions for NDJSON telemetry from stdin or a local socket
+  transient        - Throttle step, motor inrush and cloud transient, waveforms memory-mapped to disk
 """
 
 import argparse
+import contextlib
 import json
+import os
+import socket
+import sys
 
 from .circuit_constructor import build_circuit_from_json
+from .dc_bus_solver import begin_closed_form_simulation
+from .energy_neutral import CRUISE_TARGET_SOC, start_energy_neutral
+from .operating_point_cache import Operating_Point_Cache
 from .pyspice_simulator import begin_simulation
-from .result_saver import save_to_file
-from .simulation_over_time import start_voyage
-from .simulation_sweeper import sweep_panel_power, sweep_throttle
+from .result_saver import DATA_FILE_NAME, save_to_file
+from .result_store import Result_Store
+from .simulation_over_time import VOYAGE_GRAPH, real_time_digital_simulation, start_voyage
+from .simulation_sweeper import (MAP_DATA_FILE_NAME, PANEL_POWER_GRAPH, SWEEP_INTERVAL_COUNT, THROTTLE_GRAPH,
+                                 sweep_map, sweep_panel_power, sweep_throttle)
+from .transient_simulation import TRANSIENT_FILE_NAME, start_transient, waveform_envelope
+from .voyage_ensemble import ENSEMBLE_FILE_NAME, start_voyage_ensemble
 
 def check_ngspice():
     try:
@@ -36,41 +52,86 @@ def main():
         description='Run electrical simulation for solar proa power system')
     parser.add_argument('--circuit', required=True,
                         help='Path to circuit setup JSON (e.g. constant/electrical/circuit_setup.json)')
-    parser.add_argument('--constants', required=True,
-                        help='Path to constants JSON (e.g. constant/electrical/constants.json)')
-    parser.add_argument('--components', required=True,
-                        help='Path to components JSON (e.g. constant/electrical/components.json)')
     parser.add_argument('--boat', required=True,
                         help='Boat name to select circuit configuration (e.g. rp1)')
     parser.add_argument('--boat-params', default=None,
                         help='Path to boat parameters JSON (e.g. constant/boat/rp2.json)')
-    parser.add_argument('--voyage', default=None,
-                        help='Path to voyage setup JSON (required for voyage simulation type)')
     parser.add_argument('--output', required=True,
                         help='Path to output artifact directory or file')
-    parser.add_argument('--simulation-type', required=True,
-                        choices=['operating_point', 'sweep_throttle', 'sweep_panel_power', 'voyage', 'all'],
+    add_simulation_arguments(parser)
+
+    args = parser.parse_args()
+
+    # The real-time mode streams its results on stdout, so all other output goes to stderr
+    stream = sys.stdout
+    with contextlib.redirect_stdout(sys.stderr) if args.simulation_type == 'real_time' else contextlib.nullcontext():
+        # Load constants from JSON
+        constants = json.load(open(args.constants))
+        components = json.load(open(args.components))
+        circuit_setup = load_circuit_setup(args.circuit, components, args.boat_params, args.reduced)
+        ngspice_available = check_ngspice() if args.solver == 'spice' or args.spice_check else False
+
+        if args.simulation_type == 'real_time':
+            run_real_time_simulation(args, circuit_setup, ngspice_available, args.output, constants, stream)
+        else:
+            run_simulation_type(args, circuit_setup, ngspice_available, args.output, constants)
+
+def add_simulation_arguments(parser, multiple=False):
+    """Options shared by the single boat entry point and the fleet runner (multiple takes several simulation types)."""
+    parser.add_argument('--constants', required=True,
+                        help='Path to constants JSON (e.g. constant/electrical/constants.json)')
+    parser.add_argument('--components', required=True,
+                        help='Path to components JSON (e.g. constant/electrical/components.json)')
+    parser.add_argument('--voyage', default=None,
+                        help='Path to voyage setup JSON (required for voyage and voyage_ensemble simulation types)')
+    parser.add_argument('--transient', default=None,
+                        help='Path to transient setup JSON (required for the transient simulation type)')
+    parser.add_argument('--simulation-type', required=True, nargs='+' if multiple else None,
+                        choices=['operating_point', 'sweep_throttle', 'sweep_panel_power', 'sweep_map', 'voyage', 'voyage_ensemble', 'energy_neutral', 'real_time', 'transient', 'all'],
                         help='Type of simulation to run')
     parser.add_argument('--verbose', action='store_true',
                         help='Enable simulation logging')
     parser.add_argument('--show-plot', action='store_true',
                         help='Display plots interactively')
+    parser.add_argument('--data-only', '--no-plot', dest='data_only', action='store_true',
+                        help='Only write the JSON/NPZ results, without importing matplotlib')
+    parser.add_argument('--plot-only', action='store_true',
+                        help='Only plot the results saved by an earlier (e.g. --data-only) run at the same --output')
+    parser.add_argument('--solver', default='spice', choices=['spice', 'closed_form'],
+                        help='Operating point solver (closed_form does not need NgSpice)')
+    parser.add_argument('--spice-check', action='store_true',
+                        help='Cross-check first, middle and last closed-form sweep points against NgSpice')
+    parser.add_argument('--adaptive-sweep', action='store_true',
+                        help='Sample throttle and panel power sweeps adaptively, refining around limit transitions')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of worker processes for NgSpice sweeps and voyage ensemble batches')
+    parser.add_argument('--integrator', default='fixed', choices=['fixed', 'adaptive'],
+                        help='Voyage time stepping (adaptive takes large steps and root-finds SOC and limit events)')
+    parser.add_argument('--cache', default='off', choices=['off', 'nearest', 'interpolate'],
+                        help='Cache voyage operating points on quantised SOC (interpolate blends the SOC neighbours)')
+    parser.add_argument('--reduced', action='store_true',
+                        help='Collapse identical parallel panel and battery strings into one equivalent string in the netlist')
+    parser.add_argument('--target-soc', type=float, default=CRUISE_TARGET_SOC,
+                        help='Lowest final SOC allowed for the energy_neutral cruise throttle')
+    parser.add_argument('--telemetry', default='-',
+                        help='real_time telemetry source: - for stdin/stdout, tcp:HOST:PORT or unix:PATH to serve a local socket')
 
-    args = parser.parse_args()
-
-    # Load constants from JSON
-    constants = json.load(open(args.constants))
-    components = json.load(open(args.components))
-    circuit_setup = json.load(open(args.circuit))
+def load_circuit_setup(circuit_loc, components, boat_params_loc=None, reduced=False):
+    """Circuit setup of one boat with its component specs and boat panel layout filled in."""
+    circuit_setup = json.load(open(circuit_loc))
     combine_config_setup(circuit_setup, components)
-    if args.boat_params:
-        boat_params = json.load(open(args.boat_params))
+    if boat_params_loc:
+        boat_params = json.load(open(boat_params_loc))
         apply_boat_panel_config(circuit_setup, boat_params)
-    ngspice_available = check_ngspice()
+    if reduced:
+        circuit_setup["reduced_topology"] = True
+    return circuit_setup
 
-    output_dir = args.output
+def run_simulation_type(args, circuit_setup, ngspice_available, output_dir, constants):
+    if args.plot_only:
+        plot_saved_results(args, output_dir, constants)
 
-    if args.simulation_type == 'all':
+    elif args.simulation_type == 'all':
         run_operating_point_simulation(args, circuit_setup, ngspice_available, output_dir, constants)
         run_sweep_throttle(args, circuit_setup, ngspice_available, output_dir, constants)
         run_sweep_panel_power(args, circuit_setup, ngspice_available, output_dir, constants)
@@ -85,19 +146,34 @@ def main():
     elif args.simulation_type == 'sweep_panel_power':
         run_sweep_panel_power(args, circuit_setup, ngspice_available, output_dir, constants)
 
+    elif args.simulation_type == 'sweep_map':
+        run_sweep_map(args, circuit_setup, ngspice_available, output_dir, constants)
+
     elif args.simulation_type == 'voyage':
         run_voyage_simulation(args, circuit_setup, ngspice_available, output_dir, constants)
 
+    elif args.simulation_type == 'voyage_ensemble':
+        run_voyage_ensemble(args, circuit_setup, ngspice_available, output_dir, constants)
+
+    elif args.simulation_type == 'energy_neutral':
+        run_energy_neutral(args, circuit_setup, ngspice_available, output_dir, constants)
+
+    elif args.simulation_type == 'transient':
+        run_transient_simulation(args, circuit_setup, ngspice_available, output_dir, constants)
+
 def run_operating_point_simulation(args, circuit_setup, ngspice_available, output_dir, constants):
-    circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, constants=constants)
-    analysis, result = begin_simulation(
-        circuit=circuit,
-        component_object=component_object, 
-        errors=errors,
-        ngspice_available=ngspice_available,
-        simulation_logging=args.verbose, show_errors=args.verbose,
-        show_warnings=args.verbose,
-        constants=constants)
+    if args.solver == 'closed_form':
+        analysis, result = begin_closed_form_simulation(circuit_setup, constants=constants)
+    else:
+        circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, constants=constants)
+        analysis, result = begin_simulation(
+            circuit=circuit,
+            component_object=component_object, 
+            errors=errors,
+            ngspice_available=ngspice_available,
+            simulation_logging=args.verbose, show_errors=args.verbose,
+            show_warnings=args.verbose,
+            constants=constants)
 
     save_to_file(result, save_path=output_dir + ".operating_point.json", constants=constants)
     print(f"✓ Operating point simulation complete: {output_dir}.operating_point.json")
@@ -110,7 +186,12 @@ def run_sweep_throttle(args, circuit_setup, ngspice_available, output_dir, const
         ngspice_available=ngspice_available,
         simulation_logging=args.verbose,
         save_output=True,
-        constants=constants) 
+        constants=constants,
+        solver=args.solver,
+        spice_check=spice_check_points(args),
+        workers=args.workers,
+        plot=not args.data_only,
+        adaptive=args.adaptive_sweep)
     print(f"✓ Sweep throttle simulation complete: {output_dir}.sweep_throttle")
     
 def run_sweep_panel_power(args, circuit_setup, ngspice_available, output_dir, constants):
@@ -120,18 +201,162 @@ def run_sweep_panel_power(args, circuit_setup, ngspice_available, output_dir, co
         ngspice_available=ngspice_available,
         simulation_logging=args.verbose,
         save_output=True,
-        constants=constants)   
+        constants=constants,
+        solver=args.solver,
+        spice_check=spice_check_points(args),
+        workers=args.workers,
+        plot=not args.data_only,
+        adaptive=args.adaptive_sweep)
     print(f"✓ Sweep panel power simulation complete: {output_dir}.sweep_panel_power")
 
+def run_sweep_map(args, circuit_setup, ngspice_available, output_dir, constants):
+    sweep_map(
+        circuit_setup=circuit_setup,
+        save_path=output_dir + ".sweep_map",
+        ngspice_available=ngspice_available,
+        simulation_logging=args.verbose,
+        save_output=True,
+        constants=constants,
+        solver=args.solver,
+        workers=args.workers,
+        show_plot=args.show_plot,
+        plot=not args.data_only)
+    print(f"✓ Sweep map simulation complete: {output_dir}.sweep_map")
+
 def run_voyage_simulation(args, circuit_setup, ngspice_available, output_dir, constants):
     start_voyage(
         circuit_setup=circuit_setup,
         voyage_config_loc=args.voyage,
         save_path=output_dir + ".voyage",
         ngspice_available=ngspice_available,
-        constants=constants) 
+        constants=constants,
+        solver=args.solver,
+        integrator=args.integrator,
+        cache=None if args.cache == 'off' else Operating_Point_Cache(interpolate=args.cache == 'interpolate'),
+        plot=not args.data_only)
     print(f"✓ Voyage simulation complete: {output_dir}.voyage")
 
+def run_voyage_ensemble(args, circuit_setup, ngspice_available, output_dir, constants):
+    start_voyage_ensemble(
+        circuit_setup=circuit_setup,
+        voyage_config_loc=args.voyage,
+        save_path=output_dir + ".voyage_ensemble",
+        ngspice_available=ngspice_available,
+        constants=constants,
+        solver=args.solver,
+        workers=args.workers,
+        show_plot=args.show_plot,
+        plot=not args.data_only)
+    print(f"✓ Voyage ensemble simulation complete: {output_dir}.voyage_ensemble")
+
+def run_energy_neutral(args, circuit_setup, ngspice_available, output_dir, constants):
+    start_energy_neutral(
+        circuit_setup=circuit_setup,
+        voyage_config_loc=args.voyage,
+        save_path=output_dir + ".energy_neutral",
+        ngspice_available=ngspice_available,
+        constants=constants,
+        solver=args.solver,
+        target_soc=args.target_soc,
+        integrator='adaptive')
+    print(f"✓ Energy neutral simulation complete: {output_dir}.energy_neutral")
+
+def run_transient_simulation(args, circuit_setup, ngspice_available, output_dir, constants):
+    start_transient(
+        circuit_setup=circuit_setup,
+        transient_config_loc=args.transient,
+        save_path=output_dir + ".transient",
+        ngspice_available=ngspice_available,
+        constants=constants,
+        solver=args.solver,
+        plot=not args.data_only,
+        show_plot=args.show_plot)
+    print(f"✓ Transient simulation complete: {output_dir}.transient")
+
+def run_real_time_simulation(args, circuit_setup, ngspice_available, output_dir, constants, stream):
+    cache = None if args.cache == 'off' else Operating_Point_Cache(interpolate=args.cache == 'interpolate')
+    summaries = []
+    try:
+        for input_stream, output_stream in telemetry_streams(args.telemetry, stream):
+            try:
+                summaries.append(real_time_digital_simulation(circuit_setup, ngspice_available, input_stream, output_stream,
+                                                              solver=args.solver, constants=constants, cache=cache))
+            except (BrokenPipeError, ConnectionResetError) as e:
+                # A client that goes away only ends its own connection
+                summaries.append({"error": f"Telemetry connection lost: {e}"})
+            print(f"{constants['BARF']}Real-time simulation: {summaries[-1]}{constants['BARE']}")
+    finally:
+        save_to_file(summaries, save_path=output_dir + ".real_time.json", constants=constants)
+
+def telemetry_streams(telemetry, stream):
+    """(input, output) text streams for the telemetry source; sockets yield one pair per connection until interrupted."""
+    if telemetry == '-':
+        yield sys.stdin, stream
+        return
+
+    kind, _, address = telemetry.partition(':')
+    if kind == 'tcp':
+        host, _, port = address.rpartition(':')
+        server = socket.create_server((host or '127.0.0.1', int(port)))
+    elif kind == 'unix':
+        if os.path.exists(address):
+            os.remove(address)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(address)
+        server.listen()
+    else:
+        raise ValueError(f"Unknown telemetry source {telemetry}, expected -, tcp:HOST:PORT or unix:PATH")
+
+    print(f"Waiting for telemetry on {telemetry}")
+    with server:
+        try:
+            while True:
+                connection, _ = server.accept()
+                try:
+                    with connection, connection.makefile('r') as reader, connection.makefile('w') as writer:
+                        yield reader, writer
+                except (BrokenPipeError, ConnectionResetError):
+                    # Output still buffered for a client that went away
+                    pass
+        except KeyboardInterrupt:
+            pass
+
+def plot_saved_results(args, output_dir, constants):
+    """Plot the data files a run of args.simulation_type wrote at output_dir, without simulating."""
+    import numpy as np
+    from .sweep_graph_generation import (generate_ensemble_graph, generate_graph, generate_map_graph,
+                                         generate_transient_graph)
+
+    simulation_types = ['sweep_throttle', 'sweep_panel_power', 'voyage'] if args.simulation_type == 'all' else [args.simulation_type]
+    graphs = {'sweep_throttle': THROTTLE_GRAPH, 'sweep_panel_power': PANEL_POWER_GRAPH, 'voyage': VOYAGE_GRAPH}
+    for simulation_type in simulation_types:
+        save_path = output_dir + "." + simulation_type
+        if simulation_type in graphs:
+            store = Result_Store.load(save_path + "." + DATA_FILE_NAME)
+            generate_graph(store, **graphs[simulation_type], save_path=save_path, show_plot=args.show_plot, constants=constants)
+        elif simulation_type == 'sweep_map':
+            data = dict(np.load(save_path + "." + MAP_DATA_FILE_NAME))
+            throttle_range, panel_power_range = data.pop("throttle"), data.pop("panel_power")
+            generate_map_graph(data, throttle_range, panel_power_range, save_path=save_path, show_plot=args.show_plot, constants=constants)
+        elif simulation_type == 'voyage_ensemble':
+            summary = json.load(open(save_path + "." + ENSEMBLE_FILE_NAME))
+            generate_ensemble_graph(summary, save_path=save_path, show_plot=args.show_plot)
+        elif simulation_type == 'transient':
+            results = json.load(open(save_path + "." + TRANSIENT_FILE_NAME))
+            waveforms = np.load(os.path.join(os.path.dirname(save_path), results["waveform_file"]), mmap_mode="r")
+            generate_transient_graph(waveform_envelope(waveforms), results["limits"], save_path=save_path,
+                                     show_plot=args.show_plot)
+        else:
+            continue
+        print(f"✓ Plotted saved {simulation_type} results: {save_path}")
+
+def spice_check_points(args):
+    """Sweep indices to cross-check against NgSpice: first, middle and last point (-1, so the 101-point
+    throttle sweep checks full throttle as the 100-point panel power sweep checks its last point)."""
+    if not args.spice_check or args.solver != 'closed_form':
+        return []
+    return [0, SWEEP_INTERVAL_COUNT // 2, -1]
+
 def combine_config_setup(circuit_config, component_config):
     if circuit_config.get("mppt_panel") is not None:
         for key, config in circuit_config["mppt_panel"].items():
@@ -168,7 +393,6 @@ def apply_boat_panel_config(circuit_config, boat_params):
         if "panel_info" in config:
             config["panel_info"]["in_series"] = in_series
             config["panel_info"]["in_parallel"] = in_parallel
-            print(config["panel_info"]["in_series"], config["panel_info"]["in_parallel"])
      
 if __name__ == "__main__":
     main()
\ No newline at end of file
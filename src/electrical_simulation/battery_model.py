@@ -0,0 +1,66 @@
+import json
+import numpy as np
+
+# Compiled models, one per battery config
+__models = {}
+
+# Table name in the battery config -> name of its value column
+TABLES = {"ocv_table": "voltage", "resistance_table": "resistance", "charge_taper_table": "fraction"}
+
+
+class Battery_Model:
+    """Open-circuit voltage, internal resistance and CC/CV charge taper of one battery unit against SOC.
+
+    The tables of the battery entry in components.json ("ocv_table", "resistance_table" and
+    "charge_taper_table", each a "soc" list and a value list) are compiled into NumPy arrays once
+    and evaluated with np.interp, so SOC may be a scalar or an array. Without tables the voltage is
+    linear between min_voltage and max_voltage (or the fixed battery_voltage), the resistance is 0
+    and the charge current is not tapered.
+    """
+    def __init__(self, battery_config: json):
+        self.min_voltage = battery_config.get("min_voltage")
+        self.max_voltage = battery_config.get("max_voltage")
+        self.battery_voltage = battery_config.get("battery_voltage")
+        self.tables = {name: self.__compile(name, battery_config[name])
+                       for name in TABLES if battery_config.get(name) is not None}
+
+    def open_circuit_voltage(self, soc):
+        if "ocv_table" in self.tables:
+            return self.__interpolate("ocv_table", soc)
+        if self.min_voltage is not None and self.max_voltage is not None:
+            return self.min_voltage + (self.max_voltage - self.min_voltage) * soc
+        return self.battery_voltage
+
+    def internal_resistance(self, soc):
+        """Series resistance of one battery unit in ohm."""
+        if "resistance_table" in self.tables:
+            return self.__interpolate("resistance_table", soc)
+        return 0.0 if np.ndim(soc) == 0 else np.zeros(np.shape(soc))
+
+    def taper_charge_current(self, max_charge_current, soc):
+        """Charge current the battery accepts: the full limit while constant-current, tapering in constant-voltage."""
+        if "charge_taper_table" in self.tables:
+            return max_charge_current * self.__interpolate("charge_taper_table", soc)
+        return max_charge_current
+
+    def __interpolate(self, name, soc):
+        soc_points, values = self.tables[name]
+        value = np.interp(soc, soc_points, values)
+        return float(value) if np.ndim(soc) == 0 else value
+
+    def __compile(self, name, table):
+        soc_points = np.asarray(table["soc"], dtype=float)
+        values = np.asarray(table[TABLES[name]], dtype=float)
+        if soc_points.shape != values.shape or soc_points.ndim != 1:
+            raise ValueError(f"Battery {name} needs equally long soc and {TABLES[name]} lists")
+        if np.any(np.diff(soc_points) <= 0):
+            raise ValueError(f"Battery {name} soc values must be increasing")
+        return soc_points, values
+
+
+def battery_model(battery_config: json):
+    """Compiled Battery_Model for battery_config, reused for every config with the same tables and voltages."""
+    key = json.dumps([battery_config.get(name) for name in ["min_voltage", "max_voltage", "battery_voltage", *TABLES]])
+    if key not in __models:
+        __models[key] = Battery_Model(battery_config)
+    return __models[key]
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Electrical simulation benchmarks.
+
+Times circuit construction, the operating point (NgSpice, or the closed-form solver without it),
+result parsing, result checking, a throttle sweep and a one-hour voyage for every boat and for
+synthetic panel arrays of growing in_series x in_parallel. Writes a time/peak-memory table as JSON
+and a scaling plot, and with --baseline flags cases that became slower.
+
+  python -m src.electrical_simulation.benchmark --constants constant/electrical/constants.json \\
+      --components constant/electrical/components.json --output artifact/electrical_benchmark \\
+      --baseline artifact/electrical_benchmark_baseline.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from copy import deepcopy
+
+from .__main__ import check_ngspice, load_circuit_setup
+from .circuit_constructor import build_circuit_from_json, evaluate_components
+from .dc_bus_solver import solve_dc_bus
+from .fleet import BOAT_PARAMS_DIR, CIRCUIT_DIR, CIRCUIT_FILE_NAME, fleet_boats
+from .parse_result import Bus_Analysis, parse_simulation_result
+from .pyspice_simulator import __simulate__, create_result
+from .result_checker import cross_check_result
+from .simulation_over_time import step_voyage_fixed
+from .simulation_sweeper import sweep_throttle
+
+BENCHMARK_FILE_NAME = "benchmark_results.json"
+BENCHMARK_IMG_FILE_NAME = "benchmark_scaling.png"
+BENCHMARK_MIN_TIME_S = 0.2          # each case is repeated until it has run this long
+BENCHMARK_MAX_REPEAT = 50
+REGRESSION_THRESHOLD = 0.25         # slower than the baseline by more than this fraction is a regression
+SYNTHETIC_BOAT = "rp2"              # boat whose panel arrays are resized for the scaling curves
+SYNTHETIC_SIZES = [(1, 1), (2, 2), (2, 4), (4, 4), (4, 8), (8, 8), (8, 16)]
+VOYAGE_SEGMENT = {"name": "Benchmark Hour", "duration_minutes": 60, "throttle": 0.5, "solar_power": 0.5}
+OPERATING_POINT = {"throttle_setting": 0.5, "panel_power_setting": 0.5, "current_soc": 0.5}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the electrical simulation')
+    parser.add_argument('--constants', required=True,
+                        help='Path to constants JSON (e.g. constant/electrical/constants.json)')
+    parser.add_argument('--components', required=True,
+                        help='Path to components JSON (e.g. constant/electrical/components.json)')
+    parser.add_argument('--boats', nargs='+', default=['all'],
+                        help='Boat names, or all for every boat in --circuit-dir')
+    parser.add_argument('--circuit-dir', default=CIRCUIT_DIR,
+                        help=f'Directory with one <boat>/{CIRCUIT_FILE_NAME} per boat')
+    parser.add_argument('--boat-params-dir', default=BOAT_PARAMS_DIR,
+                        help='Directory with <boat>.json boat parameters')
+    parser.add_argument('--output', required=True,
+                        help=f'Output path prefix, results go to <output>.{BENCHMARK_FILE_NAME}')
+    parser.add_argument('--solver', default='spice', choices=['spice', 'closed_form'],
+                        help='Solver for the operating point, sweep and voyage cases')
+    parser.add_argument('--no-synthetic', action='store_true',
+                        help='Skip the synthetic panel array scaling cases')
+    parser.add_argument('--baseline', default=None,
+                        help='Earlier benchmark JSON to compare against')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='Fraction a case may be slower than the baseline before it is flagged')
+    parser.add_argument('--no-plot', action='store_true',
+                        help='Do not draw the scaling plot')
+
+    args = parser.parse_args()
+    constants = json.load(open(args.constants))
+    components = json.load(open(args.components))
+    ngspice_available = check_ngspice() if args.solver == 'spice' else False
+
+    circuits = []
+    for boat in fleet_boats(args.boats, args.circuit_dir):
+        boat_params_loc = os.path.join(args.boat_params_dir, boat + ".json")
+        circuits.append((boat, load_circuit_setup(os.path.join(args.circuit_dir, boat, CIRCUIT_FILE_NAME), components,
+                                                  boat_params_loc if os.path.isfile(boat_params_loc) else None)))
+    if not args.no_synthetic:
+        base = load_circuit_setup(os.path.join(args.circuit_dir, SYNTHETIC_BOAT, CIRCUIT_FILE_NAME), components)
+        circuits += [(f"synthetic_{in_series}x{in_parallel}", synthetic_circuit(base, in_series, in_parallel))
+                     for in_series, in_parallel in SYNTHETIC_SIZES]
+
+    results = run_benchmarks(circuits, ngspice_available, args.solver, constants)
+    __print_table(results, constants)
+
+    save_file = args.output + "." + BENCHMARK_FILE_NAME
+    with open(save_file, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Benchmark results saved to {save_file}")
+
+    if not args.no_plot:
+        generate_benchmark_graph(results, save_path=args.output)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_benchmarks(json.load(f), results, args.threshold)
+        __print_regressions(regressions, args.threshold, constants)
+        sys.exit(1 if regressions else 0)
+
+def synthetic_circuit(circuit_setup: json, in_series: int, in_parallel: int):
+    """Copy of circuit_setup with every MPPT array resized to in_series x in_parallel panels."""
+    circuit_setup = deepcopy(circuit_setup)
+    for config in circuit_setup.get("mppt_panel", {}).values():
+        config["panel_info"]["in_series"] = in_series
+        config["panel_info"]["in_parallel"] = in_parallel
+    return circuit_setup
+
+def panel_count(circuit_setup: json):
+    return sum(config["count"] * config["panel_info"].get("in_series", 1) * config["panel_info"].get("in_parallel", 1)
+               for config in circuit_setup.get("mppt_panel", {}).values())
+
+def run_benchmarks(circuits: list, ngspice_available: bool, solver="spice", constants=None):
+    """Time every case for every (name, circuit_setup) and return the benchmark JSON."""
+    if solver == "spice" and not ngspice_available:
+        print("NgSpice is not available, benchmarking the closed_form solver instead.")
+        solver = "closed_form"
+    spice = solver == "spice"
+    entries = []
+    for name, circuit_setup in circuits:
+        for case, function in benchmark_cases(circuit_setup, spice, ngspice_available, solver, constants):
+            print(f"Benchmarking {case} on {name}...")
+            timing = measure(function)
+            entries.append(dict(case=case, circuit=name, panels=panel_count(circuit_setup), **timing))
+    return {
+        "info": {"date": datetime.datetime.now().isoformat(), "python": platform.python_version(),
+                 "platform": platform.platform(), "solver": solver},
+        "results": entries,
+    }
+
+def benchmark_cases(circuit_setup: json, spice: bool, ngspice_available: bool, solver: str, constants=None):
+    """(case name, function) pairs; each function starts from its own copy of circuit_setup."""
+    snapshot = deepcopy(circuit_setup)
+    meta_data = {"name": "benchmark", "date": datetime.datetime.now().isoformat()}
+
+    def build():
+        return build_circuit_from_json(deepcopy(snapshot), OPERATING_POINT, constants=constants)
+
+    if spice:
+        circuit, _, circuit_errors = build()
+
+    def operating_point():
+        if spice:
+            return __simulate__(circuit, meta_data, list(circuit_errors), ngspice_available, constants=constants)[0]
+        nodes, branches = solve_dc_bus(deepcopy(snapshot), OPERATING_POINT, constants=constants)
+        return Bus_Analysis({name: float(value) for name, value in nodes.items()},
+                            {name: float(value) for name, value in branches.items()})
+
+    # Parsing and checking are timed on one fixed analysis
+    analysis = operating_point()
+    component_object, errors = evaluate_components(deepcopy(snapshot), OPERATING_POINT, constants=constants)
+
+    def parse():
+        result, struc = create_result(meta_data, list(errors))
+        parse_simulation_result(analysis, result, struc, constants=constants)
+        return result
+    parsed = parse()
+
+    def check():
+        return cross_check_result(analysis, component_object, deepcopy(parsed), constants=constants)
+
+    def sweep():
+        return sweep_throttle(deepcopy(snapshot), None, ngspice_available, save_output=False, constants=constants,
+                              solver=solver, plot=False)
+
+    def voyage():
+        battery_info = snapshot['battery']
+        battery_capacity_Amin = battery_info['capacity_ah'] * battery_info['battery_in_parallel'] * 60
+        return step_voyage_fixed(deepcopy(snapshot), [VOYAGE_SEGMENT], OPERATING_POINT["current_soc"], battery_capacity_Amin,
+                                 ngspice_available, solver, constants)
+
+    return [("build_circuit_from_json", build),
+            ("__simulate__" if spice else "solve_dc_bus", operating_point),
+            ("parse_simulation_result", parse),
+            ("cross_check_result", check),
+            ("sweep_throttle", sweep),
+            ("voyage_1h", voyage)]
+
+def measure(function):
+    """First (cold) call time, median warm time and peak traced memory of one call."""
+    start = time.perf_counter()
+    function()
+    first = time.perf_counter() - start
+
+    times = []
+    while sum(times) < BENCHMARK_MIN_TIME_S and len(times) < BENCHMARK_MAX_REPEAT:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"first_ms": first * 1000, "time_ms": statistics.median(times) * 1000, "repeat": len(times),
+            "peak_kib": peak / 1024}
+
+def compare_benchmarks(baseline: json, current: json, threshold=REGRESSION_THRESHOLD):
+    """Cases whose median time grew by more than threshold relative to the baseline."""
+    before = {(entry["case"], entry["circuit"]): entry for entry in baseline["results"]}
+    regressions = []
+    for entry in current["results"]:
+        previous = before.get((entry["case"], entry["circuit"]))
+        if previous is None or previous["time_ms"] <= 0:
+            continue
+        ratio = entry["time_ms"] / previous["time_ms"]
+        if ratio > 1 + threshold:
+            regressions.append(dict(case=entry["case"], circuit=entry["circuit"], baseline_ms=previous["time_ms"],
+                                    time_ms=entry["time_ms"], ratio=ratio))
+    return regressions
+
+def generate_benchmark_graph(results: json, save_path: str = None, show_plot: bool = False):
+    """Median time against panel count for every case on the synthetic arrays, log-log."""
+    import matplotlib.pyplot as plt
+    fig, ax = plt.subplots(figsize=(10, 6))
+    cases = list(dict.fromkeys(entry["case"] for entry in results["results"]))
+    for case in cases:
+        points = sorted((entry["panels"], entry["time_ms"]) for entry in results["results"]
+                        if entry["case"] == case and entry["circuit"].startswith("synthetic_"))
+        if points:
+            ax.plot(*zip(*points), marker='o', label=case)
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel("Panels")
+    ax.set_ylabel("Median Time (ms)")
+    ax.set_title(f"Scaling ({results['info']['solver']})")
+    ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+    ax.grid(True, alpha=0.3, which='both')
+
+    if save_path:
+        save_file = save_path + "." + BENCHMARK_IMG_FILE_NAME
+        fig.savefig(save_file, dpi=150, bbox_inches='tight')
+        print(f"Graph saved to {save_file}")
+    if show_plot:
+        plt.show()
+    plt.close(fig)
+
+def __print_table(results, constants):
+    print(f"{constants['BARF']}Benchmark ({results['info']['solver']}){constants['BARE']}")
+    print(f"\t{'case':<26}{'circuit':<18}{'panels':>7}{'first ms':>11}{'median ms':>11}{'peak KiB':>11}")
+    for entry in results["results"]:
+        print(f"\t{entry['case']:<26}{entry['circuit']:<18}{entry['panels']:>7}"
+              f"{entry['first_ms']:>11.3f}{entry['time_ms']:>11.3f}{entry['peak_kib']:>11.1f}")
+
+def __print_regressions(regressions, threshold, constants):
+    if not regressions:
+        print(f"{constants['BARF']}No regressions beyond {threshold*100:.0f}%{constants['BARE']}")
+        return
+    print(f"{constants['BARF']}{len(regressions)} Regressions beyond {threshold*100:.0f}%{constants['BARE']}")
+    for entry in regressions:
+        print(f"\t{entry['case']} on {entry['circuit']}: {entry['baseline_ms']:.3f} ms -> {entry['time_ms']:.3f} ms "
+              f"({entry['ratio']:.2f}x)")
+
+if __name__ == "__main__":
+    main()
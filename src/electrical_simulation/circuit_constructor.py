@@ -12,9 +12,45 @@ from .components.mppt import MPPT
 from .components.solar_panel_array import Solar_Array
 
 
+def apply_modifications(circuit_setup: json, modifications: dict = {}):
+    """Write the swept settings into circuit_setup in place."""
+    input_data = circuit_setup
+    battery_config = input_data["battery"]
+    
+    if modifications.get('max_discharge_current') is not None:
+        battery_config['max_discharge_current'] = modifications['max_discharge_current']
+        
+    if modifications.get('max_charge_current') is not None:
+        battery_config['max_charge_current'] = modifications['max_charge_current']
+    
+    if modifications.get('current_soc') is not None:
+        battery_config['current_soc'] = modifications['current_soc']
+
+    mppt_array = input_data['mppt_panel']
+    for key in mppt_array.keys():
+        if not key.startswith("config_"):
+            continue
+        
+        config = mppt_array[key]
+        if modifications.get('panel_power_setting') is not None:
+            config['panel_info']['calculated_power'] = config['panel_info']['power'] * modifications['panel_power_setting']
+        else:
+            config['panel_info']['calculated_power'] = config['panel_info']['power'] * config['panel_info'].get('solar_power', 1.0)
+
+    for index, key in enumerate(input_data["load"].keys()):
+        if modifications.get('throttle_setting') is not None:
+            if type(modifications['throttle_setting']) == list:
+                input_data['load'][key]['throttle'] = modifications['throttle_setting'][index]
+            else:
+                input_data['load'][key]['throttle'] = modifications['throttle_setting']
+
+
 def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
-                            component_logging=False, show_components=False, show_netlist=False, constants=None):
+                            component_logging=False, show_components=False, show_netlist=False, constants=None,
+                            alterable=False):
     input_data = circuit_setup
+    apply_modifications(input_data, modifications)
+    reduced = input_data.get("reduced_topology", False)
 
     circuit = Circuit("Solar_Panel-Mppt-Battery-Motor Circuit Thingy")
     components = {
@@ -22,7 +58,8 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
         "battery": [],
         "load": [],
         "wire": [],
-        "mppt": []
+        "mppt": [],
+        "panel_scale": []
     }    
 
     component_object = {}
@@ -30,18 +67,9 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
     
     # Battery Array    
     battery_config = input_data["battery"]
-    
-    if modifications.get('max_discharge_current') is not None:
-        battery_config['max_discharge_current'] = modifications['max_discharge_current']
-        
-    if modifications.get('max_charge_current') is not None:
-        battery_config['max_charge_current'] = modifications['max_charge_current']
-    
-    if modifications.get('current_soc') is not None:
-        battery_config['current_soc'] = modifications['current_soc']
 
-    battery_array = Battery_Array(circuit, components, constants=constants, **battery_config)
-    err = battery_array.create_battery_array(log=component_logging)
+    battery_array = Battery_Array(circuit, components, constants=constants, reduced=reduced, **battery_config)
+    err = battery_array.create_battery_array(log=component_logging, alterable=alterable)
     
     component_object["battery_array"] = battery_array
     errors.append(err) if err else None
@@ -55,18 +83,13 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
         
         config = mppt_array[key]
         for _ in range(config['count']):
-            if modifications.get('panel_power_setting') is not None:
-                config['panel_info']['calculated_power'] = config['panel_info']['power'] * modifications['panel_power_setting']
-            else:
-                config['panel_info']['calculated_power'] = config['panel_info']['power'] * config['panel_info'].get('solar_power', 1.0)
-
             solar_array = Solar_Array(
-                circuit, components, constants=constants, **config['panel_info'])
+                circuit, components, constants=constants, reduced=reduced, **config['panel_info'])
             mppt = MPPT(circuit, components, constants=constants, **config['mppt_info'])
 
             solar_array.create_panels(mppt_index, log=component_logging)
             err = mppt.setup_mppt(mppt_index, solar_array,
-                                  battery_array, log=component_logging)
+                                  battery_array, log=component_logging, alterable=alterable)
             
             errors.append(err) if err else None
             component_object["mppt"] = component_object.get("mppt", []) + [mppt]
@@ -83,12 +106,6 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
     load_arr = []
     for key in input_data["load"].keys():
         load_name = f"arr{index}_load_{input_data['load'][key]['choice']}"
-
-        if modifications.get('throttle_setting') is not None:
-            if type(modifications['throttle_setting']) == list:
-                input_data['load'][key]['throttle'] = modifications['throttle_setting'][index]
-            else:
-                input_data['load'][key]['throttle'] = modifications['throttle_setting']
         
         #NEW
         load = Load(circuit, components, load_name=load_name, constants=constants, **input_data['load'][key])
@@ -107,7 +124,7 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
     
     #NEW
     load_array = Load_Array(circuit, components, constants, load_arr)
-    err = load_array.setup_loads(battery_array)
+    err = load_array.setup_loads(battery_array, alterable=alterable)
     component_object["l_array"] = load_array
     errors.append(err) if err else None
     #END NEW
@@ -117,7 +134,7 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
         
     # Load Balancer (One is enough to restrict battery output)
     load_balancer = Load_Balancer(circuit, components, constants=constants)
-    err = load_balancer.balance_loads(battery_array)
+    err = load_balancer.balance_loads(battery_array, alterable=alterable)
     
     component_object["load_balancer"] = load_balancer
     errors.append(err) if err else None
@@ -130,6 +147,67 @@ def build_circuit_from_json(circuit_setup: json, modifications: dict = {},
     return circuit, component_object, errors
 
 
+def evaluate_components(circuit_setup: json, modifications: dict = {}, constants=None):
+    """Calculate component values and setup errors without building a PySpice circuit.
+    Matches the component_object and errors of build_circuit_from_json for the same modifications."""
+    input_data = circuit_setup
+    apply_modifications(input_data, modifications)
+    reduced = input_data.get("reduced_topology", False)
+
+    components = {
+        "panel": [],
+        "battery": [],
+        "load": [],
+        "wire": [],
+        "mppt": [],
+        "panel_scale": []
+    }
+    component_object = {}
+    errors = []
+
+    battery_array = Battery_Array(None, components, constants=constants, reduced=reduced, **input_data["battery"])
+    component_object["battery_array"] = battery_array
+
+    mppt_array = input_data['mppt_panel']
+    mppt_index = 0
+    for key in mppt_array.keys():
+        if not key.startswith("config_"):
+            continue
+        
+        config = mppt_array[key]
+        for _ in range(config['count']):
+            solar_array = Solar_Array(None, components, constants=constants, reduced=reduced, **config['panel_info'])
+            solar_array.array_number = mppt_index
+            mppt = MPPT(None, components, constants=constants, **config['mppt_info'])
+            err = mppt.configure_mppt(mppt_index, solar_array, battery_array)
+
+            errors.append(err) if err else None
+            component_object["mppt"] = component_object.get("mppt", []) + [mppt]
+            component_object["solar_array"] = component_object.get("solar_array", []) + [solar_array]
+            mppt_index += 1
+
+    load_arr = []
+    for index, key in enumerate(input_data["load"].keys()):
+        load_name = f"arr{index}_load_{input_data['load'][key]['choice']}"
+        load_arr.append(Load(None, components, load_name=load_name, constants=constants, **input_data['load'][key]))
+    component_object["load"] = load_arr
+
+    return component_object, errors
+
+
+def get_alterations(component_object):
+    """Collect the alterable device values of every component, keyed by NgSpice device name."""
+    battery_array = component_object["battery_array"]
+    alterations = battery_array.get_alterations()
+    for solar_array in component_object.get("solar_array", []):
+        alterations.update(solar_array.get_alterations())
+    for mppt in component_object.get("mppt", []):
+        alterations.update(mppt.get_alterations())
+    for load in component_object.get("load", []):
+        alterations.update(load.get_alterations(battery_array))
+    return alterations
+
+
 def display_components(components):
     print("\nComponents in Circuit:")
     for comp_type, comp_list in components.items():
@@ -1,3 +1,4 @@
+from ..battery_model import battery_model
 
 class Battery_Array:
     def __init__(self, circuit, components, constants=None, **kwargs):
@@ -6,22 +7,26 @@ class Battery_Array:
         self.BATTERY_IN_SERIES = kwargs.get("battery_in_series")
         
         self.SOC = kwargs.get("current_soc", 1.0)
-        if kwargs.get("min_voltage") is not None and kwargs.get("max_voltage") is not None:
-            self.BATTERY_VOLTAGE = self.__estimate_battery_voltage(self.SOC, kwargs.get("min_voltage"), kwargs.get("max_voltage"))
-        else:
-            self.BATTERY_VOLTAGE = kwargs.get("battery_voltage")
+        # OCV, internal resistance and charge taper from the chemistry tables (linear voltage without them)
+        self.MODEL = battery_model(kwargs)
+        self.BATTERY_VOLTAGE = self.MODEL.open_circuit_voltage(self.SOC)
+        self.BATTERY_INTERNAL_R = self.MODEL.internal_resistance(self.SOC)
         #print("Estimated Battery Voltage:", self.BATTERY_VOLTAGE, "SOC:", self.SOC)
             
-        self.BATTERY_MAX_CHARGE_CURRENT = kwargs.get("max_charge_current")
+        self.BATTERY_MAX_CHARGE_CURRENT = self.MODEL.taper_charge_current(kwargs.get("max_charge_current"), self.SOC)
         self.BATTERY_MAX_DISCHARGE_CURRENT = kwargs.get("max_discharge_current")
         self.terminal = None
         self.terminal_id = None
         self.components = components
         self.constants = constants
+        # Collapse identical parallel strings into one with scaled resistances (see get_string_count)
+        self.REDUCED = kwargs.get("reduced", False)
     
     # Battery types should not be mixed, hence no array_number parameter
-    def create_battery_array(self, log=False):
-        for p in range(self.BATTERY_IN_PARALLEL):
+    def create_battery_array(self, log=False, alterable=False):
+        strings = self.get_string_count()
+        scale = self.BATTERY_IN_PARALLEL // strings
+        for p in range(strings):
             battery_row = []
             for s in range(self.BATTERY_IN_SERIES):
                 battery_name = f"p{p}_s{s}_battery"
@@ -31,11 +36,12 @@ class Battery_Array:
                 battery_neg = f"{battery_name}_negative"
                 
                 self.circuit.V(battery_name, battery_pos, battery_neg, self.BATTERY_VOLTAGE)
+                # The internal resistance of each battery sits in its grounding/interconnect resistor
                 if s == 0:
-                    self.circuit.R(f"{battery_name}_grounding", battery_neg, self.circuit.gnd, self.constants["GROUNDING_RESISTANCE"])
+                    self.circuit.R(f"{battery_name}_grounding", battery_neg, self.circuit.gnd, self.get_series_resistance(s) / scale)
                 else:
                     prev_battery_name = f"p{p}_s{s-1}_battery"
-                    self.circuit.R(f"{battery_name}_internal", battery_neg, f"{prev_battery_name}_positive", self.constants["WIRE_RESISTANCE"])
+                    self.circuit.R(f"{battery_name}_internal", battery_neg, f"{prev_battery_name}_positive", self.get_series_resistance(s) / scale)
                 
             self.components["battery"].append(battery_row)
         
@@ -44,7 +50,7 @@ class Battery_Array:
             battery_row_end = row[-1]
             positive_node = f"{battery_row_end}_positive"
             battery_wire = f"battery_wire_{index}"
-            self.circuit.R(battery_wire, positive_node, "battery_input_measured", self.constants["WIRE_RESISTANCE"])  
+            self.circuit.R(battery_wire, positive_node, "battery_input_measured", self.constants["WIRE_RESISTANCE"] / scale)  
             self.components["wire"].append(battery_wire)
             
         self.terminal_id = "total_battery_input_current"
@@ -54,6 +60,11 @@ class Battery_Array:
                        self.terminal, "battery_input_measured",
                        self.constants["GROUNDING_RESISTANCE"])
         
+        # Charge/discharge limits as control voltages so NgSpice can alter them in place
+        if alterable:
+            self.circuit.V("charge_limit_control", "charge_limit_control", self.circuit.gnd, self.get_charge_limit())
+            self.circuit.V("discharge_limit_control", "discharge_limit_control", self.circuit.gnd, self.get_discharge_limit())
+        
         if log:
             print(self)        
 
@@ -75,12 +86,31 @@ class Battery_Array:
     def get_charge_limit(self):
         return self.BATTERY_IN_PARALLEL * self.BATTERY_MAX_CHARGE_CURRENT
     
+    def get_series_resistance(self, s):
+        """Resistance below battery s of a string: grounding or interconnect wire plus the internal resistance."""
+        base = self.constants["GROUNDING_RESISTANCE"] if s == 0 else self.constants["WIRE_RESISTANCE"]
+        return base + self.BATTERY_INTERNAL_R
+    
+    def get_string_count(self):
+        """Parallel strings in the netlist: one equivalent string when reduced."""
+        return 1 if self.REDUCED else self.BATTERY_IN_PARALLEL
+    
     def get_total_voltage(self):
         return self.BATTERY_IN_SERIES * self.BATTERY_VOLTAGE   
-        
-    def __estimate_battery_voltage(self, soc, min_voltage, max_voltage):
-        """Simple linear estimation"""
-        return min_voltage + (max_voltage - min_voltage) * soc
+    
+    def get_alterations(self):
+        """Device values that change with SOC and limits, for an alterable circuit."""
+        alterations = {
+            "vcharge_limit_control": ("dc", self.get_charge_limit()),
+            "vdischarge_limit_control": ("dc", self.get_discharge_limit()),
+        }
+        scale = self.BATTERY_IN_PARALLEL // self.get_string_count()
+        for p in range(self.get_string_count()):
+            for s in range(self.BATTERY_IN_SERIES):
+                alterations[f"vp{p}_s{s}_battery"] = ("dc", self.BATTERY_VOLTAGE)
+                resistor = f"rp{p}_s{s}_battery_grounding" if s == 0 else f"rp{p}_s{s}_battery_internal"
+                alterations[resistor] = ("resistance", self.get_series_resistance(s) / scale)
+        return alterations
 
     def __str__(self):
         return f"""
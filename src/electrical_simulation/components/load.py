@@ -20,6 +20,13 @@ class Load:
     def throttle_setting(self):
         return self.throttle
     
+    def current_demand(self, battery_array):
+        return self.MOTOR_POWER_DEMAND / battery_array.get_total_voltage() if self.MOTOR_POWER_DEMAND > 0 else 0
+    
+    def get_alterations(self, battery_array):
+        """Device values that change with throttle and SOC, for an alterable circuit."""
+        return {f"i{self.load_name}_demand": ("dc", self.current_demand(battery_array))}
+    
     def __str__(self):
         current = self.MOTOR_POWER_DEMAND / self.MOTOR_VOLTAGE if self.MOTOR_VOLTAGE > 0 else 0
         return f"""
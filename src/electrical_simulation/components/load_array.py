@@ -27,7 +27,7 @@ class Load_Array():
             self.circuit.V(f"{load_name}", load_node, load_measured, 1e-06)
             self.circuit.R(f"{load_name}_gnd", load_measured, self.circuit.gnd, 1e9)
     
-    def setup_loads(self, battery_array: Battery_Array):
+    def setup_loads(self, battery_array: Battery_Array, alterable=False):
         """Connect the power source to the single wire created in create_array.
         Restricts individual load currents if battery discharge limit is exceeded."""
         POWER_SOURCE = battery_array.get_terminal()
@@ -40,7 +40,18 @@ class Load_Array():
         # proportionally when total battery discharge current exceeds the limit
         for load in self.load_list:
             load_name = load.name()
-            motor_current_demand = load.MOTOR_POWER_DEMAND / battery_array.get_total_voltage() if load.MOTOR_POWER_DEMAND > 0 else 0
+            motor_current_demand = load.current_demand(battery_array)
+
+            if alterable:
+                # Demand as an independent source, clamp reads the limit from the battery control node
+                self.circuit.I(f"{load_name}_demand", f"{load_name}_measured", self.circuit.gnd, motor_current_demand)
+                self.circuit.raw_spice += (
+                    f"B{load_name}_limit {load_name}_measured 0 "
+                    f"I = I(V{POWER_SOURCE_ID})<-V(discharge_limit_control) ? "
+                    f"(I(V{POWER_SOURCE_ID})+V(discharge_limit_control))*{RAWSPICE_ITERATIONS} "
+                    f": 0\n"
+                )
+                continue
 
             self.circuit.raw_spice += (
                 f"B{load_name}_limit {load_name}_measured 0 "
@@ -8,7 +8,7 @@ class Load_Balancer:
         self.components = components
         self.constants = constants
         
-    def balance_loads(self, battery_array: Battery_Array):
+    def balance_loads(self, battery_array: Battery_Array, alterable=False):
         # Balancing load to limit battery charge current
         # Note: No idea how did this worked. PySpice might have allowed cyclical calculation such that:
         # I(Vbattery_input_current)-{BATTERY_MAX_CHARGE_CURRENT} repeats until it tends to the max charge current 
@@ -18,6 +18,8 @@ class Load_Balancer:
         BATTERY_MAX_CHARGE_CURRENT = battery_array.get_charge_limit()
         
         self.circuit.V("balancing_load", POWER_SOURCE, "balancing_load", self.constants["GROUNDING_RESISTANCE"]) 
+        if alterable:
+            BATTERY_MAX_CHARGE_CURRENT = "V(charge_limit_control)"
         self.circuit.raw_spice += f"Bbalancing_load balancing_load 0 I = I(V{POWER_SOURCE_ID})>{BATTERY_MAX_CHARGE_CURRENT} ? (I(V{POWER_SOURCE_ID})-{BATTERY_MAX_CHARGE_CURRENT})*{RAWSPICE_ITERATIONS} : 0\n"
         
         return None
\ No newline at end of file
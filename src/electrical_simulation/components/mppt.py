@@ -18,25 +18,46 @@ class MPPT:
         self.components = components
         self.terminal = None
         self.MPPT_OUTPUT_VOLTAGE = None
+        self.MPPT_OUTPUT_CURRENT = None
+        self.MPPT_REGULATED_CURRENT = None
         self.array_number = None
     
-    def setup_mppt(self, array_number, solar_array: Solar_Array, battery_array: Battery_Array, log=False):
+    def configure_mppt(self, array_number, solar_array: Solar_Array, battery_array: Battery_Array):
+        """Calculate the regulated output for the given arrays without adding circuit elements."""
+        self.array_number = array_number
         self.MPPT_INPUT_VOLTAGE = solar_array.get_total_voltage()
         self.MPPT_INPUT_CURRENT = solar_array.get_total_current()
         MPPT_MAX_INPUT_POWER = self.MPPT_INPUT_VOLTAGE * self.MPPT_INPUT_CURRENT
-        MPPT_INPUT_RESISTANCE = self.MPPT_INPUT_VOLTAGE / self.MPPT_INPUT_CURRENT if self.MPPT_INPUT_CURRENT > 0 else 0
+        self.MPPT_INPUT_RESISTANCE = self.MPPT_INPUT_VOLTAGE / self.MPPT_INPUT_CURRENT if self.MPPT_INPUT_CURRENT > 0 else 0
         
         self.MPPT_OUTPUT_VOLTAGE = battery_array.get_total_voltage() + self.MPPT_OUTPUT_BUFFER_VOLTAGE
-        MPPT_OUTPUT_POWER = MPPT_MAX_INPUT_POWER * self.MPPT_EFFICIENCY
-        MPPT_OUTPUT_CURRENT = (MPPT_OUTPUT_POWER / self.MPPT_OUTPUT_VOLTAGE) if self.MPPT_OUTPUT_VOLTAGE > 0 else 0
+        self.MPPT_OUTPUT_POWER = MPPT_MAX_INPUT_POWER * self.MPPT_EFFICIENCY
+        self.MPPT_OUTPUT_CURRENT = (self.MPPT_OUTPUT_POWER / self.MPPT_OUTPUT_VOLTAGE) if self.MPPT_OUTPUT_VOLTAGE > 0 else 0
+        self.MPPT_REGULATED_CURRENT = min(self.MPPT_MAX_OUTPUT_CURRENT, self.MPPT_OUTPUT_CURRENT)
+        
+        if abs(battery_array.get_total_voltage() - self.MPPT_MAX_OUTPUT_VOLTAGE) > self.MPPT_OUTPUT_BUFFER_VOLTAGE:
+            return f"Mismatch between battery voltage ({battery_array.get_total_voltage()} V) and MPPT max output voltage ({self.MPPT_MAX_OUTPUT_VOLTAGE} V) exceeds tolerance of {self.MPPT_OUTPUT_BUFFER_VOLTAGE} V"
+        if self.MPPT_INPUT_VOLTAGE > self.MPPT_MAX_INPUT_VOLTAGE:
+            return f"(Array {array_number}) Panel input voltage ({self.MPPT_INPUT_VOLTAGE} V) exceeds max MPPT input voltage ({self.MPPT_MAX_INPUT_VOLTAGE} V)"
+        if self.MPPT_INPUT_CURRENT > self.MPPT_MAX_INPUT_CURRENT:
+            return f"(Array {array_number}) Panel input current ({self.MPPT_INPUT_CURRENT} A) exceeds max MPPT input current ({self.MPPT_MAX_INPUT_CURRENT} A)"
+        else:
+            return None
+    
+    def setup_mppt(self, array_number, solar_array: Solar_Array, battery_array: Battery_Array, log=False, alterable=False):
+        err = self.configure_mppt(array_number, solar_array, battery_array)
 
         SOLAR_POWER_RAIL = solar_array.get_terminal()
         self.circuit.R(f"arr{array_number}_mppt_input_load", 
                  f"{SOLAR_POWER_RAIL}", self.circuit.gnd, 
-                 MPPT_INPUT_RESISTANCE)
+                 self.MPPT_INPUT_RESISTANCE)
 
         # Regulate output current to calculated amount
-        self.circuit.raw_spice += f"""Barr{array_number}_mppt_current_reg 0 arr{array_number}_mppt_output I = min({self.MPPT_MAX_OUTPUT_CURRENT}, {MPPT_OUTPUT_CURRENT})\n"""
+        if alterable:
+            # min() is already resolved, so an independent source gives the same current and can be altered
+            self.circuit.I(f"arr{array_number}_mppt_current_reg", self.circuit.gnd, f"arr{array_number}_mppt_output", self.MPPT_REGULATED_CURRENT)
+        else:
+            self.circuit.raw_spice += f"""Barr{array_number}_mppt_current_reg 0 arr{array_number}_mppt_output I = min({self.MPPT_MAX_OUTPUT_CURRENT}, {self.MPPT_OUTPUT_CURRENT})\n"""
         
         self.circuit.V(f"arr{array_number}_mppt_output", f"arr{array_number}_mppt_output", f"arr{array_number}_mppt_output_measured", self.constants["GROUNDING_RESISTANCE"])
         
@@ -47,18 +68,17 @@ class MPPT:
 
         self.components["mppt"].append(f"arr{array_number}_mppt_current_reg")
         self.components["wire"].append(f"arr{array_number}_mppt_out_wire")
-        self.array_number = array_number
         if log:
             print(self)
             
-        if abs(battery_array.get_total_voltage() - self.MPPT_MAX_OUTPUT_VOLTAGE) > self.MPPT_OUTPUT_BUFFER_VOLTAGE:
-            return f"Mismatch between battery voltage ({battery_array.get_total_voltage()} V) and MPPT max output voltage ({self.MPPT_MAX_OUTPUT_VOLTAGE} V) exceeds tolerance of {self.MPPT_OUTPUT_BUFFER_VOLTAGE} V"
-        if self.MPPT_INPUT_VOLTAGE > self.MPPT_MAX_INPUT_VOLTAGE:
-            return f"(Array {array_number}) Panel input voltage ({self.MPPT_INPUT_VOLTAGE} V) exceeds max MPPT input voltage ({self.MPPT_MAX_INPUT_VOLTAGE} V)"
-        if self.MPPT_INPUT_CURRENT > self.MPPT_MAX_INPUT_CURRENT:
-            return f"(Array {array_number}) Panel input current ({self.MPPT_INPUT_CURRENT} A) exceeds max MPPT input current ({self.MPPT_MAX_INPUT_CURRENT} A)"
-        else:
-            return None
+        return err
+    
+    def get_alterations(self):
+        """Device values that change with panel power and SOC, for an alterable circuit."""
+        return {
+            f"rarr{self.array_number}_mppt_input_load": ("resistance", self.MPPT_INPUT_RESISTANCE),
+            f"iarr{self.array_number}_mppt_current_reg": ("dc", self.MPPT_REGULATED_CURRENT),
+        }
     
     def get_terminal(self):
         if self.terminal is None:
@@ -13,37 +13,43 @@ class Solar_Array:
         self.terminal = None
         self.components = components
         self.array_number = None
+        # Collapse identical parallel strings into one with scaled sources (see get_string_count)
+        self.REDUCED = kwargs.get("reduced", False)
 
     # Current source: Return terminal name only
     def create_panels(self, array_number, log=False):
         self.array_number = array_number
-        for p in range(self.PANEL_IN_PARALLEL):
+        strings = self.get_string_count()
+        for p in range(strings):
             panel_row = []
             for s in range(self.PANEL_IN_SERIES):
                 panel_name = f"arr{array_number}_p{p}_{s}_panel"
+                scale = self.__string_scale(s)
                 panel_row.append(panel_name)
                 
                 panel_pos = f"{panel_name}_positive"
                 panel_neg = f"{panel_name}_negative"
                 
                 # Current source: neg -> pos
-                self.circuit.I(panel_name, panel_neg, panel_pos, self.PANEL_CURRENT)
+                self.circuit.I(panel_name, panel_neg, panel_pos, self.PANEL_CURRENT * scale)
                 
                 # Ground all panel, else panel can only deliver voltage by a factor of 40 for some reason
-                self.circuit.R(f"{panel_name}_leak_to_gnd", panel_neg, self.circuit.gnd, self.constants["GROUNDING_RESISTANCE"])
+                self.circuit.R(f"{panel_name}_leak_to_gnd", panel_neg, self.circuit.gnd, self.constants["GROUNDING_RESISTANCE"] / scale)
 
                 if s != 0:
                     prev_panel_name = f"arr{array_number}_p{p}_s{s-1}_panel"
                     # Internal resistance
-                    self.circuit.R(f"{panel_name}_internal", panel_neg, f"{prev_panel_name}_positive", self.PANEL_INTERNAL_R)
+                    self.circuit.R(f"{panel_name}_internal", panel_neg, f"{prev_panel_name}_positive", self.PANEL_INTERNAL_R / scale)
 
             self.components["panel"].append(panel_row)
+            self.components["panel_scale"].append(self.PANEL_IN_PARALLEL // strings)
         
         for index, row in enumerate(self.components["panel"]):
             solar_row_end = row[-1]
             positive_node = f"{solar_row_end}_positive"
             panel_wire = f"arr{array_number}_panel_wire_{index}"
-            self.circuit.R(panel_wire, positive_node, f"arr{array_number}_solar_array_output", self.constants["WIRE_RESISTANCE"])
+            self.circuit.R(panel_wire, positive_node, f"arr{array_number}_solar_array_output",
+                           self.constants["WIRE_RESISTANCE"] / self.components["panel_scale"][index])
             self.components["wire"].append(panel_wire)
             # Small resistance to model wiring losses
         
@@ -71,6 +77,28 @@ class Solar_Array:
     def get_total_current(self):
         return self.PANEL_ARRAY_TOTAL_CURRENT
     
+    def get_string_count(self):
+        """Parallel strings in the netlist: one equivalent string when reduced."""
+        return 1 if self.REDUCED else self.PANEL_IN_PARALLEL
+    
+    def get_alterations(self):
+        """Device values that change with panel power, for an alterable circuit."""
+        alterations = {}
+        for p in range(self.get_string_count()):
+            for s in range(self.PANEL_IN_SERIES):
+                panel_name = f"arr{self.array_number}_p{p}_{s}_panel"
+                scale = self.__string_scale(s)
+                alterations[f"i{panel_name}"] = ("dc", self.PANEL_CURRENT * scale)
+                if s != 0:
+                    alterations[f"r{panel_name}_internal"] = ("resistance", self.PANEL_INTERNAL_R / scale)
+        return alterations
+    
+    def __string_scale(self, s):
+        # Only the last panel of a string reaches the array output, the others are left as they are
+        if s != self.PANEL_IN_SERIES - 1:
+            return 1
+        return self.PANEL_IN_PARALLEL // self.get_string_count()
+    
     def __str__(self):
         return f"""\
 {self.constants['BARF']}Solar Array Setup {self.array_number + 1}{self.constants['BARE']}
@@ -0,0 +1,310 @@
+import datetime
+import json
+
+import numpy as np
+
+from .battery_model import battery_model
+from .circuit_constructor import build_circuit_from_json, evaluate_components
+from .components.load_array import RAWSPICE_ITERATIONS
+from .parse_result import Bus_Analysis, parse_simulation_result
+from .pyspice_simulator import begin_simulation, create_result
+from .result_checker import cross_check_result
+
+# Mirrors the fixed resistor from each load probe to ground in Load_Array
+LOAD_GROUND_RESISTANCE = 1e9
+
+CIRCUIT_TITLE = "Solar_Panel-Mppt-Battery-Motor Circuit Thingy"
+
+
+def solve_dc_bus(circuit_setup: json, modifications: dict = {}, constants=None):
+    """Closed-form operating point of the circuit built by build_circuit_from_json.
+
+    Modification values may be numpy arrays; they are broadcast together and every node voltage
+    and branch current is returned as an array of the broadcast shape. Names match the lower-case
+    NgSpice vectors (branches keep the 'v' prefix). Panel terminals that are only tied to their own
+    current source are floating in the netlist and have no defined voltage, so they are left out.
+    Does not modify circuit_setup.
+    """
+    GROUNDING_RESISTANCE = constants["GROUNDING_RESISTANCE"]
+    WIRE_RESISTANCE = constants["WIRE_RESISTANCE"]
+
+    # Battery (Battery_Array)
+    battery = circuit_setup["battery"]
+    soc = __setting(modifications, 'current_soc', battery.get("current_soc", 1.0))
+    model = battery_model(battery)
+    cell_voltage = np.asarray(model.open_circuit_voltage(soc), dtype=float)
+    internal_resistance = model.internal_resistance(soc)
+    in_series = battery["battery_in_series"]
+    in_parallel = battery["battery_in_parallel"]
+    charge_limit = in_parallel * model.taper_charge_current(
+        __setting(modifications, 'max_charge_current', battery["max_charge_current"]), soc)
+    discharge_limit = in_parallel * __setting(modifications, 'max_discharge_current', battery["max_discharge_current"])
+    battery_total_voltage = in_series * cell_voltage
+
+    # Solar arrays and MPPTs (Solar_Array, MPPT)
+    arrays = []
+    for key, config in circuit_setup['mppt_panel'].items():
+        if not key.startswith("config_"):
+            continue
+        panel = config['panel_info']
+        mppt = config['mppt_info']
+        setting = __setting(modifications, 'panel_power_setting', panel.get('solar_power', 1.0))
+        panel_current = np.maximum(constants["EPSILON"], panel['power'] * setting / panel['voltage'])
+        array_voltage = panel['in_series'] * panel['voltage']
+        array_current = panel['in_parallel'] * panel_current
+        output_voltage = battery_total_voltage + constants["MPPT_BATTERY_VOLTAGE_BUFFER"]
+        output_current = np.where(output_voltage > 0, array_voltage * array_current * mppt['efficiency'] / output_voltage, 0)
+        for _ in range(config['count']):
+            arrays.append({
+                "in_series": panel['in_series'],
+                "in_parallel": panel['in_parallel'],
+                "panel_current": panel_current,
+                "input_resistance": array_voltage / array_current,
+                "regulated_current": np.minimum(mppt['max_output_current'], output_current),
+            })
+
+    # Loads (Load, Load_Array)
+    loads = []
+    for index, (key, load) in enumerate(circuit_setup["load"].items()):
+        throttle = modifications.get('throttle_setting')
+        if throttle is None:
+            throttle = load.get("throttle", 1.0)
+        elif type(throttle) == list:
+            throttle = throttle[index]
+        throttle = np.asarray(throttle, dtype=float)
+        power_demand = np.where(throttle > 0.0, load["total_power"] * throttle, GROUNDING_RESISTANCE)
+        loads.append({
+            "name": f"arr{index}_load_{load['choice']}".lower(),
+            "demand": np.where(power_demand > 0, power_demand / battery_total_voltage, 0),
+        })
+
+    shape = np.broadcast(cell_voltage, charge_limit, discharge_limit,
+                         *[array["panel_current"] for array in arrays],
+                         *[load["demand"] for load in loads]).shape
+    mppt_total = sum((np.broadcast_to(array["regulated_current"], shape) for array in arrays), np.zeros(shape))
+    demand_total = sum((np.broadcast_to(load["demand"], shape) for load in loads), np.zeros(shape))
+
+    # Battery string resistance seen from the bus, per parallel string
+    string_resistance = GROUNDING_RESISTANCE + in_series * WIRE_RESISTANCE + in_series * internal_resistance
+
+    # DC bus: the clamps are linear on each side of the limits, the probe leak is fed back once
+    leak_total = np.zeros(shape)
+    for _ in range(2):
+        available = mppt_total - demand_total - leak_total
+        charging = available > charge_limit
+        discharging = (available < -discharge_limit) & (len(loads) > 0)
+        battery_current = np.where(charging,
+                                   (available + RAWSPICE_ITERATIONS * charge_limit) / (1 + RAWSPICE_ITERATIONS),
+                                   available)
+        clamp_gain = len(loads) * RAWSPICE_ITERATIONS
+        battery_current = np.where(discharging,
+                                   (available - clamp_gain * discharge_limit) / (1 + clamp_gain),
+                                   battery_current)
+        balancing_current = np.where(charging, (battery_current - charge_limit) * RAWSPICE_ITERATIONS, 0.0)
+        clamp_current = np.where(discharging, (battery_current + discharge_limit) * RAWSPICE_ITERATIONS, 0.0)
+
+        string_current = battery_current / in_parallel
+        bus_voltage = battery_total_voltage + string_current * string_resistance + GROUNDING_RESISTANCE
+
+        load_currents = [load["demand"] + clamp_current for load in loads]
+        load_total = sum(load_currents, np.zeros(shape))
+        l_array_voltage = bus_voltage - load_total * WIRE_RESISTANCE
+        load_voltages = [l_array_voltage - current * WIRE_RESISTANCE for current in load_currents]
+        leaks = [(voltage - GROUNDING_RESISTANCE) / LOAD_GROUND_RESISTANCE for voltage in load_voltages]
+        leak_total = sum(leaks, np.zeros(shape))
+
+    nodes = {}
+    branches = {}
+
+    # Battery strings
+    for p in range(in_parallel):
+        negative = string_current * (GROUNDING_RESISTANCE + internal_resistance)
+        for s in range(in_series):
+            if s != 0:
+                negative = positive + string_current * (WIRE_RESISTANCE + internal_resistance)
+            positive = negative + cell_voltage
+            nodes[f"p{p}_s{s}_battery_negative"] = negative
+            nodes[f"p{p}_s{s}_battery_positive"] = positive
+            branches[f"vp{p}_s{s}_battery"] = string_current
+    nodes["total_dc_bus_voltage"] = bus_voltage
+    branches["vtotal_battery_input_current"] = battery_current
+
+    # MPPT outputs
+    mppt_node = "total_mppt_output" if arrays else "total_dc_bus_voltage_ignore"
+    nodes[mppt_node] = bus_voltage + GROUNDING_RESISTANCE
+    branches["vtotal_mppt_output_current"] = mppt_total
+    for index, array in enumerate(arrays):
+        nodes[f"arr{index}_mppt_output"] = nodes[mppt_node] + array["regulated_current"] * WIRE_RESISTANCE + GROUNDING_RESISTANCE
+        branches[f"varr{index}_mppt_output"] = array["regulated_current"]
+
+    __solve_solar_arrays(arrays, shape, nodes, branches, constants)
+
+    # Loads and balancer
+    nodes["l_array_positive"] = l_array_voltage
+    for load, current, voltage, leak in zip(loads, load_currents, load_voltages, leaks):
+        nodes[f"{load['name']}_positive"] = voltage
+        branches[f"v{load['name']}"] = current + leak
+    nodes["balancing_load"] = bus_voltage - GROUNDING_RESISTANCE
+    branches["vbalancing_load"] = balancing_current
+
+    nodes = {name: np.broadcast_to(value, shape) for name, value in nodes.items()}
+    branches = {name: np.broadcast_to(value, shape) for name, value in branches.items()}
+    return nodes, branches
+
+
+def __solve_solar_arrays(arrays, shape, nodes, branches, constants):
+    """Panel string ends feed every solar output from their own array onwards (as wired in Solar_Array)."""
+    if not arrays:
+        return
+    GROUNDING_RESISTANCE = constants["GROUNDING_RESISTANCE"]
+    WIRE_CONDUCTANCE = 1 / constants["WIRE_RESISTANCE"]
+
+    rows = [(index, p) for index, array in enumerate(arrays) for p in range(array["in_parallel"])]
+    row_count = len(rows)
+    size = row_count + len(arrays)
+    matrix = np.zeros(shape + (size, size))
+    rhs = np.zeros(shape + (size,))
+
+    for r, (index, _) in enumerate(rows):
+        for k in range(index, len(arrays)):
+            o = row_count + k
+            matrix[..., r, r] += WIRE_CONDUCTANCE
+            matrix[..., r, o] -= WIRE_CONDUCTANCE
+            matrix[..., o, o] += WIRE_CONDUCTANCE
+            matrix[..., o, r] -= WIRE_CONDUCTANCE
+        rhs[..., r] = arrays[index]["panel_current"]
+    for k, array in enumerate(arrays):
+        o = row_count + k
+        input_conductance = 1 / np.broadcast_to(array["input_resistance"], shape)
+        matrix[..., o, o] += input_conductance
+        rhs[..., o] = GROUNDING_RESISTANCE * input_conductance
+
+    solution = np.linalg.solve(matrix, rhs[..., None])[..., 0]
+
+    for r, (index, p) in enumerate(rows):
+        array = arrays[index]
+        last = array["in_series"] - 1
+        negative = -array["panel_current"] * GROUNDING_RESISTANCE
+        for s in range(array["in_series"]):
+            panel_name = f"arr{index}_p{p}_{s}_panel"
+            nodes[f"{panel_name}_negative"] = negative
+            if s != 0:
+                nodes[f"arr{index}_p{p}_s{s-1}_panel_positive"] = negative
+        nodes[f"arr{index}_p{p}_{last}_panel_positive"] = solution[..., r]
+    for k, array in enumerate(arrays):
+        output = solution[..., row_count + k]
+        nodes[f"arr{k}_solar_array_output"] = output
+        branches[f"varr{k}_solar_array_output"] = (output - GROUNDING_RESISTANCE) / array["input_resistance"]
+
+
+def dc_bus_checks(circuit_setup: json, modifications: dict, nodes: dict, branches: dict, constants=None):
+    """Kirchhoff residual and warning flag arrays for solve_dc_bus output, following cross_check_result."""
+    EPSILON = constants["EPSILON"]
+    battery_current = branches["vtotal_battery_input_current"]
+    balancing_current = branches["vbalancing_load"]
+
+    mppt_configs = [config for key, config in circuit_setup['mppt_panel'].items()
+                    if key.startswith("config_") for _ in range(config['count'])]
+    load_configs = list(circuit_setup["load"].values())
+
+    load_total = sum((branches[name] for name in branches
+                      if name.startswith("varr") and "_load_" in name), np.zeros(battery_current.shape))
+    residual = branches["vtotal_mppt_output_current"] - battery_current - load_total - balancing_current
+
+    warning = balancing_current > EPSILON
+    for index, config in enumerate(mppt_configs):
+        limit = config['mppt_info']['max_output_current']
+        warning = warning | (limit - branches[f"varr{index}_mppt_output"] < EPSILON)
+
+    efficiencies = [config['mppt_info']['efficiency'] for config in mppt_configs]
+    average_efficiency = sum(efficiencies) / len(efficiencies) if efficiencies else 1.0
+    for index, load in enumerate(load_configs):
+        name = f"arr{index}_load_{load['choice']}".lower()
+        throttle = modifications.get('throttle_setting')
+        if throttle is None:
+            throttle = load.get("throttle", 1.0)
+        elif type(throttle) == list:
+            throttle = throttle[index]
+        power_rating = load["total_power"] * average_efficiency
+        actual_power = nodes[f"{name}_positive"] * branches[f"v{name}"]
+        actual_throttle = actual_power / power_rating if power_rating > 0 else np.zeros(actual_power.shape)
+        warning = warning | ((throttle - actual_throttle) * 100 > constants["POWER_MISMATCH_TOLERANCE_PERCENTAGE"])
+
+    return residual, warning
+
+
+def __setting(modifications, key, default):
+    value = modifications.get(key)
+    return np.asarray(default if value is None else value, dtype=float)
+
+
+def dc_bus_results(circuit_setup: json, modifications: dict = {}, constants=None,
+                   spice_check: list = [], ngspice_available=False):
+    """Solve every point of the (broadcast) modifications at once and return one result dict per point,
+    in the same structure begin_simulation produces, flattened in C order.
+
+    Points whose flat index is in spice_check (negative indices count from the end) are also simulated
+    with NgSpice and any difference beyond SOLVER_CROSS_CHECK_TOLERANCE is reported as an error on that point.
+    """
+    nodes, branches = solve_dc_bus(circuit_setup, modifications, constants=constants)
+    shape = next(iter(nodes.values())).shape
+    swept = {key: np.broadcast_to(np.asarray(value, dtype=float), shape)
+             for key, value in modifications.items() if type(value) != list}
+
+    count = int(np.prod(shape))
+    spice_check = {index % count for index in spice_check}
+    results = []
+    for point in range(count):
+        index = np.unravel_index(point, shape)
+        point_modifications = {key: float(value[index]) for key, value in swept.items()}
+        for key, value in modifications.items():
+            if type(value) == list:
+                point_modifications[key] = [float(np.broadcast_to(v, shape)[index]) for v in value]
+
+        component_object, errors = evaluate_components(circuit_setup, point_modifications, constants=constants)
+        analysis = Bus_Analysis({name: float(value[index]) for name, value in nodes.items()},
+                                {name: float(value[index]) for name, value in branches.items()})
+        result = begin_dc_bus_simulation(analysis, component_object, errors, constants=constants)
+
+        if point in spice_check:
+            __cross_check_with_spice(circuit_setup, point_modifications, result, ngspice_available, constants)
+        results.append(result)
+    return results
+
+
+def begin_closed_form_simulation(circuit_setup: json, modifications: dict = {}, constants=None):
+    """Single operating point with the closed-form solver, returning (analysis, result) like begin_simulation."""
+    nodes, branches = solve_dc_bus(circuit_setup, modifications, constants=constants)
+    component_object, errors = evaluate_components(circuit_setup, modifications, constants=constants)
+    analysis = Bus_Analysis({name: float(value) for name, value in nodes.items()},
+                            {name: float(value) for name, value in branches.items()})
+    return analysis, begin_dc_bus_simulation(analysis, component_object, errors, constants=constants)
+
+
+def begin_dc_bus_simulation(analysis, component_object, errors, constants=None):
+    """Fill a result structure from a Bus_Analysis the way begin_simulation does for NgSpice."""
+    meta_data = {"name": CIRCUIT_TITLE, "date": datetime.datetime.now().isoformat(), "solver": "closed_form"}
+    result, struc = create_result(meta_data, errors)
+    parse_simulation_result(analysis, result, struc, constants=constants)
+    cross_check_result(analysis, component_object, result, constants=constants)
+    return result
+
+
+def __cross_check_with_spice(circuit_setup, modifications, result, ngspice_available, constants):
+    circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, modifications=modifications, constants=constants)
+    analysis, spice_result = begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants)
+    if analysis is None:
+        result["error"]["data"].append(f"NgSpice cross-check could not run at {modifications}.")
+        result["error"]["array_count"] = len(result["error"]["data"])
+        return
+
+    tolerance = constants["SOLVER_CROSS_CHECK_TOLERANCE"]
+    for category in ["summary", "mppt_result", "solar_result", "load_result", "load_balancer"]:
+        for data, spice_data in zip(result[category]["data"], spice_result[category]["data"]):
+            for data_type in ["voltage", "current"]:
+                for key, spice_value in spice_data[data_type].items():
+                    value = data[data_type].get(key)
+                    if value is None or abs(value - spice_value) > tolerance * max(1.0, abs(spice_value)):
+                        result["error"]["data"].append(
+                            f"Closed-form {category} {data_type} {key} ({value}) differs from NgSpice ({spice_value}) at {modifications}")
+    result["error"]["array_count"] = len(result["error"]["data"])
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+from copy import deepcopy
+
+from .irradiance import irradiance_source
+from .simulation_over_time import find_root, simulate_step, step_voyage_adaptive, step_voyage_fixed, voyage_completed
+
+NEUTRAL_THROTTLE_TOLERANCE = 1e-4
+CRUISE_THROTTLE_TOLERANCE = 1e-3
+CRUISE_TARGET_SOC = 0.2
+NEUTRAL_PANEL_POWER_COUNT = 10      # panel power levels 0%, 10%, ..., 100%
+NEUTRAL_FILE_NAME = "energy_neutral_results.json"
+
+
+def energy_neutral_throttle(circuit_setup: json, panel_power: float, ngspice_available: bool, solver="spice",
+                            constants=None, current_soc=None):
+    """Highest throttle at which the battery net current is still >= 0 for a panel power setting.
+
+    Root-finds the battery current of single operating points between throttle 0 and 1 instead of
+    sweeping. Returns 0.0 if the battery drains even at idle, 1.0 if it still charges at full
+    throttle and None if an operating point fails. With the spice solver every point reuses the
+    compiled netlist template.
+    """
+    snapshot = deepcopy(circuit_setup)
+    modifications = {'panel_power_setting': panel_power}
+    if current_soc is not None:
+        modifications['current_soc'] = current_soc
+
+    def battery_current(throttle):
+        analysis, result = simulate_step(snapshot, dict(modifications, throttle_setting=throttle),
+                                         ngspice_available, solver, constants)
+        if analysis is None:
+            return None
+        return result["summary"]["data"][0]["current"]["total_battery_input_current"]
+
+    return highest_sustainable_throttle(battery_current, NEUTRAL_THROTTLE_TOLERANCE, constants)
+
+def sustainable_cruise_throttle(circuit_setup: json, voyage_config_loc: str, target_soc: float, ngspice_available: bool,
+                                solver="spice", constants=None, integrator="adaptive"):
+    """Highest throttle that, held through every segment of the voyage, still ends it at or above target_soc.
+
+    Segments keep their duration and solar_power (or the voyage's irradiance source); only their
+    throttle is replaced. Final SOC does not rise with throttle, so it is root-found like
+    energy_neutral_throttle, with one voyage run per evaluation. Returns None if a run aborts.
+    """
+    with open(voyage_config_loc, 'r') as f:
+        data = json.load(f)
+
+    # Voyages write holds at full/empty into circuit_setup, so every run starts from a clean copy
+    snapshot = deepcopy(circuit_setup)
+    battery_info = snapshot['battery']
+    battery_capacity_Amin = battery_info['capacity_ah'] * battery_info['battery_in_parallel'] * 60
+    step_voyage = step_voyage_adaptive if integrator == "adaptive" else step_voyage_fixed
+
+    def final_soc_margin(throttle):
+        segments = [dict(segment, throttle=throttle) for segment in data['segments']]
+        irradiance = irradiance_source(data.get('irradiance'), os.path.dirname(voyage_config_loc))
+        store = step_voyage(deepcopy(snapshot), segments, data['initial_battery_soc'], battery_capacity_Amin,
+                            ngspice_available, solver, constants, None, irradiance)
+        if not voyage_completed(store, segments, constants):
+            return None
+        return store.last("battery_capacity") / battery_capacity_Amin - target_soc
+
+    return highest_sustainable_throttle(final_soc_margin, CRUISE_THROTTLE_TOLERANCE, constants)
+
+def highest_sustainable_throttle(function, tolerance: float, constants=None):
+    """Throttle in [0, 1] where function (falling with throttle) crosses zero, clamped to the ends."""
+    f_low = function(0.0)
+    if f_low is None or f_low < 0:
+        return None if f_low is None else 0.0
+    f_high = function(1.0)
+    if f_high is None or f_high >= 0:
+        return None if f_high is None else 1.0
+    return find_root(function, 0.0, f_low, 1.0, f_high, tolerance, constants)
+
+def start_energy_neutral(circuit_setup: json, voyage_config_loc: str, save_path: str, ngspice_available: bool,
+                         constants=None, solver="spice", target_soc=CRUISE_TARGET_SOC, integrator="adaptive",
+                         save_output=True):
+    """Energy-neutral throttle at every NEUTRAL_PANEL_POWER_COUNT step of panel power and, with a voyage,
+    the highest cruise throttle that ends it at or above target_soc."""
+    start = time.perf_counter()
+    panel_power_range = [i / NEUTRAL_PANEL_POWER_COUNT for i in range(NEUTRAL_PANEL_POWER_COUNT + 1)]
+    results = {
+        "current_soc": circuit_setup['battery'].get('current_soc', 1.0),
+        "energy_neutral": [{"panel_power": panel_power,
+                            "throttle": energy_neutral_throttle(circuit_setup, panel_power, ngspice_available, solver, constants)}
+                           for panel_power in panel_power_range],
+    }
+    if voyage_config_loc is not None:
+        results["cruise"] = {"target_soc": target_soc,
+                             "throttle": sustainable_cruise_throttle(circuit_setup, voyage_config_loc, target_soc,
+                                                                     ngspice_available, solver, constants, integrator)}
+    __print_results(results, time.perf_counter() - start, constants)
+
+    if save_output:
+        save_file = save_path + "." + NEUTRAL_FILE_NAME
+        with open(save_file, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Energy neutral results saved to {save_file}")
+    return results
+
+def __print_results(results, elapsed, constants):
+    print(f"{constants['BARF']}Energy Neutral Throttle (SOC {results['current_soc']:.2f}){constants['BARE']}")
+    for point in results["energy_neutral"]:
+        throttle = "failed" if point["throttle"] is None else f"{point['throttle']*100:.2f}%"
+        print(f"\tPanel power {point['panel_power']*100:5.1f}%: throttle {throttle}")
+    cruise = results.get("cruise")
+    if cruise is not None:
+        throttle = "failed" if cruise["throttle"] is None else f"{cruise['throttle']*100:.2f}%"
+        print(f"\tSustainable cruise throttle to end above SOC {cruise['target_soc']:.2f}: {throttle}")
+    print(f"\tSolved in {elapsed:.2f} s")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Electrical simulation of several boats in one process.
+
+NgSpice is initialised and constants.json/components.json are parsed once, then every boat
+runs every requested simulation type. Artifacts are named as by `make electrical-simulation`.
+
+  python -m src.electrical_simulation.fleet --boats all --simulation-type voyage sweep_map \\
+      --constants constant/electrical/constants.json --components constant/electrical/components.json \\
+      --voyage constant/electrical/voyage_setup.json --solver closed_form
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor
+
+from .__main__ import add_simulation_arguments, check_ngspice, load_circuit_setup, run_simulation_type
+
+CIRCUIT_DIR = "constant/electrical/boat"
+CIRCUIT_FILE_NAME = "circuit_setup.json"
+BOAT_PARAMS_DIR = "constant/boat"
+OUTPUT_DIR = "artifact"
+OUTPUT_SUFFIX = ".electrical_simulation"
+
+# Per-process state, set once by init_fleet_worker
+__fleet = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run electrical simulations for several boats, sharing one NgSpice initialisation')
+    parser.add_argument('--boats', nargs='+', default=['all'],
+                        help='Boat names (e.g. rp1 rp2), or all for every boat in --circuit-dir')
+    parser.add_argument('--circuit-dir', default=CIRCUIT_DIR,
+                        help=f'Directory with one <boat>/{CIRCUIT_FILE_NAME} per boat')
+    parser.add_argument('--boat-params-dir', default=BOAT_PARAMS_DIR,
+                        help='Directory with <boat>.json boat parameters (skipped for boats without one)')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR,
+                        help=f'Artifacts are written as <output-dir>/<boat>{OUTPUT_SUFFIX}.*')
+    parser.add_argument('--boat-workers', type=int, default=1,
+                        help='Number of worker processes running boats in parallel, each with its own NgSpice instance')
+    add_simulation_arguments(parser, multiple=True)
+
+    args = parser.parse_args()
+    failed = run_fleet(args)
+    sys.exit(1 if failed else 0)
+
+def run_fleet(args):
+    """Run args.simulation_type (a list) for every boat in args.boats and return the boats that failed."""
+    boats = fleet_boats(args.boats, args.circuit_dir)
+    constants = json.load(open(args.constants))
+    components = json.load(open(args.components))
+    os.makedirs(args.output_dir, exist_ok=True)
+    start = time.perf_counter()
+
+    if args.boat_workers <= 1 or len(boats) <= 1:
+        init_fleet_worker(args, constants, components)
+        outcomes = [run_boat(boat) for boat in boats]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(args.boat_workers, len(boats)), mp_context=context,
+                                 initializer=init_fleet_worker, initargs=(args, constants, components)) as executor:
+            outcomes = list(executor.map(run_boat, boats))
+
+    failed = [boat for boat, error in outcomes if error is not None]
+    print(f"{constants['BARF']}Fleet: {len(boats) - len(failed)}/{len(boats)} boats complete in {time.perf_counter() - start:.1f} s{constants['BARE']}")
+    for boat, error in outcomes:
+        if error is not None:
+            print(f"\t{boat} failed: {error}")
+    return failed
+
+def fleet_boats(boats: list, circuit_dir: str):
+    """Boat names with a circuit setup, expanding "all" to every boat directory in circuit_dir."""
+    if "all" in boats:
+        boats = sorted(name for name in os.listdir(circuit_dir)
+                       if os.path.isfile(os.path.join(circuit_dir, name, CIRCUIT_FILE_NAME)))
+    for boat in boats:
+        if not os.path.isfile(os.path.join(circuit_dir, boat, CIRCUIT_FILE_NAME)):
+            raise FileNotFoundError(f"No {CIRCUIT_FILE_NAME} for boat {boat} in {circuit_dir}")
+    return boats
+
+def init_fleet_worker(args, constants, components):
+    __fleet["args"] = args
+    __fleet["constants"] = constants
+    __fleet["components"] = components
+    __fleet["ngspice_available"] = check_ngspice() if args.solver == 'spice' or args.spice_check else False
+
+def run_boat(boat: str):
+    """Run every requested simulation type for one boat, returning (boat, error message or None)."""
+    args = __fleet["args"]
+    constants = __fleet["constants"]
+    boat_params_loc = os.path.join(args.boat_params_dir, boat + ".json")
+    output_dir = os.path.join(args.output_dir, boat + OUTPUT_SUFFIX)
+
+    print(f"{constants['BARF']}Boat: {boat}{constants['BARE']}")
+    try:
+        for simulation_type in args.simulation_type:
+            # Every simulation type starts from a freshly loaded setup, as a separate run would
+            circuit_setup = load_circuit_setup(os.path.join(args.circuit_dir, boat, CIRCUIT_FILE_NAME),
+                                               __fleet["components"],
+                                               boat_params_loc if os.path.isfile(boat_params_loc) else None,
+                                               args.reduced)
+            run_simulation_type(Namespace(**dict(vars(args), simulation_type=simulation_type)), circuit_setup,
+                                __fleet["ngspice_available"], output_dir, constants)
+    except Exception as e:
+        traceback.print_exc()
+        return boat, f"{type(e).__name__}: {e}"
+    return boat, None
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import csv
+import json
+import math
+import os
+from collections import deque
+import numpy as np
+
+IRRADIANCE_INTERVAL_MIN = 1
+IRRADIANCE_CHUNK = 1440              # samples read at a time from NPY files
+STC_IRRADIANCE = 1000.0              # W/m^2 at which panels make their rated power
+HAURWITZ_SCALE = 1098.0              # W/m^2
+HAURWITZ_EXTINCTION = 0.057
+TIME_TOLERANCE_MIN = 1e-9
+
+
+class Irradiance_Source:
+    """Panel power setting per minute, pulled lazily from a generator.
+
+    Voyage time only moves forward, so samples before the current minute are dropped and at most
+    the look-ahead of run_length is buffered.
+    """
+    def __init__(self, series):
+        self.series = series
+        self.start = 0
+        self.buffer = deque()
+
+    def at(self, time_min: float):
+        """Panel power setting for the minute containing time_min."""
+        index = self.__index(time_min)
+        while self.start < index:
+            if not self.buffer:
+                self.__sample(self.start)
+            self.buffer.popleft()
+            self.start += 1
+        return self.__sample(index)
+
+    def run_length(self, time_min: float, limit: float):
+        """Minutes from time_min until the setting changes, looking at most limit minutes ahead."""
+        index = self.__index(time_min)
+        value = self.__sample(index)
+        end = index + 1
+        while end * IRRADIANCE_INTERVAL_MIN - time_min < limit - TIME_TOLERANCE_MIN and self.__sample(end) == value:
+            end += 1
+        return min(limit, end * IRRADIANCE_INTERVAL_MIN - time_min)
+
+    def __index(self, time_min):
+        return int(math.floor(time_min / IRRADIANCE_INTERVAL_MIN + TIME_TOLERANCE_MIN))
+
+    def __sample(self, index):
+        while self.start + len(self.buffer) <= index:
+            try:
+                self.buffer.append(float(next(self.series)))
+            except StopIteration:
+                raise ValueError(f"Irradiance series ended at minute {(self.start + len(self.buffer)) * IRRADIANCE_INTERVAL_MIN}")
+        return self.buffer[index - self.start]
+
+
+def irradiance_source(config: json, voyage_dir: str = ""):
+    """Irradiance_Source for the "irradiance" block of a voyage JSON, or None without one.
+
+    "source" is "csv" (a "column", default "solar_power"), "npy" (a 1-D array) or "clear_sky"
+    ("latitude" in degrees, "day_of_year", "start_time" in solar hours). File paths are relative
+    to the voyage JSON. Values are multiplied by "scale", e.g. 0.001 for a CSV in W/m^2; clear-sky
+    irradiance is divided by STC_IRRADIANCE before scaling.
+    """
+    if config is None:
+        return None
+
+    scale = config.get("scale", 1.0)
+    source = config["source"]
+    if source == "csv":
+        series = csv_series(os.path.join(voyage_dir, config["path"]), config.get("column", "solar_power"))
+    elif source == "npy":
+        series = npy_series(os.path.join(voyage_dir, config["path"]))
+    elif source == "clear_sky":
+        series = clear_sky_series(config["latitude"], config["day_of_year"], config.get("start_time", 0.0))
+    else:
+        raise ValueError(f"Unknown irradiance source {source}, expected csv, npy or clear_sky")
+    return Irradiance_Source(value * scale for value in series)
+
+def csv_series(path: str, column: str):
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            yield float(row[column])
+
+def npy_series(path: str):
+    values = np.load(path, mmap_mode='r')
+    for start in range(0, len(values), IRRADIANCE_CHUNK):
+        yield from np.asarray(values[start:start + IRRADIANCE_CHUNK], dtype=float).tolist()
+
+def clear_sky_series(latitude: float, day_of_year: int, start_time: float):
+    """Haurwitz clear-sky irradiance on a horizontal panel as a fraction of STC, one value per minute."""
+    minute = 0
+    while True:
+        hours = start_time + minute * IRRADIANCE_INTERVAL_MIN / 60
+        yield clear_sky_irradiance(latitude, day_of_year + int(hours // 24), hours % 24) / STC_IRRADIANCE
+        minute += 1
+
+def clear_sky_irradiance(latitude: float, day_of_year: int, solar_time: float):
+    """Global horizontal irradiance in W/m^2 (Haurwitz), with Cooper's declination."""
+    declination = math.radians(23.45) * math.sin(2 * math.pi * (284 + day_of_year) / 365)
+    hour_angle = math.radians(15 * (solar_time - 12))
+    latitude = math.radians(latitude)
+    cos_zenith = (math.sin(latitude) * math.sin(declination) +
+                  math.cos(latitude) * math.cos(declination) * math.cos(hour_angle))
+    if cos_zenith <= 0:
+        return 0.0
+    return HAURWITZ_SCALE * cos_zenith * math.exp(-HAURWITZ_EXTINCTION / cos_zenith)
@@ -0,0 +1,129 @@
+import contextlib
+import io
+import json
+import os
+from copy import deepcopy
+
+import numpy as np
+
+from .__main__ import check_ngspice, load_circuit_setup
+from .energy_neutral import energy_neutral_throttle
+from .fleet import BOAT_PARAMS_DIR, CIRCUIT_DIR, CIRCUIT_FILE_NAME
+from .simulation_over_time import VOYAGE_GRAPH, simulate_step, simulate_voyage
+from .simulation_sweeper import save_sweep, sweep_map, sweep_panel_power, sweep_throttle
+
+CONSTANTS_FILE = "constant/electrical/constants.json"
+COMPONENTS_FILE = "constant/electrical/components.json"
+
+# Keyword names of Electrical_Model.operating_point -> modification keys of the simulators
+MODIFICATIONS = {
+    "throttle": "throttle_setting",
+    "panel_power": "panel_power_setting",
+    "soc": "current_soc",
+    "max_charge_current": "max_charge_current",
+    "max_discharge_current": "max_discharge_current",
+}
+
+
+class Operating_Point:
+    """One solved operating point: the summary values as attributes and the full result dict."""
+    def __init__(self, modifications: dict, result: dict):
+        self.modifications = modifications
+        self.result = result
+        summary = result["summary"]["data"][0] if result["summary"]["data"] else {"voltage": {}, "current": {}}
+        self.converged = bool(result["summary"]["data"])
+        self.battery_current = summary["current"].get("total_battery_input_current", np.nan)
+        self.mppt_current = summary["current"].get("total_mppt_output_current", np.nan)
+        self.bus_voltage = summary["voltage"].get("total_dc_bus_voltage", np.nan)
+        self.warnings = list(result["warning"]["data"])
+        self.errors = list(result["error"]["data"])
+        self.solver = result.get("solver")
+
+    def __repr__(self):
+        return (f"Operating_Point({self.modifications}, battery_current={self.battery_current:.3f} A, "
+                f"bus_voltage={self.bus_voltage:.3f} V, warnings={len(self.warnings)}, errors={len(self.errors)})")
+
+
+class Electrical_Model:
+    """In-process electrical simulation of one circuit setup, for notebooks and optimisers.
+
+    The setup, constants and NgSpice check are loaded once. Every call works on a copy of the setup,
+    so calls do not affect each other, and nothing is printed, saved or plotted unless asked
+    (verbose=True, save_path). With solver="spice" but no NgSpice the closed-form solver is used.
+    """
+    def __init__(self, circuit_setup: json, constants: json, solver="spice", ngspice_available=None, verbose=False):
+        self.circuit_setup = circuit_setup
+        self.constants = constants
+        self.verbose = verbose
+        if ngspice_available is None:
+            with self.__output():
+                ngspice_available = check_ngspice() if solver == "spice" else False
+        self.ngspice_available = ngspice_available
+        self.solver = solver if ngspice_available or solver != "spice" else "closed_form"
+
+    @classmethod
+    def from_files(cls, boat: str, circuit_dir=CIRCUIT_DIR, boat_params_dir=BOAT_PARAMS_DIR,
+                   constants=CONSTANTS_FILE, components=COMPONENTS_FILE, solver="spice", reduced=False,
+                   ngspice_available=None, verbose=False):
+        """Model of boat from <circuit_dir>/<boat>/circuit_setup.json and <boat_params_dir>/<boat>.json (if present)."""
+        with open(constants) as f:
+            constants = json.load(f)
+        with open(components) as f:
+            components = json.load(f)
+        boat_params_loc = os.path.join(boat_params_dir, boat + ".json")
+        circuit_setup = load_circuit_setup(os.path.join(circuit_dir, boat, CIRCUIT_FILE_NAME), components,
+                                           boat_params_loc if os.path.isfile(boat_params_loc) else None, reduced)
+        return cls(circuit_setup, constants, solver, ngspice_available, verbose)
+
+    def operating_point(self, **modifications):
+        """Operating point for throttle, panel_power, soc, max_charge_current and max_discharge_current (as given)."""
+        unknown = set(modifications) - set(MODIFICATIONS)
+        if unknown:
+            raise TypeError(f"Unknown modifications {sorted(unknown)}, expected some of {list(MODIFICATIONS)}")
+        modifications = {MODIFICATIONS[name]: value for name, value in modifications.items()}
+        with self.__output():
+            _, result = simulate_step(deepcopy(self.circuit_setup), modifications, self.ngspice_available,
+                                      self.solver, self.constants)
+        return Operating_Point(modifications, result)
+
+    def sweep(self, variable="throttle", adaptive=False, workers=1, save_path=None, plot=False):
+        """Result_Store of the throttle or panel_power sweep, or the arrays of the throttle x panel power map.
+
+        With save_path the results are saved (and with plot=True plotted) as by the CLI.
+        """
+        arguments = dict(save_path=save_path, ngspice_available=self.ngspice_available, save_output=save_path is not None,
+                         constants=self.constants, solver=self.solver, workers=workers, plot=plot)
+        with self.__output():
+            if variable == "throttle":
+                return sweep_throttle(deepcopy(self.circuit_setup), adaptive=adaptive, **arguments)
+            if variable == "panel_power":
+                return sweep_panel_power(deepcopy(self.circuit_setup), adaptive=adaptive, **arguments)
+            if variable == "map":
+                return sweep_map(deepcopy(self.circuit_setup), **arguments)
+        raise ValueError(f"Unknown sweep {variable}, expected throttle, panel_power or map")
+
+    def voyage(self, voyage, integrator="adaptive", initial_soc=None, cache=None, save_path=None, plot=False):
+        """Checked Result_Store of a voyage, given as a voyage JSON path or an already loaded dict."""
+        voyage_dir = "."
+        if type(voyage) == str:
+            voyage_dir = os.path.dirname(voyage)
+            with open(voyage) as f:
+                voyage = json.load(f)
+        if initial_soc is not None:
+            voyage = dict(voyage, initial_battery_soc=initial_soc)
+        with self.__output():
+            store = simulate_voyage(deepcopy(self.circuit_setup), voyage, self.ngspice_available, self.constants,
+                                    self.solver, integrator, cache, voyage_dir)
+            if save_path is not None:
+                save_sweep(store, VOYAGE_GRAPH, save_path, plot, self.constants)
+        return store
+
+    def energy_neutral_throttle(self, panel_power: float, soc=None):
+        """Highest throttle at which the battery still charges for panel_power (see energy_neutral.py)."""
+        with self.__output():
+            return energy_neutral_throttle(self.circuit_setup, panel_power, self.ngspice_available, self.solver,
+                                           self.constants, current_soc=soc)
+
+    def __output(self):
+        # Simulation messages are only shown when verbose
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
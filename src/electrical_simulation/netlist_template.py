@@ -0,0 +1,190 @@
+import json
+import re
+import time
+from copy import deepcopy
+
+from .circuit_constructor import build_circuit_from_json, evaluate_components, get_alterations
+from .operating_point_cache import config_digest
+
+# Compiled templates, one per circuit config
+__templates = {}
+
+# Options of each retry after a failed operating point, tried in order and without the seed
+CONVERGENCE_RETRIES = {
+    "gmin_stepping": ".options noopiter gminsteps=100 itl1=500",
+    "source_stepping": ".options noopiter gminsteps=0 srcsteps=100",
+}
+
+
+class Netlist_Template:
+    """SPICE deck compiled once per circuit topology, with a .param placeholder for every swept device value
+    (battery cells, charge/discharge limits, panel currents and resistances, MPPT regulation, load demand).
+
+    Rendering a deck for new modifications only evaluates the component values and substitutes the
+    .param lines, without constructing PySpice objects. It can be passed to begin_simulation as the session.
+    Every operating point is seeded (.nodeset) with the node voltages of the last one that converged.
+    """
+    def __init__(self, circuit_setup: json, constants=None, ngspice_shared=None):
+        self.circuit_setup = circuit_setup
+        self.constants = constants
+        self.ngspice_shared = ngspice_shared
+        self.parameters = {}
+        self.seed = None            # node voltages of the last converged operating point
+        self.statistics = None      # how the last operating point converged, see solve_statistics
+        self.title, self.deck = self.__compile()
+
+    def build(self, modifications: dict = {}):
+        """Same return values as build_circuit_from_json, with the template standing in for the circuit."""
+        component_object, errors = evaluate_components(self.circuit_setup, modifications, constants=self.constants)
+        return self, component_object, errors
+
+    def render(self, component_object, nodeset=None, options=""):
+        """SPICE deck for the values in component_object, with optional .nodeset voltages and .options line."""
+        alterations = {device.lower(): value for device, (_, value) in get_alterations(component_object).items()}
+        params = "".join(f".param {name}={alterations[device]!r}\n" for device, name in self.parameters.items())
+        if nodeset:
+            params += ".nodeset " + " ".join(f"v({node})={value!r}" for node, value in nodeset.items()) + "\n"
+        if options:
+            params += options + "\n"
+        return self.deck.format(params=params)
+
+    def render_waveforms(self, times, values: dict, analysis: str):
+        """SPICE deck with every swept device following values (lower-case device -> value at each of times)
+        piecewise linearly, running analysis instead of .op.
+
+        Devices whose value does not change keep their .param. Resistors that change become behavioral
+        current sources, as an NgSpice resistance cannot follow time.
+        """
+        params = ""
+        waveforms = {}
+        for device, name in self.parameters.items():
+            series = [float(value) for value in values[device]]
+            if all(value == series[0] for value in series):
+                params += f".param {name}={series[0]!r}\n"
+            else:
+                waveforms["{{" + name + "}}"] = list(zip((float(t) for t in times), series))
+
+        lines = []
+        for line in self.deck.splitlines():
+            tokens = line.split()
+            if line.strip() == ".op":
+                line = analysis
+            elif tokens and tokens[-1] in waveforms:
+                points = waveforms[tokens[-1]]
+                if tokens[0][0].lower() == "r":
+                    pwl = ", ".join(f"{t!r}, {value!r}" for t, value in points)
+                    line = f"B{tokens[0]} {tokens[1]} {tokens[2]} I = V({tokens[1]},{tokens[2]})/pwl(time, {pwl})"
+                else:
+                    pwl = " ".join(f"{t!r} {value!r}" for t, value in points)
+                    line = " ".join(tokens[:-1] + [f"PWL({pwl})"])
+            lines.append(line)
+        return "\n".join(lines).format(params=params) + "\n"
+
+    def operating_point(self, component_object, start_path=()):
+        """Run .op seeded with the last converged point, retrying with CONVERGENCE_RETRIES if it fails.
+
+        start_path names attempts already made elsewhere (e.g. an altered Spice_Session run) and is
+        kept at the front of the statistics path.
+        """
+        ngspice = self.ngspice_shared
+        if ngspice is None:
+            from PySpice.Spice.NgSpice.Shared import NgSpiceShared # type: ignore
+            ngspice = self.ngspice_shared = NgSpiceShared.new_instance()
+
+        start = time.perf_counter()
+        attempts = [("seeded" if self.seed else "direct", lambda: self.render(component_object, self.seed))]
+        attempts += [(name, lambda options=options: self.render(component_object, options=options))
+                     for name, options in CONVERGENCE_RETRIES.items()]
+        path = list(start_path)
+        iterations = 0
+        analysis = None
+        for name, deck in attempts:
+            path.append(name)
+            analysis = run_deck(ngspice, deck())
+            iterations = add_iterations(iterations, iteration_count(ngspice))
+            if analysis is not None:
+                break
+
+        self.statistics = solve_statistics(path, iterations, start, analysis is not None)
+        if analysis is None:
+            raise NameError('Simulation failed')
+        self.seed = node_voltages(analysis)
+        return analysis
+
+    def invalidate(self):
+        # Nothing is kept loaded between runs
+        return None
+
+    def __compile(self):
+        from PySpice.Spice.Simulation import CircuitSimulation, OperatingPointAnalysisParameters # type: ignore
+
+        circuit, component_object, _ = build_circuit_from_json(circuit_setup=deepcopy(self.circuit_setup),
+                                                               constants=self.constants, alterable=True)
+        # Same deck NgSpiceSharedCircuitSimulator loads for circuit.simulator(temperature=25, nominal_temperature=25)
+        simulation = CircuitSimulation(circuit, temperature=25, nominal_temperature=25)
+        deck = circuit.str(simulator='ngspice') + simulation.str_options() + f"{OperatingPointAnalysisParameters()}\n.end\n"
+
+        alterations = {device.lower(): value for device, (_, value) in get_alterations(component_object).items()}
+        lines = deck.replace("{", "{{").replace("}", "}}").splitlines()
+        for index, line in enumerate(lines):
+            tokens = line.split()
+            if not tokens or tokens[0].lower() not in alterations:
+                continue
+            device = tokens[0].lower()
+            if float(tokens[-1]) != float(alterations[device]):
+                raise ValueError(f"Netlist value of {tokens[0]} ({tokens[-1]}) does not match {alterations[device]}")
+            name = f"p{len(self.parameters)}"
+            self.parameters[device] = name
+            lines[index] = " ".join(tokens[:-1] + ["{{" + name + "}}"])
+
+        missing = set(alterations) - set(self.parameters)
+        if missing:
+            raise ValueError(f"Devices missing from netlist: {sorted(missing)}")
+
+        # Parameters go right after the title line
+        return circuit.title, "\n".join(lines[:1] + ["{params}"] + lines[1:]) + "\n"
+
+
+def run_deck(ngspice, deck: str, to_analysis=True):
+    """Load and run one deck; the operating point (or the raw NgSpice plot), or None if NgSpice did not converge."""
+    try:
+        ngspice.destroy()
+        ngspice.load_circuit(deck)
+        ngspice.run()
+    except Exception:
+        return None
+    plot_name = ngspice.last_plot
+    if plot_name == 'const':
+        return None
+    plot = ngspice.plot(None, plot_name)
+    return plot.to_analysis() if to_analysis else plot
+
+def iteration_count(ngspice):
+    """Newton iterations NgSpice reports for the loaded circuit, or None if it does not."""
+    try:
+        output = ngspice.exec_command("rusage totiter")
+    except Exception:
+        return None
+    numbers = re.findall(r"\d+", output if type(output) == str else " ".join(output))
+    return int(numbers[-1]) if numbers else None
+
+def add_iterations(total, iterations):
+    return None if total is None or iterations is None else total + iterations
+
+def node_voltages(analysis):
+    """Node voltages of an operating point, as .nodeset values for the next one."""
+    return {name: float(node.as_ndarray()[0]) for name, node in analysis.nodes.items()}
+
+def solve_statistics(path: list, iterations, start: float, converged: bool):
+    """Per-point solver record: attempts made in order, Newton iterations (None if unknown) and time."""
+    return {"path": path, "retries": len(path) - 1, "iterations": iterations,
+            "solve_ms": (time.perf_counter() - start) * 1000, "converged": converged}
+
+def netlist_template(circuit_setup: json, constants=None):
+    """Compiled template for circuit_setup, reused for every setup with the same config."""
+    key = config_digest(circuit_setup)
+    if key not in __templates:
+        __templates[key] = Netlist_Template(circuit_setup, constants=constants)
+    template = __templates[key]
+    template.circuit_setup = circuit_setup
+    return template
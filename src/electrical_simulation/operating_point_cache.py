@@ -0,0 +1,132 @@
+import hashlib
+import json
+from collections import OrderedDict
+from copy import deepcopy
+
+CACHE_SIZE = 4096
+SOC_QUANTUM = 1e-3
+
+# Written into circuit_setup by apply_modifications, so they are part of the key instead of the config hash
+VOLATILE_BATTERY_KEYS = ["current_soc", "max_charge_current", "max_discharge_current"]
+VOLATILE_PANEL_KEYS = ["calculated_power"]
+VOLATILE_LOAD_KEYS = ["throttle"]
+DIGEST_MEMO_SIZE = 64
+
+# Digests of the last DIGEST_MEMO_SIZE setups by id(); the setups are held so their ids cannot be reused
+__digests = OrderedDict()
+
+
+class Operating_Point_Cache:
+    """Bounded LRU cache of operating point results, keyed on the swept settings and the circuit config.
+
+    SOC is quantised to SOC_QUANTUM and the point is simulated at the quantised SOC, so a cached result
+    is exact for its key. With interpolate=True the two neighbouring SOC points are simulated (or
+    reused) and their voltages and currents are interpolated linearly; warnings and errors come from
+    the nearer neighbour.
+    """
+    def __init__(self, size=CACHE_SIZE, soc_quantum=SOC_QUANTUM, interpolate=False):
+        self.size = size
+        self.soc_quantum = soc_quantum
+        self.interpolate = interpolate
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def simulate(self, circuit_setup: json, modifications: dict, simulate):
+        """Return (analysis, result) for modifications, calling simulate(modifications) on a miss."""
+        config_hash = config_digest(circuit_setup)
+        soc = modifications.get('current_soc', circuit_setup['battery'].get('current_soc', 1.0))
+        position = soc / self.soc_quantum
+
+        if not self.interpolate or position == round(position):
+            return self.__get(config_hash, circuit_setup, modifications, round(position), simulate)
+
+        lower = int(position // 1)
+        analysis, lower_result = self.__get(config_hash, circuit_setup, modifications, lower, simulate)
+        if analysis is None:
+            return analysis, lower_result
+        upper_analysis, upper_result = self.__get(config_hash, circuit_setup, modifications, lower + 1, simulate)
+        if upper_analysis is None:
+            return upper_analysis, upper_result
+
+        weight = position - lower
+        return (analysis if weight < 0.5 else upper_analysis), interpolate_result(lower_result, upper_result, weight)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def report(self, constants=None):
+        print(f"{constants['BARF']}Operating Point Cache{constants['BARE']}")
+        print(f"\t{self.hits} hits, {self.misses} misses ({self.hit_rate()*100:.1f}% hit rate), {len(self.entries)} entries")
+
+    def __get(self, config_hash, circuit_setup, modifications, soc_step, simulate):
+        key = (config_hash, soc_step) + self.__settings_key(circuit_setup, modifications)
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            analysis, result = self.entries[key]
+            return analysis, deepcopy(result)
+
+        self.misses += 1
+        quantised = dict(modifications, current_soc=min(max(soc_step * self.soc_quantum, 0.0), 1.0))
+        analysis, result = simulate(quantised)
+        if analysis is None:
+            return analysis, result
+
+        self.entries[key] = (analysis, deepcopy(result))
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return analysis, result
+
+    def __settings_key(self, circuit_setup, modifications):
+        # Settings left out of modifications keep whatever apply_modifications last wrote into circuit_setup
+        battery = circuit_setup['battery']
+        throttle = modifications.get('throttle_setting')
+        if throttle is None:
+            throttle = [load.get('throttle') for load in circuit_setup['load'].values()]
+        return (tuple(throttle) if type(throttle) == list else throttle,
+                modifications.get('panel_power_setting'),
+                modifications.get('max_charge_current', battery.get('max_charge_current')),
+                modifications.get('max_discharge_current', battery.get('max_discharge_current')))
+
+
+def config_digest(circuit_setup: json):
+    """Hash of circuit_setup without the fields that modifications overwrite.
+
+    Memoised per setup object, as every voyage step and cache lookup asks again for the same setup;
+    only the fields modifications overwrite may change in place between calls.
+    """
+    entry = __digests.get(id(circuit_setup))
+    if entry is not None and entry[0] is circuit_setup:
+        __digests.move_to_end(id(circuit_setup))
+        return entry[1]
+
+    stripped = deepcopy(circuit_setup)
+    for key in VOLATILE_BATTERY_KEYS:
+        stripped['battery'].pop(key, None)
+    for config in stripped.get('mppt_panel', {}).values():
+        if type(config) == dict and 'panel_info' in config:
+            for key in VOLATILE_PANEL_KEYS:
+                config['panel_info'].pop(key, None)
+    for load in stripped.get('load', {}).values():
+        for key in VOLATILE_LOAD_KEYS:
+            load.pop(key, None)
+    digest = hashlib.sha1(json.dumps(stripped, sort_keys=True).encode()).hexdigest()
+
+    __digests[id(circuit_setup)] = (circuit_setup, digest)
+    if len(__digests) > DIGEST_MEMO_SIZE:
+        __digests.popitem(last=False)
+    return digest
+
+def interpolate_result(lower, upper, weight):
+    """Linear interpolation of every float in two results of the same structure."""
+    if type(lower) == float and type(upper) == float:
+        return lower + (upper - lower) * weight
+    if type(lower) == dict and type(upper) == dict and lower.keys() == upper.keys():
+        if lower.get("keyword") in ["warning", "error"]:
+            return deepcopy(lower if weight < 0.5 else upper)
+        return {key: interpolate_result(lower[key], upper[key], weight) for key in lower}
+    if type(lower) == list and type(upper) == list and len(lower) == len(upper):
+        return [interpolate_result(a, b, weight) for a, b in zip(lower, upper)]
+    return deepcopy(lower if weight < 0.5 else upper)
@@ -0,0 +1,56 @@
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
+from .pyspice_simulator import begin_simulation
+from .spice_session import Spice_Session
+
+# Per-process state, set once by init_worker
+__worker = {}
+
+
+def simulate_points(circuit_setup: json, modifications_list: list, ngspice_available: bool,
+                    simulation_logging=False, constants=None, workers=1):
+    """Run one operating point per modifications dict and return (succeeded, result) pairs in input order.
+
+    Every point starts from an unmodified copy of circuit_setup, so points do not depend on each other.
+    With workers > 1 the points are spread over spawned processes, each with its own NgSpice instance.
+    """
+    snapshot = deepcopy(circuit_setup)
+    if workers <= 1 or len(modifications_list) <= 1:
+        init_worker(snapshot, ngspice_available, simulation_logging, constants, create_ngspice=False)
+        return [simulate_point(modifications) for modifications in modifications_list]
+
+    chunksize = max(1, len(modifications_list) // (workers * 4))
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=init_worker,
+                             initargs=(snapshot, ngspice_available, simulation_logging, constants)) as executor:
+        return list(executor.map(simulate_point, modifications_list, chunksize=chunksize))
+
+
+def init_worker(circuit_setup: json, ngspice_available: bool, simulation_logging=False, constants=None, create_ngspice=True):
+    ngspice_shared = None
+    if ngspice_available and create_ngspice:
+        from PySpice.Spice.NgSpice.Shared import NgSpiceShared # type: ignore
+        ngspice_shared = NgSpiceShared.new_instance()
+
+    __worker["circuit_setup"] = circuit_setup
+    __worker["ngspice_available"] = ngspice_available
+    __worker["simulation_logging"] = simulation_logging
+    __worker["constants"] = constants
+    __worker["session"] = Spice_Session(deepcopy(circuit_setup), constants=constants, ngspice_shared=ngspice_shared)
+
+
+def simulate_point(modifications: dict):
+    constants = __worker["constants"]
+    session = __worker["session"]
+    session.circuit_setup = deepcopy(__worker["circuit_setup"])
+
+    if __worker["simulation_logging"]:
+        print(f"\n{constants['BARF']}Starting Simulation with: {modifications}{constants['BARE']}")
+
+    circuit, component_object, errors = session.build(modifications)
+    analysis, result = begin_simulation(circuit, component_object, errors, __worker["ngspice_available"],
+                                        constants=constants, session=session)
+    return analysis is not None, result
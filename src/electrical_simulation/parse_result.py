@@ -1,5 +1,24 @@
 import re
 
+import numpy as np
+
+
+class Bus_Value:
+    """Single solver value exposed like a PySpice waveform."""
+    def __init__(self, value):
+        self.value = value
+
+    def as_ndarray(self):
+        return np.array([self.value])
+
+
+class Bus_Analysis:
+    """Stands in for a PySpice operating point so parse_simulation_result can read solver output."""
+    def __init__(self, nodes: dict, branches: dict):
+        self.nodes = {name: Bus_Value(value) for name, value in nodes.items()}
+        self.branches = {name: Bus_Value(value) for name, value in branches.items()}
+
+
 def parse_simulation_result(analysis, result, struc, SIMULATION_LOGGING=False, SHOW_PANELS=False, constants=None):
     if analysis is None:
         return
@@ -7,102 +26,27 @@ def parse_simulation_result(analysis, result, struc, SIMULATION_LOGGING=False, S
     if SIMULATION_LOGGING:
         print(f"{constants['BARF']}Simulation Results:{constants['BARE']}")
     
-    # Node voltages
-    for node_name, node in analysis.nodes.items():
-        if "measured" in node_name:
-            continue
-        matched = False
-        
-        for dic in result.values():
-            if matched:
-                break
-            if 'ignore' in node_name:
-                matched = True
-                break
-            
-            if dic.get("keyword", 'None') in node_name:
-                matched = True
-                matches = dict(re.findall(constants["ARRAY_DECODER_PATTERN"], node_name))
-                if matches.get('arr') is not None:
-                    arr_no = int(matches['arr'])
-                    if arr_no + 1 > len(dic["data"]):
-                        dic["data"].extend(eval(struc) for _ in range(arr_no - len(dic["data"]) + 1))
-                        dic["array_count"] = len(dic["data"])
-
-                    dic["data"][arr_no]["voltage"][node_name.replace(f"arr{arr_no}_", "")] = float(node.as_ndarray()[0])
-                    dic["data"][arr_no]["array_index"] = arr_no
-                else:
-                    if len(dic["data"]) == 0:
-                        dic["data"].append(eval(struc))
-                        dic["array_count"] += 1
-                    dic["data"][0]["voltage"][node_name] = float(node.as_ndarray()[0])
-
-        if not matched:
-            print(f"Missing node ({node_name}): {float(node.as_ndarray()[0]):.2f} V")
+    layout = result_layout(analysis, result, struc, constants)
+    values = [__value(node) for node in analysis.nodes.values()] + [__value(branch) for branch in analysis.branches.values()]
+    
+    for key, records in layout.records.items():
+        result[key]["data"] = [{field: {name: values[index] for name, index in part.items()} if type(part) == dict else part
+                                for field, part in record.items()}
+                               for record in records]
+        result[key]["array_count"] = layout.counts[key]
+    
+    for node_name, index in layout.missing_nodes:
+        print(f"Missing node ({node_name}): {values[index]:.2f} V")
     
     # Post process voltage for battery
     ## Current measurement is to ground instead of across the battery, resulting in batt0 24V and batt2 48v
-    for data in result['battery_result']['data']:
-        voltages:dict = data['voltage']
-        
-        pos = []
-        neg = []
-        
-        for key in voltages.keys():
-            matches = dict(re.findall(constants["ARRAY_DECODER_PATTERN"], key))
-            series_no = int(matches['s'])
-
-            if "positive" in key:
-                if len(pos) < series_no + 1:
-                    pos.extend([[] for _ in range(series_no + 1 - len(pos))])
-                pos[series_no] = (key, series_no)
-            elif "negative" in key:
-                if len(neg) < series_no + 1:
-                    neg.extend([[] for _ in range(series_no + 1 - len(neg))])
-                neg[series_no] = (key, series_no)
-        
-        pos.sort(key=lambda x: -x[1])
-        neg.sort(key=lambda x: x[1])
-        
-        for i in range(len(pos)):
-            if i == len(pos) - 1:
-                break
-            voltages[pos[i][0]] = voltages[pos[i][0]] - voltages[pos[i + 1][0]]
-
-    # Branch currents
-    for branch_name, branch in analysis.branches.items():
-        if branch_name.startswith("v"):
-            branch_name = branch_name[1:]  # Remove 'v' prefix
-        
-        if "measured" in branch_name:
-            continue
-        
-        matched = False
-        
-        for dic in result.values():
-            if matched:
-                break
-            if dic.get("keyword", 'None') in branch_name:
-                matched = True
-                
-                matches = dict(re.findall(constants["ARRAY_DECODER_PATTERN"], branch_name))
-                if matches.get('arr') is not None:
-                    arr_no = int(matches['arr'])
-                    # Add to data list at index i of i:name
-                    if arr_no + 1 > len(dic["data"]):
-                        dic["data"].extend(eval(struc) for _ in range(arr_no - len(dic["data"]) + 1))
-                        dic["array_count"] = len(dic["data"])
-                        
-                    dic["data"][arr_no]["current"][branch_name.replace(f"arr{arr_no}_", "")] = float(branch.as_ndarray()[0])
-                    dic["data"][arr_no]["array_index"] = arr_no
-                else:
-                    if len(dic["data"]) == 0:
-                        dic["data"].append(eval(struc))
-                        dic["array_count"] += 1
-                        
-                    dic["data"][0]["current"][branch_name] = float(branch.as_ndarray()[0])
-        if not matched:
-            print(f"Branch {branch_name}: {float(branch.as_ndarray()[0]):.2f} A")
+    for data, subtractions in zip(result['battery_result']['data'], layout.battery_subtractions):
+        voltages = data['voltage']
+        for upper, lower in subtractions:
+            voltages[upper] = voltages[upper] - voltages[lower]
+    
+    for branch_name, index in layout.missing_branches:
+        print(f"Branch {branch_name}: {values[index]:.2f} A")
 
     if SIMULATION_LOGGING:
         for key in result.keys():
@@ -122,4 +66,139 @@ def parse_simulation_result(analysis, result, struc, SIMULATION_LOGGING=False, S
                 print("\t"*min(1, count) + "Currents:")
                 for branch, current in data['current'].items():
                     print("\t"*min(1, count) + f"\t{branch}: {current:.2f} A")
-            print(constants['BARE'])
\ No newline at end of file
+            print(constants['BARE'])
+
+
+def expand_reduced_analysis(analysis, component_object):
+    """Spread the results of a reduced netlist back over every parallel string it stands for.
+
+    Node voltages of the equivalent string hold for every string; the battery cell currents are
+    shared evenly between the battery strings.
+    """
+    battery_array = component_object["battery_array"]
+    scales = {f"arr{index}": solar_array.PANEL_IN_PARALLEL // solar_array.get_string_count()
+              for index, solar_array in enumerate(component_object.get("solar_array", []))}
+    battery_scale = battery_array.BATTERY_IN_PARALLEL // battery_array.get_string_count()
+
+    nodes = {}
+    for name, node in analysis.nodes.items():
+        value = float(node.as_ndarray()[0])
+        nodes[name] = value
+        prefix, _, rest = name.partition("_p0_")
+        if prefix in scales and "panel" in rest:
+            nodes.update({f"{prefix}_p{p}_{rest}": value for p in range(1, scales[prefix])})
+        elif name.startswith("p0_") and "battery" in name:
+            nodes.update({f"p{p}_{name[3:]}": value for p in range(1, battery_scale)})
+
+    branches = {}
+    for name, branch in analysis.branches.items():
+        value = float(branch.as_ndarray()[0])
+        if name.startswith("vp0_") and "battery" in name:
+            branches.update({f"vp{p}_{name[4:]}": value / battery_scale for p in range(battery_scale)})
+        else:
+            branches[name] = value
+
+    return Bus_Analysis(nodes, branches)
+
+
+class Result_Layout:
+    """Where every node and branch of one circuit topology goes in the result, worked out once.
+
+    records holds, per result category, the records parse_simulation_result fills in, with the index
+    of the analysis value in place of each voltage and current.
+    """
+    def __init__(self):
+        self.records = {}
+        self.counts = {}
+        self.missing_nodes = []
+        self.missing_branches = []
+        self.battery_subtractions = []
+
+
+# Compiled layouts, one per topology
+__layouts = {}
+
+
+def result_layout(analysis, result, struc, constants=None):
+    """Layout for the node and branch names of analysis, compiled on first use."""
+    node_names = tuple(analysis.nodes.keys())
+    branch_names = tuple(analysis.branches.keys())
+    key = (node_names, branch_names, tuple(dic.get("keyword") for dic in result.values()), struc, constants["ARRAY_DECODER_PATTERN"])
+    if key not in __layouts:
+        __layouts[key] = __compile_layout(node_names, branch_names, result, struc, constants)
+    return __layouts[key]
+
+
+def __compile_layout(node_names, branch_names, result, struc, constants):
+    """Sort every node and branch into the result the way the per-name scan always has, recording value indices."""
+    layout = Result_Layout()
+    categories = {key: {"keyword": dic.get("keyword", 'None'), "array_count": dic.get("array_count", 0), "data": []}
+                  for key, dic in result.items() if type(dic) == dict}
+    touched = set()
+    
+    def place(name, data_type, index):
+        for key, dic in categories.items():
+            if 'ignore' in name:
+                return True
+            if dic["keyword"] not in name:
+                continue
+            
+            touched.add(key)
+            matches = dict(re.findall(constants["ARRAY_DECODER_PATTERN"], name))
+            if matches.get('arr') is not None:
+                arr_no = int(matches['arr'])
+                if arr_no + 1 > len(dic["data"]):
+                    dic["data"].extend(eval(struc) for _ in range(arr_no - len(dic["data"]) + 1))
+                    dic["array_count"] = len(dic["data"])
+                dic["data"][arr_no][data_type][name.replace(f"arr{arr_no}_", "")] = index
+                dic["data"][arr_no]["array_index"] = arr_no
+            else:
+                if len(dic["data"]) == 0:
+                    dic["data"].append(eval(struc))
+                    dic["array_count"] += 1
+                dic["data"][0][data_type][name] = index
+            return True
+        return False
+    
+    # Node voltages
+    for index, node_name in enumerate(node_names):
+        if "measured" in node_name or "control" in node_name:
+            continue
+        if not place(node_name, "voltage", index):
+            layout.missing_nodes.append((node_name, index))
+    
+    # Branch currents
+    for index, branch_name in enumerate(branch_names, start=len(node_names)):
+        if branch_name.startswith("v"):
+            branch_name = branch_name[1:]  # Remove 'v' prefix
+        
+        if "measured" in branch_name or "control" in branch_name:
+            continue
+        if not place(branch_name, "current", index):
+            layout.missing_branches.append((branch_name, index))
+    
+    for key in touched:
+        layout.records[key] = categories[key]["data"]
+        layout.counts[key] = categories[key]["array_count"]
+    
+    # Battery voltages are measured to ground, so each cell subtracts the one below it
+    for data in categories.get('battery_result', {"data": []})["data"]:
+        pos = []
+        for key in data['voltage'].keys():
+            matches = dict(re.findall(constants["ARRAY_DECODER_PATTERN"], key))
+            series_no = int(matches['s'])
+            if "positive" in key:
+                if len(pos) < series_no + 1:
+                    pos.extend([[] for _ in range(series_no + 1 - len(pos))])
+                pos[series_no] = (key, series_no)
+        
+        pos.sort(key=lambda x: -x[1])
+        layout.battery_subtractions.append([(pos[i][0], pos[i + 1][0]) for i in range(len(pos) - 1)])
+    
+    return layout
+
+
+def __value(waveform):
+    if type(waveform) == Bus_Value:
+        return float(waveform.value)
+    return float(waveform.as_ndarray()[0])
@@ -1,11 +1,12 @@
 import datetime
-from .parse_result import parse_simulation_result
+from .parse_result import expand_reduced_analysis, parse_simulation_result
 from .result_checker import cross_check_result
 from PySpice.Spice.Netlist import Circuit # type: ignore
 
 def begin_simulation(circuit, component_object, errors, ngspice_available=False,
                      start_simulation=True, ignore_error=True, simulation_logging=False,
-                     show_panels=False, show_errors=False, show_warnings=False, constants=None):
+                     show_panels=False, show_errors=False, show_warnings=False, constants=None,
+                     session=None):
     simulation_started = False
     
     # Errors cannot be ignored for actual run
@@ -17,9 +18,15 @@ def begin_simulation(circuit, component_object, errors, ngspice_available=False,
         if start_simulation:
             simulation_started = True
             meta_data = {"name": circuit.title, "date": datetime.datetime.now().isoformat()}
-            analysis, result, struc = __simulate__(circuit, meta_data, errors, ngspice_available, simulation_logging, constants)
+            analysis, result, struc = __simulate__(circuit, meta_data, errors, ngspice_available, simulation_logging, constants,
+                                                   session=session, component_object=component_object)
+            if analysis is not None and component_object["battery_array"].REDUCED:
+                analysis = expand_reduced_analysis(analysis, component_object)
             parse_simulation_result(analysis, result, struc, simulation_logging, show_panels, constants=constants)
             cross_check_result(analysis, component_object, result, constants=constants)
+            # Iterations, solve time and retry path of the point (sessions record them per operating point)
+            if getattr(session, "statistics", None) is not None:
+                result["solver"] = session.statistics
     else:
         if show_errors and start_simulation:
             print(f"{constants['BARF']}Simulation Aborted Due to Errors in Circuit Setup.{constants['BARE']}")
@@ -39,7 +46,8 @@ def begin_simulation(circuit, component_object, errors, ngspice_available=False,
 
     return analysis, result
 
-def __simulate__(circuit: Circuit, meta_data, errors, NGSPICE_AVAILABLE, simulation_logging=False, constants=None):
+def create_result(meta_data, errors):
+    """Empty result structure filled in by parse_simulation_result."""
     struc = '{"array_index": 0, "voltage": {}, "current": {}}'
     mppt_result = {
         "keyword": "mppt",
@@ -111,17 +119,29 @@ def __simulate__(circuit: Circuit, meta_data, errors, NGSPICE_AVAILABLE, simulat
         "load_result": load_result,
         "l_array_result": load_array_result,
     }
+    return result, struc
+
+def __simulate__(circuit: Circuit, meta_data, errors, NGSPICE_AVAILABLE, simulation_logging=False, constants=None,
+                 session=None, component_object=None):
+    result, struc = create_result(meta_data, errors)
     
     if not NGSPICE_AVAILABLE:
         err = "NgSpice is not available. Simulation cannot proceed."
         result["error"]["data"].append(err)
         return None, result, struc
     
+    if session is not None:
+        session.statistics = None
     try:
         #print(circuit)
-        simulator = circuit.simulator(temperature=25, nominal_temperature=25)
-        analysis = simulator.operating_point()
+        if session is not None:
+            analysis = session.operating_point(component_object)
+        else:
+            simulator = circuit.simulator(temperature=25, nominal_temperature=25)
+            analysis = simulator.operating_point()
     except Exception as e:
+        if session is not None:
+            session.invalidate()
         result["error"]["data"].append("Error has occured during simulation. Check console for details.")
         return None, result, struc
     
@@ -1,3 +1,16 @@
+import json
+import numpy as np
+
+# Bits of the per-point flags from check_store
+KIRCHHOFF_FLAG = 1
+MPPT_LIMIT_FLAG = 2
+OVERCHARGE_FLAG = 4
+DISCHARGE_LIMIT_FLAG = 8
+CHECK_FLAGS = {"kirchhoff": KIRCHHOFF_FLAG, "mppt_limit": MPPT_LIMIT_FLAG,
+               "overcharge": OVERCHARGE_FLAG, "discharge_limit": DISCHARGE_LIMIT_FLAG}
+# Flags that cross_check_result reports as warnings rather than errors
+WARNING_FLAGS = MPPT_LIMIT_FLAG | OVERCHARGE_FLAG | DISCHARGE_LIMIT_FLAG
+
 
 def cross_check_result(analysis, component_object, result, constants=None):
     if analysis is None:
@@ -73,4 +86,62 @@ has been restricted to {actual_throttle*100:.2f}% instead of {throttle_setting*1
         
     result["warning"]["array_count"] = len(result["warning"]["data"])
     return None
-        
\ No newline at end of file
+        
+def check_store(store, circuit_setup: json, throttle=None, constants=None):
+    """Run the checks of cross_check_result on every point of a Result_Store at once.
+
+    Works on the store's columns instead of the result dicts. Returns a uint8 array with one
+    CHECK_FLAGS bit per failed check and point, and a summary with the number of points per check
+    and the largest Kirchhoff residual. Both are also kept on the store as flags and checks.
+    throttle is the throttle setting per point (array or scalar); by default the store's "throttle"
+    series, else each load's configured throttle.
+    """
+    EPSILON = constants["EPSILON"]
+    length = len(store)
+
+    def column(category, array_index, data_type, key):
+        if (category, array_index, data_type, key) not in store.columns:
+            return np.zeros(length)
+        return store.column(category, array_index, data_type, key)
+
+    def currents(category):
+        return sum((store.column(*key) for key in store.keys(category, 'current')), np.zeros(length))
+
+    flags = np.zeros(length, dtype=np.uint8)
+
+    residual = (column('summary', 0, 'current', 'total_mppt_output_current')
+                - column('summary', 0, 'current', 'total_battery_input_current')
+                - currents('load_result') - currents('load_balancer'))
+    flags[residual > EPSILON] |= KIRCHHOFF_FLAG
+
+    mppt_configs = [config for key, config in circuit_setup.get('mppt_panel', {}).items()
+                    if key.startswith("config_") for _ in range(config['count'])]
+    for index, config in enumerate(mppt_configs):
+        output = column('mppt_result', index, 'current', 'mppt_output')
+        flags[config['mppt_info']['max_output_current'] - output < EPSILON] |= MPPT_LIMIT_FLAG
+
+    flags[column('load_balancer', 0, 'current', 'balancing_load') > EPSILON] |= OVERCHARGE_FLAG
+
+    efficiencies = [config['mppt_info']['efficiency'] for config in mppt_configs]
+    average_efficiency = sum(efficiencies) / len(efficiencies) if efficiencies else 1.0
+    if throttle is None and "throttle" in store.series:
+        throttle = store.series_values("throttle")
+    for index, load in enumerate(circuit_setup.get('load', {}).values()):
+        voltages = [key for key in store.keys('load_result', 'voltage') if key[1] == index]
+        load_currents = [key for key in store.keys('load_result', 'current') if key[1] == index]
+        if not voltages or not load_currents:
+            continue
+        actual_power = store.column(*voltages[0]) * store.column(*load_currents[0])
+        power_rating = load["total_power"] * average_efficiency
+        actual_throttle = actual_power / power_rating if power_rating > 0 else np.zeros(length)
+        setting = load.get("throttle", 1.0) if throttle is None else throttle
+        flags[(setting - actual_throttle) * 100 > constants["POWER_MISMATCH_TOLERANCE_PERCENTAGE"]] |= DISCHARGE_LIMIT_FLAG
+
+    summary = {"points": length, "flagged": int(np.count_nonzero(flags))}
+    for name, bit in CHECK_FLAGS.items():
+        summary[name] = int(np.count_nonzero(flags & bit))
+    summary["max_kirchhoff_residual"] = float(np.nanmax(np.abs(residual))) if length > 0 else 0.0
+
+    store.flags = flags
+    store.checks = summary
+    return flags, summary
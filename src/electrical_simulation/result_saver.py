@@ -1,8 +1,33 @@
 import json
 
+WARNING_FILE_NAME = "sweep_simulation_warnings.json"
+ERROR_FILE_NAME = "sweep_simulation_errors.json"
+DATA_FILE_NAME = "sweep_simulation_results.npz"
+CHECK_FILE_NAME = "sweep_simulation_checks.json"
+
 def save_to_file(result, save_path, constants=None):
     
     json_result = json.dumps(result, indent=4)
     with open(save_path, 'w') as f:
         f.write(json_result)
-        print(f"\n{constants['BARF']}Simulation results saved to {save_path}{constants['BARE']}")
\ No newline at end of file
+        print(f"\n{constants['BARF']}Simulation results saved to {save_path}{constants['BARE']}")
+
+def save_store(store, save_path):
+    """Write the warning points, errors and columnar data of a Result_Store next to save_path."""
+    warning_points = store.warning_points()
+    with open(save_path + "." + WARNING_FILE_NAME, 'w') as f:
+        json.dump(warning_points, f, indent=4)
+        print(f"\n({len(warning_points)})\tWarning points saved to {save_path}.{WARNING_FILE_NAME}")
+
+    with open(save_path + "." + ERROR_FILE_NAME, 'w') as f:
+        json.dump(store.errors, f, indent=4)
+        print(f"({len(store.errors)})\tErrors saved to {save_path}.{ERROR_FILE_NAME}")
+
+    if store.checks is not None:
+        with open(save_path + "." + CHECK_FILE_NAME, 'w') as f:
+            json.dump(store.checks, f, indent=4)
+            print(f"({store.checks['flagged']})\tFlagged points saved to {save_path}.{CHECK_FILE_NAME}")
+
+    save_file = save_path + "." + DATA_FILE_NAME
+    store.save(save_file)
+    print(f"Data saved to {save_file}")
@@ -0,0 +1,137 @@
+import json
+import numpy as np
+
+INITIAL_CAPACITY = 64
+KEY_SEPARATOR = "/"
+
+
+class Result_Store:
+    """Columnar copy of a sequence of operating point results.
+
+    Every (category, array index, voltage/current, key) of the result dicts becomes one float array
+    next to the x axis, so a long voyage keeps numbers instead of nested dicts. Values missing at a
+    point are NaN. Named per-point series (e.g. battery capacity) and the warning/error text are kept
+    alongside. NgSpice points also add the solver_iterations, solve_ms and solver_retries series.
+    """
+    def __init__(self, x_label=""):
+        self.x_label = x_label
+        self.length = 0
+        self.capacity = INITIAL_CAPACITY
+        self.x = np.empty(self.capacity)
+        self.columns = {}
+        self.series = {}
+        self.warnings = {}
+        self.errors = []
+        self.flags = None       # per-point check bits from result_checker.check_store
+        self.checks = None
+
+    def __len__(self):
+        return self.length
+
+    def append(self, x, result: dict, **series):
+        """Add one point at x; series are extra per-point values such as battery_capacity."""
+        if self.length == self.capacity:
+            self.__grow()
+        index = self.length
+        self.length += 1
+        self.x[index] = x
+
+        for category, category_data in result.items():
+            if category in ["error", "warning"] or type(category_data) != dict or 'data' not in category_data:
+                continue
+            for array_item in category_data['data']:
+                array_index = array_item.get('array_index', 0)
+                for data_type in ['voltage', 'current']:
+                    for key, value in array_item.get(data_type, {}).items():
+                        self.__array(self.columns, (category, array_index, data_type, key))[index] = value
+
+        for name, value in series.items():
+            self.__array(self.series, name)[index] = value
+
+        statistics = result.get('solver')
+        if statistics is not None:
+            self.__array(self.series, "solver_iterations")[index] = np.nan if statistics["iterations"] is None else statistics["iterations"]
+            self.__array(self.series, "solve_ms")[index] = statistics["solve_ms"]
+            self.__array(self.series, "solver_retries")[index] = statistics["retries"]
+
+        if result.get('warning', {}).get('array_count', 0) > 0:
+            self.warnings[index] = list(result['warning']['data'])
+        for error in result.get('error', {}).get('data', []):
+            if error not in self.errors:
+                self.errors.append(error)
+
+    def x_axis(self):
+        return self.x[:self.length]
+
+    def column(self, category: str, array_index: int, data_type: str, key: str):
+        return self.columns[(category, array_index, data_type, key)][:self.length]
+
+    def series_values(self, name: str):
+        return self.series[name][:self.length]
+
+    def keys(self, category: str = None, data_type: str = None):
+        """Column keys in the order they first appeared, optionally filtered."""
+        return [key for key in self.columns
+                if (category is None or key[0] == category) and (data_type is None or key[2] == data_type)]
+
+    def last(self, name: str):
+        """Latest value of a named series."""
+        return float(self.series[name][self.length - 1])
+
+    def warning_points(self):
+        return [{'x': float(self.x[index]), 'warnings': warnings} for index, warnings in self.warnings.items()]
+
+    def save(self, path: str):
+        arrays = {"x": self.x_axis()}
+        for key in self.columns:
+            arrays[KEY_SEPARATOR.join(["column"] + [str(part) for part in key])] = self.column(*key)
+        for name in self.series:
+            arrays[KEY_SEPARATOR.join(["series", name])] = self.series_values(name)
+        arrays["warning_index"] = np.array(list(self.warnings.keys()), dtype=int)
+        arrays["warning_text"] = np.array([json.dumps(warnings) for warnings in self.warnings.values()], dtype=str)
+        arrays["error_text"] = np.array(self.errors, dtype=str)
+        arrays["x_label"] = np.array(self.x_label)
+        if self.flags is not None:
+            arrays["check_flags"] = self.flags
+        np.savez_compressed(path, **arrays)
+
+    @classmethod
+    def load(cls, path: str):
+        data = np.load(path)
+        store = cls(str(data["x_label"]))
+        store.x = np.array(data["x"], dtype=float)
+        store.length = store.capacity = len(store.x)
+        for name in data.files:
+            parts = name.split(KEY_SEPARATOR)
+            if parts[0] == "column":
+                category, array_index, data_type = parts[1], int(parts[2]), parts[3]
+                store.columns[(category, array_index, data_type, KEY_SEPARATOR.join(parts[4:]))] = np.array(data[name])
+            elif parts[0] == "series":
+                store.series[KEY_SEPARATOR.join(parts[1:])] = np.array(data[name])
+        store.warnings = {int(index): json.loads(text) for index, text in zip(data["warning_index"], data["warning_text"])}
+        store.errors = [str(error) for error in data["error_text"]]
+        if "check_flags" in data.files:
+            store.flags = np.array(data["check_flags"])
+        return store
+
+    def __array(self, arrays: dict, key):
+        if key not in arrays:
+            arrays[key] = np.full(self.capacity, np.nan)
+        return arrays[key]
+
+    def __grow(self):
+        self.capacity *= 2
+        self.x = np.resize(self.x, self.capacity)
+        for arrays in [self.columns, self.series]:
+            for key, values in arrays.items():
+                grown = np.full(self.capacity, np.nan)
+                grown[:len(values)] = values
+                arrays[key] = grown
+
+
+def store_results(results: list, x_axis: list, x_label: str = "", **series):
+    """Result_Store for a list of result dicts and their x values; series are per-point value lists."""
+    store = Result_Store(x_label)
+    for index, (x, result) in enumerate(zip(x_axis, results)):
+        store.append(x, result, **{name: values[index] for name, values in series.items()})
+    return store
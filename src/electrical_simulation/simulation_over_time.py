@@ -1,51 +1,112 @@
-from copy import deepcopy
 import json
-from .sweep_graph_generation import generate_graph
+import math
+import os
+import time
 from .pyspice_simulator import begin_simulation
-from .circuit_constructor import build_circuit_from_json
+from .netlist_template import netlist_template
+from .dc_bus_solver import begin_closed_form_simulation
+from .result_store import Result_Store
+from .irradiance import STC_IRRADIANCE, irradiance_source
+from .result_checker import check_store
+from .simulation_sweeper import save_sweep
 
 SIMULATION_INTERVAL_MIN = 1
 
-def start_voyage(circuit_setup: json, voyage_config_loc: str, save_path: str, ngspice_available: bool, constants=None):
+# Adaptive integrator
+ADAPTIVE_INITIAL_STEP_MIN = 1
+ADAPTIVE_MAX_STEP_MIN = 240
+ADAPTIVE_MAX_GROWTH = 4
+ADAPTIVE_SOC_TOLERANCE = 1e-4   # SOC error allowed per step
+EVENT_TOLERANCE_MIN = 0.01      # events are located to within this many minutes
+
+REAL_TIME_LATENCY_BUDGET_MS = 10
+TELEMETRY_FIELDS = ["time", "throttle", "solar_power", "irradiance", "soc"]   # numeric telemetry sample fields
+
+VOYAGE_GRAPH = {"x_label": "Time (minutes)",
+                "voltage_display_choice": ['load_result', "mppt_result"],
+                "current_display_choice": ['summary', 'load_result'],
+                "power_display_choice": ['load_result', 'battery_result'],
+                "battery_capacity": True}
+
+def start_voyage(circuit_setup: json, voyage_config_loc: str, save_path: str, ngspice_available: bool, constants=None,
+                 solver="spice", integrator="fixed", cache=None, save_output=True, plot=True):
+    """Run the voyage and return its Result_Store; with plot=False matplotlib is not imported."""
     with open(voyage_config_loc, 'r') as f:
         data = json.load(f)
 
-    voyage_info = data['voyage_info']
+    store = simulate_voyage(circuit_setup, data, ngspice_available, constants, solver, integrator, cache,
+                            voyage_dir=os.path.dirname(voyage_config_loc))
+    save_sweep(store, VOYAGE_GRAPH, save_path if save_output else None, plot, constants)
+    
+    if cache is not None:
+        cache.report(constants)
+    return store
+    
+def simulate_voyage(circuit_setup: json, data: json, ngspice_available: bool, constants=None, solver="spice",
+                    integrator="fixed", cache=None, voyage_dir="."):
+    """Checked Result_Store of the voyage config data, without saving or plotting.
+
+    A relative irradiance file in data is resolved against voyage_dir.
+    """
     current_soc = data['initial_battery_soc']
     segments = data['segments']
+    irradiance = irradiance_source(data.get('irradiance'), voyage_dir)
     
     battery_info = circuit_setup['battery']
     battery_capacity_Amin = battery_info['capacity_ah'] * battery_info['battery_in_parallel'] * 60
     
+    if integrator == "adaptive":
+        store = step_voyage_adaptive(
+            circuit_setup, segments, current_soc, battery_capacity_Amin, ngspice_available, solver, constants, cache, irradiance)
+    else:
+        store = step_voyage_fixed(
+            circuit_setup, segments, current_soc, battery_capacity_Amin, ngspice_available, solver, constants, cache, irradiance)
+    
+    check_store(store, circuit_setup, constants=constants)
+    return store
+
+def step_voyage_fixed(circuit_setup: json, segments: list, current_soc: float, battery_capacity_Amin: float,
+                      ngspice_available: bool, solver="spice", constants=None, cache=None, irradiance=None):
+    """Step every segment in SIMULATION_INTERVAL_MIN increments.
+
+    With an Irradiance_Source the panel power setting follows it instead of the segment's solar_power,
+    and steps also end where the irradiance changes.
+    """
     current_capacity_Amin = current_soc * battery_capacity_Amin
 
-    time_range_min = [0]
-    results = []
-    battery_capacity_list = [current_capacity_Amin]
+    store = Result_Store("Time (minutes)")
     
     segment_length = len(segments)
+    segment_start = 0
+    
+    # Modifications are written into circuit_setup, so the configured limits are passed on every
+    # step to undo a previous hold at full or empty
+    battery_limits = {'max_charge_current': circuit_setup['battery']['max_charge_current'],
+                      'max_discharge_current': circuit_setup['battery']['max_discharge_current']}
     
     for segment_idx in range(segment_length):
         segment = segments[segment_idx]
         
         duration_minutes = segment['duration_minutes']
         throttle_setting = segment['throttle']
-        panel_power_setting = segment['solar_power']
+        panel_power_setting = segment.get('solar_power')
         
         elapsed = 0
         while elapsed < duration_minutes:
             step = min(SIMULATION_INTERVAL_MIN, duration_minutes - elapsed)
+            if irradiance is not None:
+                panel_power_setting = irradiance.at(segment_start + elapsed)
+                step = irradiance.run_length(segment_start + elapsed, step)
             
-            modifications = {}
+            modifications = dict(battery_limits)
             modifications['panel_power_setting'] = panel_power_setting
             modifications['throttle_setting'] = throttle_setting
             modifications['current_soc'] = current_soc
             
-            circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, modifications=modifications, constants=constants)
-            analysis, result = begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants)
+            analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
 
-            if results == []:
-                results.append(result)
+            if len(store) == 0:
+                store.append(0, result, battery_capacity=current_capacity_Amin, throttle=throttle_setting)
 
             if analysis is None:
                 print(f"{constants['BARF']}Simulation Aborted{constants['BARE']}")
@@ -57,84 +118,327 @@ def start_voyage(circuit_setup: json, voyage_config_loc: str, save_path: str, ng
                 time_to_full = (battery_capacity_Amin - current_capacity_Amin) / battery_charge_current_A
                 
                 if time_to_full > constants["EPSILON"]:
-                    results.append(result)
-                    time_range_min.append(time_range_min[-1] + time_to_full)
                     current_capacity_Amin = battery_capacity_Amin
-                    battery_capacity_list.append(current_capacity_Amin)
                     current_soc = 1.0
-                    step_up_prev(results, time_range_min, battery_capacity_list)
+                    step_up(store, result, time_to_full, current_capacity_Amin, throttle=throttle_setting)
                 
                 remaining = step - time_to_full
                 if remaining > constants["EPSILON"]:
                     modifications['max_charge_current'] = 0
-                    circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, modifications=modifications, constants=constants)
-                    analysis, result = begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants)
+                    analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
                     
-                    results.append(result)
-                    time_range_min.append(time_range_min[-1] + remaining)
-                    battery_capacity_list.append(current_capacity_Amin)
-                    step_up_prev(results, time_range_min, battery_capacity_list)
+                    step_up(store, result, remaining, current_capacity_Amin, throttle=throttle_setting)
             
             elif current_capacity_Amin + (battery_charge_current_A * step) < 0:
                 time_to_empty = abs(current_capacity_Amin / battery_charge_current_A)
                 
                 if time_to_empty > constants["EPSILON"]:
-                    results.append(result)
-                    time_range_min.append(time_range_min[-1] + time_to_empty)
                     current_capacity_Amin = 0
-                    battery_capacity_list.append(current_capacity_Amin)
-                    step_up_prev(results, time_range_min, battery_capacity_list)
+                    step_up(store, result, time_to_empty, current_capacity_Amin, throttle=throttle_setting)
                 
                 remaining = step - time_to_empty
                 if remaining > constants["EPSILON"]:
                     modifications['max_discharge_current'] = 0
-                    circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, modifications=modifications, constants=constants)
-                    analysis, result = begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants)
+                    analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
                     
-                    results.append(result)
-                    time_range_min.append(time_range_min[-1] + remaining)
-                    battery_capacity_list.append(current_capacity_Amin)
                     current_soc = 0.0
-                    step_up_prev(results, time_range_min, battery_capacity_list)
+                    step_up(store, result, remaining, current_capacity_Amin, throttle=throttle_setting)
             
             else:          
-                results.append(result)
-                time_range_min.append(time_range_min[-1] + step)
                 current_capacity_Amin = current_capacity_Amin + (battery_charge_current_A * step)
                 current_soc = current_capacity_Amin / battery_capacity_Amin
-                battery_capacity_list.append(current_capacity_Amin)
-                step_up_prev(results, time_range_min, battery_capacity_list)
+                step_up(store, result, step, current_capacity_Amin, throttle=throttle_setting)
             
             elapsed += step
         
+        segment_start += duration_minutes
         if analysis is None:
             break
     
-    #print(json.dumps(results, indent=4))
-    generate_graph(results=results, x_axis=time_range_min, x_label="Time (minutes)",
-                   voltage_display_choice=['load_result', "mppt_result"],
-                   current_display_choice=['summary', 'load_result'],
-                   power_display_choice=['load_result', 'battery_result'],
-                   battery_capacity=battery_capacity_list,
-                   save_path=save_path, constants=constants)   
-    
-def real_time_digital_simulation(circuit_setup: json, ngspice_available: bool):
-    None
+    return store
 
-def step_up_prev(results: list, time_range_min: list, battery_capacity_list: list):
-    prev = results[-2]
-    curr = results[-1]
-    
-    copy = deepcopy(curr)
-    """ if copy.get('battery_result') is not None:
-        if copy['battery_result'].get("data") is not None:
-            data = copy['battery_result']["data"]
-            data[0]["voltage"] = prev['battery_result']["data"][0]["voltage"]
-     """
-    results.append(copy)
-    
-    
-    time_range_min.insert(-1, time_range_min[-2])
+def step_voyage_adaptive(circuit_setup: json, segments: list, current_soc: float, battery_capacity_Amin: float,
+                         ngspice_available: bool, solver="spice", constants=None, cache=None, irradiance=None):
+    """Integrate battery capacity over every segment with adaptive trapezoidal steps.
+
+    Within a segment only SOC changes, so the step grows while the battery current changes slowly.
+    SOC=0/1 crossings and changes in the number of active limits (MPPT output limit, overcharge,
+    discharge restriction) are located by root-finding and end the step exactly on the event.
+    Once the battery is held full or empty the operating point stays fixed until the segment ends.
+    With an Irradiance_Source steps also end where the irradiance changes, so runs of equal
+    irradiance (e.g. night) are still taken in large steps.
+    """
+    current_capacity_Amin = current_soc * battery_capacity_Amin
+
+    store = Result_Store("Time (minutes)")
+    analysis = None
+    step = ADAPTIVE_INITIAL_STEP_MIN
     
-    # Keep the battery slanted
-    battery_capacity_list.insert(-1, battery_capacity_list[-2])
\ No newline at end of file
+    # Modifications are written into circuit_setup, so the configured limits are passed on every
+    # evaluation to undo a previous hold at full or empty
+    battery_limits = {'max_charge_current': circuit_setup['battery']['max_charge_current'],
+                      'max_discharge_current': circuit_setup['battery']['max_discharge_current']}
+
+    segment_start = 0
+    for segment in segments:
+        base = dict(battery_limits, panel_power_setting=segment.get('solar_power'), throttle_setting=segment['throttle'])
+
+        def evaluate(capacity_Amin, hold_limits=False):
+            modifications = dict(base, current_soc=min(max(capacity_Amin / battery_capacity_Amin, 0.0), 1.0))
+            analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
+            if analysis is None:
+                return None, result, 0.0
+            current = result["summary"]["data"][0]["current"]["total_battery_input_current"]
+
+            # Held at a limit, the battery cannot move past full or empty
+            if hold_limits and capacity_Amin >= battery_capacity_Amin - constants["EPSILON"] and current > constants["EPSILON"]:
+                modifications['max_charge_current'] = 0
+            elif hold_limits and capacity_Amin <= constants["EPSILON"] and current < -constants["EPSILON"]:
+                modifications['max_discharge_current'] = 0
+            else:
+                return analysis, result, current
+            analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
+            return analysis, result, 0.0
+
+        duration_minutes = segment['duration_minutes']
+        elapsed = 0
+        while duration_minutes - elapsed > constants["EPSILON"]:
+            remaining = duration_minutes - elapsed
+            if irradiance is not None:
+                base['panel_power_setting'] = irradiance.at(segment_start + elapsed)
+                remaining = irradiance.run_length(segment_start + elapsed, remaining)
+
+            analysis, result, current = evaluate(current_capacity_Amin, hold_limits=True)
+
+            if len(store) == 0:
+                store.append(0, result, battery_capacity=current_capacity_Amin, throttle=base['throttle_setting'])
+
+            if analysis is None:
+                print(f"{constants['BARF']}Simulation Aborted{constants['BARE']}")
+                break
+
+            if current == 0.0:
+                # Held full or empty: nothing changes for the rest of the segment (or irradiance run)
+                h = remaining
+                next_capacity_Amin = current_capacity_Amin
+            else:
+                h, next_capacity_Amin, error = __adaptive_step(evaluate, result, current, current_capacity_Amin,
+                                                               min(step, remaining), battery_capacity_Amin, constants)
+                if h is None:
+                    analysis = None
+                    print(f"{constants['BARF']}Simulation Aborted{constants['BARE']}")
+                    break
+                step = __next_step_size(h, error, step)
+
+            current_capacity_Amin = next_capacity_Amin
+            step_up(store, result, h, current_capacity_Amin, throttle=base['throttle_setting'])
+            elapsed += h
+
+        segment_start += duration_minutes
+        if analysis is None:
+            break
+
+    return store
+
+def __adaptive_step(evaluate, result, current, capacity_Amin, h, battery_capacity_Amin, constants):
+    """Take one trapezoidal step of at most h minutes, returning (h, next capacity, relative error)."""
+    regime = __operating_regime(result)
+
+    while True:
+        analysis, end_result, end_current = evaluate(capacity_Amin + h * current)
+        if analysis is None:
+            return None, None, None
+        error = abs(h * (end_current - current) / 2) / battery_capacity_Amin
+        if error <= ADAPTIVE_SOC_TOLERANCE or h <= EVENT_TOLERANCE_MIN:
+            break
+        h /= 2
+
+    # A limit engaged or released inside the step: end the step where it happens
+    if __operating_regime(end_result) != regime:
+        low, high = 0.0, h
+        while high - low > EVENT_TOLERANCE_MIN:
+            middle = (low + high) / 2
+            analysis, middle_result, _ = evaluate(capacity_Amin + middle * current)
+            if analysis is None:
+                return None, None, None
+            if __operating_regime(middle_result) == regime:
+                low = middle
+            else:
+                high = middle
+        h = high
+        analysis, end_result, end_current = evaluate(capacity_Amin + h * current)
+        if analysis is None:
+            return None, None, None
+
+    next_capacity_Amin = capacity_Amin + h * (current + end_current) / 2
+
+    # Battery reaches full or empty inside the step: solve for the crossing time
+    target = None
+    if next_capacity_Amin > battery_capacity_Amin:
+        target = battery_capacity_Amin
+    elif next_capacity_Amin < 0:
+        target = 0.0
+    if target is not None:
+        def crossing(t):
+            analysis, _, t_current = evaluate(capacity_Amin + t * current)
+            return capacity_Amin + t * (current + t_current) / 2 - target if analysis is not None else None
+        h = find_root(crossing, 0.0, capacity_Amin - target, h, next_capacity_Amin - target, EVENT_TOLERANCE_MIN, constants)
+        if h is None:
+            return None, None, None
+        next_capacity_Amin = target
+
+    return h, next_capacity_Amin, error
+
+def find_root(function, low, f_low, high, f_high, tolerance, constants):
+    """Illinois regula falsi on a bracketing interval, to within tolerance. Returns None if function does."""
+    side = 0
+    while high - low > tolerance:
+        middle = high - f_high * (high - low) / (f_high - f_low)
+        f_middle = function(middle)
+        if f_middle is None:
+            return None
+        if abs(f_middle) < constants["EPSILON"]:
+            return middle
+        if (f_middle > 0) == (f_high > 0):
+            high, f_high = middle, f_middle
+            if side == -1:
+                f_low /= 2
+            side = -1
+        else:
+            low, f_low = middle, f_middle
+            if side == 1:
+                f_high /= 2
+            side = 1
+    return high
+
+def __next_step_size(h, error, step):
+    if error == 0:
+        return min(ADAPTIVE_MAX_STEP_MIN, max(step, h) * ADAPTIVE_MAX_GROWTH)
+    growth = min(ADAPTIVE_MAX_GROWTH, 0.9 * (ADAPTIVE_SOC_TOLERANCE / error) ** 0.5)
+    return min(ADAPTIVE_MAX_STEP_MIN, max(EVENT_TOLERANCE_MIN, h * growth))
+
+def __operating_regime(result):
+    # Each active limit (MPPT output limit, overcharge, discharge restriction) adds one warning
+    return result["warning"]["array_count"]
+
+def simulate_step(circuit_setup: json, modifications: dict, ngspice_available: bool, solver="spice", constants=None, cache=None):
+    if cache is not None:
+        return cache.simulate(circuit_setup, modifications,
+                              lambda quantised: simulate_step(circuit_setup, quantised, ngspice_available, solver, constants))
+    if solver == "closed_form":
+        return begin_closed_form_simulation(circuit_setup, modifications, constants=constants)
+    template = netlist_template(circuit_setup, constants=constants)
+    circuit, component_object, errors = template.build(modifications)
+    return begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants, session=template)
+
+def real_time_digital_simulation(circuit_setup: json, ngspice_available: bool, input_stream, output_stream,
+                                 solver="spice", constants=None, cache=None):
+    """Predict the operating point and time-to-empty for every telemetry sample, one NDJSON line in and one out.
+
+    Input lines hold "time" (seconds), "throttle", "solar_power" (panel power setting) or "irradiance"
+    (W/m^2, relative to STC_IRRADIANCE) and optionally a measured "soc". Settings missing from a sample
+    keep their previous value; without a measured SOC it is carried forward from the previous
+    prediction over the elapsed time. Lines that are not a JSON object with finite numeric fields get an
+    error record and are skipped. The solver stays warm between samples (compiled netlist template
+    and NgSpice session, or the closed-form solver), and cache can hold an Operating_Point_Cache.
+    Returns the per-sample latency summary.
+    """
+    battery_info = circuit_setup['battery']
+    battery_capacity_Amin = battery_info['capacity_ah'] * battery_info['battery_in_parallel'] * 60
+    # Modifications are written into circuit_setup, so the configured limits are passed every time
+    battery_limits = {'max_charge_current': battery_info['max_charge_current'],
+                      'max_discharge_current': battery_info['max_discharge_current']}
+    settings = {}
+    soc = battery_info.get('current_soc', 1.0)
+    previous_time = None
+    previous_current = 0.0
+    latencies = []
+
+    for line in input_stream:
+        if not line.strip():
+            continue
+        start = time.perf_counter()
+        try:
+            sample = json.loads(line)
+            if type(sample) != dict:
+                raise ValueError(f"expected a JSON object, got {type(sample).__name__}")
+            sample = dict(sample, **{key: float(sample[key]) for key in TELEMETRY_FIELDS if sample.get(key) is not None})
+            for key in TELEMETRY_FIELDS:
+                if sample.get(key) is not None and not math.isfinite(sample[key]):
+                    raise ValueError(f"{key} is {sample[key]}")
+        except (ValueError, TypeError) as e:
+            __stream(output_stream, {"error": f"Invalid telemetry line: {e}"})
+            continue
+
+        sample_time = sample.get("time")
+        if sample.get("soc") is not None:
+            soc = float(sample["soc"])
+        elif sample_time is not None and previous_time is not None and sample_time > previous_time:
+            soc += previous_current * (sample_time - previous_time) / 60 / battery_capacity_Amin
+        soc = min(max(soc, 0.0), 1.0)
+        if sample_time is not None:
+            previous_time = sample_time
+
+        if sample.get("throttle") is not None:
+            settings['throttle_setting'] = sample["throttle"]
+        if sample.get("solar_power") is not None:
+            settings['panel_power_setting'] = sample["solar_power"]
+        elif sample.get("irradiance") is not None:
+            settings['panel_power_setting'] = min(max(sample["irradiance"] / STC_IRRADIANCE, 0.0), 1.0)
+
+        modifications = dict(battery_limits, current_soc=soc, **settings)
+        analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
+        if analysis is not None:
+            current = result["summary"]["data"][0]["current"]["total_battery_input_current"]
+            # A full or empty battery is held there, as in the voyage integrators
+            if (soc >= 1.0 and current > constants["EPSILON"]) or (soc <= 0.0 and current < -constants["EPSILON"]):
+                modifications['max_charge_current' if current > 0 else 'max_discharge_current'] = 0
+                analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants, cache)
+        if analysis is None:
+            previous_current = 0.0
+            __stream(output_stream, {"time": sample_time, "soc": soc, "error": result["error"]["data"]})
+            continue
+        current = result["summary"]["data"][0]["current"]["total_battery_input_current"]
+        previous_current = current
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        latencies.append(latency_ms)
+        __stream(output_stream, {
+            "time": sample_time,
+            "soc": soc,
+            "battery_current": current,
+            "time_to_empty_min": soc * battery_capacity_Amin / -current if current < -constants["EPSILON"] else None,
+            "summary": result["summary"]["data"][0],
+            "warnings": result["warning"]["data"],
+            "errors": result["error"]["data"],
+            "latency_ms": latency_ms,
+        })
+
+    return __latency_summary(latencies)
+
+def __stream(output_stream, record):
+    output_stream.write(json.dumps(record) + "\n")
+    output_stream.flush()
+
+def __latency_summary(latencies):
+    if not latencies:
+        return {"samples": 0}
+    ordered = sorted(latencies)
+    return {"samples": len(ordered),
+            "p50_ms": ordered[len(ordered) // 2],
+            "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            "max_ms": ordered[-1],
+            "over_budget": sum(latency > REAL_TIME_LATENCY_BUDGET_MS for latency in ordered)}
+
+def step_up(store: Result_Store, result: dict, duration: float, battery_capacity_Amin: float, **series):
+    """Record result as a flat step of duration minutes: once at the previous time and battery capacity,
+    once at the end of the step with the new battery capacity (kept slanted). series (e.g. throttle)
+    are recorded at both points."""
+    start = store.x_axis()[-1]
+    store.append(start, result, battery_capacity=store.last("battery_capacity"), **series)
+    store.append(start + duration, result, battery_capacity=battery_capacity_Amin, **series)
+
+def voyage_completed(store: Result_Store, segments: list, constants):
+    """Whether store reaches the end of every segment; an aborted voyage stops short without an error."""
+    total = sum(segment['duration_minutes'] for segment in segments)
+    return len(store) > 0 and store.x_axis()[-1] >= total - constants["EPSILON"]
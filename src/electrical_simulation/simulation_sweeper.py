@@ -1,55 +1,185 @@
 import json
-from .sweep_graph_generation import generate_graph
-from .pyspice_simulator import begin_simulation
-from .circuit_constructor import build_circuit_from_json
+import numpy as np
+from .dc_bus_solver import dc_bus_checks, dc_bus_results, solve_dc_bus
+from .parallel_sweep import simulate_points
+from .result_checker import check_store
+from .result_saver import save_store
+from .result_store import store_results
 
 SWEEP_INTERVAL_COUNT = 100
+# Adaptive sweeps start on a coarse grid and bisect intervals until they are straight or this narrow
+ADAPTIVE_COARSE_COUNT = 8
+ADAPTIVE_MIN_INTERVAL = 1 / 512
+ADAPTIVE_CURRENT_TOLERANCE = 0.05   # A, largest midpoint deviation from the straight line between neighbours
+# Summary currents watched for slope changes
+ADAPTIVE_MONITORED = ["total_battery_input_current", "total_mppt_output_current"]
+MAP_DATA_FILE_NAME = "sweep_map_results.npz"
+
+# generate_graph arguments per sweep, also used to re-plot saved data
+THROTTLE_GRAPH = {"x_label": "Throttle Input (%)",
+                  "voltage_display_choice": ['mppt_result', 'load_result'],
+                  "current_display_choice": ['mppt_result', 'solar_result', 'load_result', 'battery_result'],
+                  "power_display_choice": ['load_result', 'battery_result']}
+PANEL_POWER_GRAPH = {"x_label": "Panel Power (%)",
+                     "voltage_display_choice": ['mppt_result', 'load_result'],
+                     "current_display_choice": ['mppt_result', 'solar_result', 'load_result', 'battery_result'],
+                     "power_display_choice": ['load_result', 'battery_result', 'solar_result']}
 
 
 def sweep_throttle(circuit_setup: json, save_path, ngspice_available, 
-                   simulation_logging=False, save_output=True, constants=None):
-    """Sweep the throttle from 0% to 100% in defined intervals and run simulations."""
+                   simulation_logging=False, save_output=True, constants=None,
+                   solver="spice", spice_check=[], workers=1, plot=True, adaptive=False):
+    """Sweep the throttle from 0% to 100% in defined intervals (or adaptively) and run simulations.
+
+    Returns the Result_Store; with plot=False matplotlib is not imported.
+    """
     
-    throttle_range = [i / SWEEP_INTERVAL_COUNT for i in range(0, SWEEP_INTERVAL_COUNT + 1, 1)]
-    results = []
-    for throttle in throttle_range:
-        if simulation_logging:
-            print(f"\n{constants['BARF']}Starting Simulation with Throttle Setting: {throttle*100:.2f}%{constants['BARE']}")
-        
+    def simulate(throttle_range, spice_check):
         # Set panel power to 0 during throttle sweep to isolate the effect of throttle changes on the system
-        circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, modifications={'throttle_setting': throttle, 'panel_power_setting': 0}, constants=constants)
-        analysis, result = begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants)
-        results.append(result)
+        if solver == "closed_form":
+            return dc_bus_results(circuit_setup, {'throttle_setting': np.array(throttle_range), 'panel_power_setting': 0},
+                                  constants=constants, spice_check=spice_check, ngspice_available=ngspice_available)
+        points = simulate_points(circuit_setup, [{'throttle_setting': throttle, 'panel_power_setting': 0} for throttle in throttle_range],
+                                 ngspice_available, simulation_logging=simulation_logging, constants=constants, workers=workers)
+        return [result for _, result in points]
+
+    if adaptive:
+        throttle_range, results = adaptive_sweep(simulate, 0.0, 1.0, spice_check, constants)
+    else:
+        throttle_range = [i / SWEEP_INTERVAL_COUNT for i in range(0, SWEEP_INTERVAL_COUNT + 1, 1)]
+        results = simulate(throttle_range, spice_check)
     
-    generate_graph(results, throttle_range, x_label="Throttle Input (%)",
-            voltage_display_choice=['mppt_result', 'load_result'],
-            current_display_choice=['mppt_result', 'solar_result', 'load_result', 'battery_result'],
-            power_display_choice=['load_result', 'battery_result'],
-            save_path=save_path if save_output else None, constants=constants)
+    store = store_results(results, throttle_range, THROTTLE_GRAPH["x_label"], throttle=throttle_range)
+    check_store(store, circuit_setup, constants=constants)
+    save_sweep(store, THROTTLE_GRAPH, save_path if save_output else None, plot, constants)
+    return store
     
 def sweep_panel_power(circuit_setup: json, save_path, ngspice_available,
-                      simulation_logging=False, save_output=True, constants=None):
-    """Sweep the panel power from 100% to 0% in defined intervals and run simulations."""
-
-    panel_power_range = [i / SWEEP_INTERVAL_COUNT for i in range(SWEEP_INTERVAL_COUNT, 0, -1)]
-    results = []
-    for panel_power in panel_power_range:
-        if simulation_logging:
-            print(f"\n{constants['BARF']}Starting Simulation with Panel Power Setting: {panel_power*100:.2f}%{constants['BARE']}")
-        
-        circuit, component_object, errors = build_circuit_from_json(circuit_setup=circuit_setup, modifications={'panel_power_setting': panel_power, 'throttle_setting': 1.0}, constants=constants)
-        analysis, result = begin_simulation(circuit, component_object, errors, ngspice_available, constants=constants)
-        
-        # If the simulation fails at a certain panel power, stop the sweep
-        if analysis:
-            results.append(result)
-        else:
-            print("Simulation failed at panel power setting: {:.2f}%. Stopping sweep.".format(panel_power*100))
-            panel_power_range = panel_power_range[:panel_power_range.index(panel_power)]
-            break
+                      simulation_logging=False, save_output=True, constants=None,
+                      solver="spice", spice_check=[], workers=1, plot=True, adaptive=False):
+    """Sweep the panel power from 100% to 0% in defined intervals (or adaptively) and run simulations.
+
+    Returns the Result_Store; with plot=False matplotlib is not imported.
+    """
+
+    def simulate(panel_power_range, spice_check):
+        if solver == "closed_form":
+            return dc_bus_results(circuit_setup, {'panel_power_setting': np.array(panel_power_range), 'throttle_setting': 1.0},
+                                  constants=constants, spice_check=spice_check, ngspice_available=ngspice_available)
+        points = simulate_points(circuit_setup, [{'panel_power_setting': panel_power, 'throttle_setting': 1.0} for panel_power in panel_power_range],
+                                 ngspice_available, simulation_logging=simulation_logging, constants=constants, workers=workers)
+        # A point that fails even after the convergence retries is left as a gap instead of ending the sweep
+        for panel_power, (succeeded, _) in zip(panel_power_range, points):
+            if not succeeded:
+                print("Simulation failed at panel power setting: {:.2f}%.".format(panel_power*100))
+        return [result for _, result in points]
+
+    if adaptive:
+        panel_power_range, results = adaptive_sweep(simulate, 1.0, 1 / SWEEP_INTERVAL_COUNT, spice_check, constants)
+    else:
+        panel_power_range = [i / SWEEP_INTERVAL_COUNT for i in range(SWEEP_INTERVAL_COUNT, 0, -1)]
+        results = simulate(panel_power_range, spice_check)
         
-    generate_graph(results, panel_power_range, x_label="Panel Power (%)",
-            voltage_display_choice=['mppt_result', 'load_result'],
-            current_display_choice=['mppt_result', 'solar_result', 'load_result', 'battery_result'],
-            power_display_choice=['load_result', 'battery_result', 'solar_result'],
-            save_path=save_path if save_output else None, constants=constants)
\ No newline at end of file
+    store = store_results(results, panel_power_range, PANEL_POWER_GRAPH["x_label"], throttle=[1.0] * len(results))
+    check_store(store, circuit_setup, constants=constants)
+    save_sweep(store, PANEL_POWER_GRAPH, save_path if save_output else None, plot, constants)
+    return store
+
+def sweep_map(circuit_setup: json, save_path, ngspice_available,
+              simulation_logging=False, save_output=True, constants=None,
+              solver="spice", workers=1, show_plot=False, plot=True):
+    """Sweep throttle against panel power on a grid and map the battery net current over both."""
+
+    throttle_range = np.linspace(0.0, 1.0, SWEEP_INTERVAL_COUNT + 1)
+    panel_power_range = np.linspace(0.0, 1.0, SWEEP_INTERVAL_COUNT + 1)
+    shape = (len(throttle_range), len(panel_power_range))
+
+    if solver == "closed_form":
+        modifications = {'throttle_setting': throttle_range[:, None], 'panel_power_setting': panel_power_range[None, :]}
+        nodes, branches = solve_dc_bus(circuit_setup, modifications, constants=constants)
+        residual, warning = dc_bus_checks(circuit_setup, modifications, nodes, branches, constants=constants)
+        maps = {
+            "battery_current": np.broadcast_to(branches["vtotal_battery_input_current"], shape).copy(),
+            "bus_voltage": np.broadcast_to(nodes["total_dc_bus_voltage"], shape).copy(),
+            "warning": np.broadcast_to(warning, shape).copy(),
+            "kirchhoff_residual": np.broadcast_to(residual, shape).copy(),
+        }
+    else:
+        points = simulate_points(circuit_setup, [{'throttle_setting': float(throttle), 'panel_power_setting': float(panel_power)}
+                                                 for throttle in throttle_range for panel_power in panel_power_range],
+                                 ngspice_available, simulation_logging=simulation_logging, constants=constants, workers=workers)
+        maps = {key: np.full(shape, np.nan) for key in ["battery_current", "bus_voltage", "kirchhoff_residual"]}
+        maps["warning"] = np.zeros(shape, dtype=bool)
+        for point, (succeeded, result) in enumerate(points):
+            if not succeeded:
+                continue
+            index = np.unravel_index(point, shape)
+            summary = result["summary"]["data"][0]
+            load_current = sum(value for each in result["load_result"]["data"] + result["load_balancer"]["data"]
+                               for value in each["current"].values())
+            maps["battery_current"][index] = summary["current"]["total_battery_input_current"]
+            maps["bus_voltage"][index] = summary["voltage"]["total_dc_bus_voltage"]
+            maps["kirchhoff_residual"][index] = (summary["current"]["total_mppt_output_current"]
+                                                 - summary["current"]["total_battery_input_current"] - load_current)
+            maps["warning"][index] = result["warning"]["array_count"] > 0
+
+    if save_output:
+        np.savez_compressed(save_path + "." + MAP_DATA_FILE_NAME, throttle=throttle_range,
+                            panel_power=panel_power_range, **maps)
+
+    if plot:
+        from .sweep_graph_generation import generate_map_graph
+        generate_map_graph(maps, throttle_range, panel_power_range,
+                           save_path=save_path if save_output else None, show_plot=show_plot, constants=constants)
+    return maps
+
+def adaptive_sweep(simulate, start: float, end: float, spice_check=[], constants=None):
+    """Sample simulate(x_values, spice_check) -> results from start to end, bisecting where the results bend.
+
+    Starts on ADAPTIVE_COARSE_COUNT intervals. Every round simulates the midpoints of all open intervals
+    in one batch; an interval is split again where a monitored current strays more than
+    ADAPTIVE_CURRENT_TOLERANCE from the straight line between its ends or the number of active limits
+    (warnings) changes, until it is ADAPTIVE_MIN_INTERVAL wide. Returns the x values (in the order from
+    start to end) and their results. spice_check applies to the first, middle and last coarse points.
+    """
+    coarse = list(np.linspace(start, end, ADAPTIVE_COARSE_COUNT + 1))
+    checks = [0, ADAPTIVE_COARSE_COUNT // 2, ADAPTIVE_COARSE_COUNT] if spice_check else []
+    points = dict(zip(coarse, simulate(coarse, checks)))
+    intervals = list(zip(coarse[:-1], coarse[1:]))
+    while intervals:
+        intervals = [(low, high) for low, high in intervals if abs(high - low) > ADAPTIVE_MIN_INTERVAL]
+        midpoints = [(low + high) / 2 for low, high in intervals]
+        points.update(zip(midpoints, simulate(midpoints, []) if midpoints else []))
+        intervals = [half for (low, high), middle in zip(intervals, midpoints)
+                     if __bends(points[low], points[middle], points[high])
+                     for half in [(low, middle), (middle, high)]]
+
+    x_values = sorted(points, reverse=end < start)
+    print(f"Adaptive sweep: {len(x_values)} points (uniform grid: {SWEEP_INTERVAL_COUNT + 1})")
+    return x_values, [points[x] for x in x_values]
+
+def __bends(low: dict, middle: dict, high: dict):
+    """Whether an interval is not straight: limits change along it, or its midpoint is off the chord."""
+    counts = [result["warning"]["array_count"] for result in [low, middle, high]]
+    if counts[0] != counts[1] or counts[1] != counts[2]:
+        return True
+    currents = [__monitored(result) for result in [low, middle, high]]
+    if any(current is None for current in currents):
+        # Failed points cannot be judged, so they are narrowed down like a transition
+        return True
+    return any(abs(mid - (a + b) / 2) > ADAPTIVE_CURRENT_TOLERANCE for a, mid, b in zip(*currents))
+
+def __monitored(result: dict):
+    if not result["summary"]["data"]:
+        return None
+    current = result["summary"]["data"][0]["current"]
+    return [current.get(key, 0.0) for key in ADAPTIVE_MONITORED]
+
+def save_sweep(store, graph: dict, save_path, plot=True, constants=None):
+    """Save the store's data next to save_path (if given) and plot it with the generate_graph arguments in graph."""
+    if save_path:
+        save_store(store, save_path)
+    if plot:
+        # Imported here so data-only runs never load matplotlib
+        from .sweep_graph_generation import generate_graph
+        generate_graph(store, **graph, save_path=save_path, constants=constants)
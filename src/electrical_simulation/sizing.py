@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Electrical system sizing search over the component catalog.
+
+Enumerates panel, MPPT and battery choices from components.json with MPPT counts, panels in series
+and in parallel within the boat's panel slots (panels_longitudinal x panels_transversal, at most
+panels_per_string in series), and battery strings. Combinations failing the MPPT voltage/current
+window checks are pruned before any simulation; the rest run the voyage in parallel and the
+Pareto set of energy balance against mass, cost and unit count is saved.
+
+  python -m src.electrical_simulation.sizing --boat rp2 --constants constant/electrical/constants.json \\
+      --components constant/electrical/components.json --voyage constant/electrical/voyage_setup.json \\
+      --output artifact/rp2.electrical_sizing --solver closed_form --workers 4
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
+import numpy as np
+
+from .__main__ import check_ngspice, combine_config_setup
+from .components.battery_array import Battery_Array
+from .components.mppt import MPPT
+from .components.solar_panel_array import Solar_Array
+from .fleet import BOAT_PARAMS_DIR, CIRCUIT_DIR, CIRCUIT_FILE_NAME
+from .irradiance import irradiance_source
+from .simulation_over_time import step_voyage_adaptive, voyage_completed
+
+SIZING_FILE_NAME = "sizing_results.json"
+SIZING_INITIAL_SOC = 0.5            # mid-range start, so neither surplus nor deficit is clipped at full/empty
+MAX_BATTERY_IN_SERIES = 4
+MAX_BATTERY_IN_PARALLEL = 4
+CATALOG_SKIP = "Description"        # catalog entries that are notes, not components
+# Objective -> +1 to maximise, -1 to minimise
+OBJECTIVES = {"energy_balance_wh": 1, "mass_kg": -1, "cost": -1, "units": -1}
+
+# Per-process state, set once by init_sizing_worker
+__sizing = {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search component and string sizing for one boat')
+    parser.add_argument('--boat', required=True,
+                        help='Boat name (e.g. rp2); its loads come from <circuit-dir>/<boat>/' + CIRCUIT_FILE_NAME)
+    parser.add_argument('--circuit-dir', default=CIRCUIT_DIR,
+                        help=f'Directory with one <boat>/{CIRCUIT_FILE_NAME} per boat')
+    parser.add_argument('--boat-params-dir', default=BOAT_PARAMS_DIR,
+                        help='Directory with <boat>.json panel slot limits')
+    parser.add_argument('--constants', required=True,
+                        help='Path to constants JSON (e.g. constant/electrical/constants.json)')
+    parser.add_argument('--components', required=True,
+                        help='Path to components JSON (e.g. constant/electrical/components.json)')
+    parser.add_argument('--voyage', required=True,
+                        help='Voyage JSON whose segments every candidate runs')
+    parser.add_argument('--output', required=True,
+                        help=f'Output path prefix, results go to <output>.{SIZING_FILE_NAME}')
+    parser.add_argument('--solver', default='spice', choices=['spice', 'closed_form'],
+                        help='Solver for the voyage operating points')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='Number of worker processes evaluating candidates, each with its own NgSpice instance')
+    parser.add_argument('--initial-soc', type=float, default=SIZING_INITIAL_SOC,
+                        help='SOC every candidate starts the voyage with')
+    parser.add_argument('--max-battery-series', type=int, default=MAX_BATTERY_IN_SERIES,
+                        help='Largest battery_in_series tried')
+    parser.add_argument('--max-battery-parallel', type=int, default=MAX_BATTERY_IN_PARALLEL,
+                        help='Largest battery_in_parallel tried')
+
+    args = parser.parse_args()
+    constants = json.load(open(args.constants))
+    components = json.load(open(args.components))
+    base_setup = json.load(open(os.path.join(args.circuit_dir, args.boat, CIRCUIT_FILE_NAME)))
+    boat_params = json.load(open(os.path.join(args.boat_params_dir, args.boat + ".json")))
+
+    solver = args.solver
+    ngspice_available = check_ngspice() if solver == 'spice' else False
+    if solver == 'spice' and not ngspice_available:
+        print("NgSpice not available, evaluating candidates with the closed_form solver")
+        solver = 'closed_form'
+
+    start_sizing(base_setup, boat_params, components, args.voyage, args.output, ngspice_available, constants,
+                 solver, args.workers, args.initial_soc, args.max_battery_series, args.max_battery_parallel)
+
+def start_sizing(base_setup: json, boat_params: json, components: json, voyage_config_loc: str, save_path: str,
+                 ngspice_available: bool, constants=None, solver="spice", workers=1, initial_soc=SIZING_INITIAL_SOC,
+                 max_battery_series=MAX_BATTERY_IN_SERIES, max_battery_parallel=MAX_BATTERY_IN_PARALLEL,
+                 save_output=True):
+    """Enumerate, prune and evaluate every sizing candidate and return the results with the Pareto set."""
+    start = time.perf_counter()
+    candidates = sizing_candidates(components, boat_params, max_battery_series, max_battery_parallel)
+    feasible, pruned = prune_candidates(candidates, components, constants)
+    print(f"{constants['BARF']}Sizing: {len(candidates)} candidates, {len(feasible)} pass the MPPT window checks{constants['BARE']}")
+    for reason, count in pruned.items():
+        print(f"\t{count} pruned: {reason}")
+
+    with open(voyage_config_loc, 'r') as f:
+        voyage = json.load(f)
+    initargs = (base_setup, components, voyage, os.path.dirname(voyage_config_loc), initial_soc,
+                ngspice_available, solver, constants)
+    # String layouts with the same panel count per MPPT give the same bus operating points, so one runs for all
+    representatives = {}
+    for candidate in feasible:
+        representatives.setdefault(bus_key(candidate), candidate)
+    print(f"\t{len(representatives)} electrically distinct candidates to evaluate")
+    if workers <= 1 or len(representatives) <= 1:
+        init_sizing_worker(*initargs, create_ngspice=False)
+        outcomes = [evaluate_candidate(candidate) for candidate in representatives.values()]
+    else:
+        chunksize = max(1, len(representatives) // (workers * 4))
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=init_sizing_worker, initargs=initargs) as executor:
+            outcomes = list(executor.map(evaluate_candidate, representatives.values(), chunksize=chunksize))
+    outcomes = dict(zip(representatives, outcomes))
+    evaluated = [dict(outcomes[bus_key(candidate)], **candidate) for candidate in feasible]
+
+    usable = [candidate for candidate in evaluated if candidate["error"] is None and not candidate["runs_empty"]]
+    front = pareto_front(usable)
+    results = {
+        "candidates": len(candidates),
+        "pruned": pruned,
+        "evaluated": len(evaluated),
+        "failed": sum(candidate["error"] is not None for candidate in evaluated),
+        "runs_empty": sum(candidate["runs_empty"] for candidate in evaluated),
+        "missing_catalog_values": missing_catalog_values(components),
+        "pareto": sorted(front, key=lambda candidate: -candidate["energy_balance_wh"]),
+    }
+    __print_results(results, time.perf_counter() - start, constants)
+
+    if save_output:
+        save_file = save_path + "." + SIZING_FILE_NAME
+        with open(save_file, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Sizing results saved to {save_file}")
+    return results
+
+def sizing_candidates(components: json, boat_params: json, max_battery_series=MAX_BATTERY_IN_SERIES,
+                      max_battery_parallel=MAX_BATTERY_IN_PARALLEL):
+    """Every component and string combination that fits the boat's panel slots.
+
+    All MPPTs of a candidate share one panel and string layout, so a candidate is one mppt_panel config.
+    """
+    panel_slots = boat_params["panels_longitudinal"] * boat_params["panels_transversal"]
+    layouts = [(count, in_series, in_parallel)
+               for in_series in range(1, boat_params["panels_per_string"] + 1)
+               for in_parallel in range(1, panel_slots // in_series + 1)
+               for count in range(1, panel_slots // (in_series * in_parallel) + 1)]
+    return [{"panel": panel, "mppt": mppt, "mppt_count": count, "in_series": in_series, "in_parallel": in_parallel,
+             "battery": battery, "battery_in_series": battery_in_series, "battery_in_parallel": battery_in_parallel}
+            for panel, mppt, battery in itertools.product(catalog(components, "Panel"), catalog(components, "MPPT"),
+                                                          catalog(components, "Battery"))
+            for count, in_series, in_parallel in layouts
+            for battery_in_series in range(1, max_battery_series + 1)
+            for battery_in_parallel in range(1, max_battery_parallel + 1)]
+
+def prune_candidates(candidates: list, components: json, constants=None):
+    """Split candidates into those passing MPPT.configure_mppt at full panel power and at SOC 0 and 1,
+    and a count of the rest per failed check."""
+    feasible = []
+    pruned = {}
+    checks = {}
+    for candidate in candidates:
+        # The checks only depend on these fields, so equal combinations are checked once
+        key = tuple(candidate[name] for name in ["panel", "mppt", "in_series", "in_parallel", "battery", "battery_in_series"])
+        if key not in checks:
+            checks[key] = window_check(candidate, components, constants)
+        if checks[key] is None:
+            feasible.append(candidate)
+        else:
+            pruned[checks[key]] = pruned.get(checks[key], 0) + 1
+    return feasible, pruned
+
+def window_check(candidate: dict, components: json, constants=None):
+    """Failed MPPT window check of a candidate without the measured values, or None if it passes."""
+    panel = components["Panel"][candidate["panel"]]
+    solar_array = Solar_Array(None, None, constants, in_series=candidate["in_series"],
+                              in_parallel=candidate["in_parallel"], calculated_power=panel["power"], voltage=panel["voltage"])
+    mppt = MPPT(None, None, constants, **components["MPPT"][candidate["mppt"]])
+    for soc in [0.0, 1.0]:
+        battery_array = Battery_Array(None, None, constants, **components["Battery"][candidate["battery"]],
+                                      battery_in_series=candidate["battery_in_series"],
+                                      battery_in_parallel=candidate["battery_in_parallel"], current_soc=soc)
+        err = mppt.configure_mppt(0, solar_array, battery_array)
+        if err is not None:
+            return re.sub(r"\s*\([^)]*\)", "", err).strip()
+    return None
+
+def bus_key(candidate: dict):
+    """Fields the bus operating points depend on; MPPTs regulate on panel power, whatever the string layout."""
+    return (candidate["panel"], candidate["mppt"], candidate["mppt_count"], candidate["in_series"] * candidate["in_parallel"],
+            candidate["battery"], candidate["battery_in_series"], candidate["battery_in_parallel"])
+
+def candidate_setup(base_setup: json, candidate: dict, components: json):
+    """base_setup (as in circuit_setup.json) with its panels, MPPTs and battery replaced by the candidate's."""
+    setup = deepcopy(base_setup)
+    panel_info = next(iter(base_setup["mppt_panel"].values()))["panel_info"]
+    setup["mppt_panel"] = {
+        "config_1": {
+            "count": candidate["mppt_count"],
+            "panel_info": {"choice": candidate["panel"], "solar_power": panel_info.get("solar_power", 1.0),
+                           "in_series": candidate["in_series"], "in_parallel": candidate["in_parallel"]},
+            "mppt_info": {"choice": candidate["mppt"]},
+        }
+    }
+    setup["battery"] = {"choice": candidate["battery"], "battery_in_series": candidate["battery_in_series"],
+                        "battery_in_parallel": candidate["battery_in_parallel"],
+                        "current_soc": base_setup["battery"].get("current_soc", 1.0)}
+    combine_config_setup(setup, components)
+    return setup
+
+def init_sizing_worker(base_setup: json, components: json, voyage: json, voyage_dir: str, initial_soc: float,
+                       ngspice_available: bool, solver="spice", constants=None, create_ngspice=True):
+    if ngspice_available and create_ngspice:
+        from PySpice.Spice.NgSpice.Shared import NgSpiceShared # type: ignore
+        NgSpiceShared.new_instance()
+
+    __sizing["base_setup"] = base_setup
+    __sizing["components"] = components
+    __sizing["segments"] = voyage["segments"]
+    # Irradiance sources only read forward, so every candidate builds its own
+    __sizing["irradiance"] = (voyage.get("irradiance"), voyage_dir)
+    __sizing["initial_soc"] = initial_soc
+    __sizing["ngspice_available"] = ngspice_available
+    __sizing["solver"] = solver
+    __sizing["constants"] = constants
+
+def evaluate_candidate(candidate: dict):
+    """Run the voyage for one candidate and add its objectives, final SOC and any error."""
+    components = __sizing["components"]
+    setup = candidate_setup(__sizing["base_setup"], candidate, components)
+    battery_info = setup["battery"]
+    battery_capacity_Amin = battery_info["capacity_ah"] * battery_info["battery_in_parallel"] * 60
+    # Energy is counted at the pack voltage halfway through the SOC range
+    pack_voltage = Battery_Array(None, None, __sizing["constants"], **dict(battery_info, current_soc=0.5)).get_total_voltage()
+
+    evaluated = dict(candidate, **catalog_totals(candidate, components), error=None, runs_empty=False,
+                     energy_balance_wh=None, final_soc=None)
+    try:
+        store = step_voyage_adaptive(setup, __sizing["segments"], __sizing["initial_soc"], battery_capacity_Amin,
+                                     __sizing["ngspice_available"], __sizing["solver"], __sizing["constants"],
+                                     None, irradiance_source(*__sizing["irradiance"]))
+    except Exception as e:
+        evaluated["error"] = f"{type(e).__name__}: {e}"
+        return evaluated
+    if store.errors:
+        evaluated["error"] = store.errors[0]
+        return evaluated
+    if not voyage_completed(store, __sizing["segments"], __sizing["constants"]):
+        evaluated["error"] = f"Voyage aborted at {store.x_axis()[-1] if len(store) else 0:.1f} min"
+        return evaluated
+
+    capacity = store.series_values("battery_capacity")
+    evaluated["final_soc"] = float(capacity[-1] / battery_capacity_Amin)
+    evaluated["energy_balance_wh"] = float((capacity[-1] - __sizing["initial_soc"] * battery_capacity_Amin) / 60 * pack_voltage)
+    evaluated["runs_empty"] = bool(np.min(capacity) <= 0)
+    return evaluated
+
+def catalog_totals(candidate: dict, components: json):
+    """Mass, cost and unit count of a candidate from the optional mass_kg and cost catalog fields."""
+    counts = {
+        ("Panel", candidate["panel"]): candidate["mppt_count"] * candidate["in_series"] * candidate["in_parallel"],
+        ("MPPT", candidate["mppt"]): candidate["mppt_count"],
+        ("Battery", candidate["battery"]): candidate["battery_in_series"] * candidate["battery_in_parallel"],
+    }
+    return {
+        "mass_kg": sum(components[kind][name].get("mass_kg", 0.0) * count for (kind, name), count in counts.items()),
+        "cost": sum(components[kind][name].get("cost", 0.0) * count for (kind, name), count in counts.items()),
+        "units": sum(counts.values()),
+    }
+
+def missing_catalog_values(components: json):
+    """Catalog entries without mass_kg or cost, which count as 0 in the objectives."""
+    return [f"{kind}/{name}: {field}" for kind in ["Panel", "MPPT", "Battery"] for name in catalog(components, kind)
+            for field in ["mass_kg", "cost"] if field not in components[kind][name]]
+
+def catalog(components: json, kind: str):
+    return [name for name in components[kind] if name != CATALOG_SKIP]
+
+def pareto_front(candidates: list):
+    """Candidates not dominated in every OBJECTIVES direction by another candidate."""
+    if not candidates:
+        return []
+    # Negate maximised objectives so that lower is better everywhere
+    values = np.array([[-sign * candidate[name] for name, sign in OBJECTIVES.items()] for candidate in candidates])
+    dominated = np.zeros(len(candidates), dtype=bool)
+    for index, row in enumerate(values):
+        dominated |= np.all(row <= values, axis=1) & np.any(row < values, axis=1)
+    return [candidate for candidate, is_dominated in zip(candidates, dominated) if not is_dominated]
+
+def __print_results(results, elapsed, constants):
+    print(f"{constants['BARF']}Sizing Pareto Set ({len(results['pareto'])} of {results['evaluated']} evaluated){constants['BARE']}")
+    for candidate in results["pareto"]:
+        print(f"\t{candidate['mppt_count']}x {candidate['mppt']}, {candidate['in_series']}s{candidate['in_parallel']}p "
+              f"{candidate['panel']}, {candidate['battery_in_series']}s{candidate['battery_in_parallel']}p {candidate['battery']}: "
+              f"{candidate['energy_balance_wh']:.0f} Wh, {candidate['mass_kg']:.1f} kg, cost {candidate['cost']:.0f}, "
+              f"{candidate['units']} units")
+    if results["failed"] or results["runs_empty"]:
+        print(f"\t{results['failed']} failed, {results['runs_empty']} ran the battery empty")
+    if results["missing_catalog_values"]:
+        print(f"\tCounted as 0: {', '.join(results['missing_catalog_values'])}")
+    print(f"\tSearched in {elapsed:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import json
+import time
+
+from .circuit_constructor import build_circuit_from_json, evaluate_components, get_alterations
+from .netlist_template import iteration_count, netlist_template, node_voltages, solve_statistics
+
+
+class Spice_Session:
+    """Keeps one circuit loaded in NgSpice and only alters the swept source values between operating points.
+
+    The topology (series/parallel counts, MPPT and load count) must stay the same for the whole session,
+    which holds for throttle, panel power, SOC and charge/discharge limit modifications.
+    The session assumes it is the only user of its NgSpice instance while it is alive.
+    A point that fails to converge after altering is re-run from the netlist template, seeded with the
+    last converged point and with its gmin/source stepping retries.
+    """
+    def __init__(self, circuit_setup: json, constants=None, ngspice_shared=None):
+        self.circuit_setup = circuit_setup
+        self.constants = constants
+        self.ngspice_shared = ngspice_shared
+        self.circuit = None
+        self.simulator = None
+        self.values = {}
+        self.seed = None
+        self.statistics = None
+        self.iterations = 0         # NgSpice counts iterations over every run of the loaded circuit
+
+    def build(self, modifications: dict = {}):
+        """Same return values as build_circuit_from_json, but the circuit is only constructed once."""
+        component_object, errors = evaluate_components(self.circuit_setup, modifications, constants=self.constants)
+        if self.circuit is None:
+            self.circuit, _, _ = build_circuit_from_json(circuit_setup=self.circuit_setup, constants=self.constants, alterable=True)
+            self.values = get_alterations(component_object)
+        return self.circuit, component_object, errors
+
+    def operating_point(self, component_object):
+        """Run .op for the values in component_object, loading the netlist on first use."""
+        start = time.perf_counter()
+        try:
+            analysis = self.__altered_operating_point(component_object)
+        except Exception:
+            analysis = None
+
+        if analysis is None:
+            # The template loads its own deck, so the session has to reload its circuit afterwards
+            template = netlist_template(self.circuit_setup, constants=self.constants)
+            template.ngspice_shared = template.ngspice_shared or self.ngspice_shared
+            template.seed = self.seed or template.seed
+            self.invalidate()
+            try:
+                analysis = template.operating_point(component_object, start_path=["altered"])
+            finally:
+                self.statistics = dict(template.statistics, solve_ms=(time.perf_counter() - start) * 1000)
+            self.seed = template.seed
+            return analysis
+
+        iterations = iteration_count(self.simulator.ngspice)
+        self.statistics = solve_statistics(["altered"], None if iterations is None else iterations - self.iterations,
+                                           start, True)
+        self.iterations = iterations or 0
+        self.seed = node_voltages(analysis)
+        return analysis
+
+    def __altered_operating_point(self, component_object):
+        alterations = get_alterations(component_object)
+
+        if self.simulator is None:
+            self.simulator = self.circuit.simulator(temperature=25, nominal_temperature=25, ngspice_shared=self.ngspice_shared)
+            self.iterations = 0
+            analysis = self.simulator.operating_point()
+            if alterations == self.values:
+                return analysis
+
+        ngspice = self.simulator.ngspice
+        for device, (parameter, value) in alterations.items():
+            if self.values.get(device) != (parameter, value):
+                ngspice.alter_device(device, **{parameter: value})
+        self.values = alterations
+
+        ngspice.destroy()
+        ngspice.run()
+        plot_name = ngspice.last_plot
+        if plot_name == 'const':
+            return None
+        return ngspice.plot(self.simulator, plot_name).to_analysis()
+
+    def invalidate(self):
+        """Drop the loaded circuit so the next build starts from a fresh netlist."""
+        self.circuit = None
+        self.simulator = None
+        self.values = {}
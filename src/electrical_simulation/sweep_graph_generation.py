@@ -1,23 +1,35 @@
-import json
 import matplotlib.pyplot as plt
 import numpy as np
-from typing import List, Dict
+from typing import Dict
+from .result_checker import WARNING_FLAGS
+from .result_store import Result_Store
 
 
 MARKER_SIZE = 0
 MARKER_STYLE = 'o'  #'o', 's', '^', 'D', '*', 'P', 'X', etc.
+MARKER_MAX_POINTS = 200     # traces with more points are drawn without markers
 DOTTED_STYLE = ":"     #'-', '--', '-.', ':', 'None', ' ', '', 'solid', 'dashed', 'dashdot', 'dotted'
 
+FIGURE_WIDTH = 10           # inches; every panel is FIGURE_WIDTH x PANEL_HEIGHT whatever the data length
+PANEL_HEIGHT = 5
+PANEL_HSPACE = 0.3
+SAVE_DPI = 300
+# Traces are downsampled (LTTB) to one point per pixel of the saved figure width
+DOWNSAMPLE_POINTS = FIGURE_WIDTH * SAVE_DPI
+
 IMG_FILE_NAME = "sweep_simulation_results.png"
-WARNING_FILE_NAME = "sweep_simulation_warnings.json"
-ERROR_FILE_NAME = "sweep_simulation_errors.json"
+MAP_IMG_FILE_NAME = "sweep_map_results.png"
+MAP_CONTOUR_FILE_NAME = "sweep_map_battery_current.png"
+MAP_CONTOUR_LEVELS = 20
+ENSEMBLE_IMG_FILE_NAME = "ensemble_results.png"
+TRANSIENT_IMG_FILE_NAME = "transient_results.png"
 
 
-def generate_graph(results: list, x_axis: list, x_label: str = "",
+def generate_graph(store: Result_Store, x_label: str = "",
                    voltage_display_choice: list = [], 
                    current_display_choice: list = [], 
                    power_display_choice: list = [],
-                   battery_capacity: list = [],
+                   battery_capacity: bool = False,
                    save_path: str = None,
                    show_plot: bool = False,
                    constants=None):
@@ -26,51 +38,29 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
     num_plots = sum([len(voltage_display_choice) > 0, 
                      len(current_display_choice) > 0, 
                      len(power_display_choice) > 0,
-                     len(battery_capacity) > 0])
+                     battery_capacity])
     
     if num_plots == 0:
         print("No display choices selected")
         return
     
-    _, axes = plt.subplots(num_plots, 1, figsize=(10, 5 * num_plots))
+    _, axes = plt.subplots(num_plots, 1, figsize=(FIGURE_WIDTH, PANEL_HEIGHT * num_plots))
     if num_plots == 1:
         axes = [axes]
     
     # Adjust spacing between subplots
-    plt.subplots_adjust(hspace=20, bottom=0.1)
+    plt.subplots_adjust(hspace=PANEL_HSPACE, bottom=0.1)
     
-
-    warning_points = []
+    x_axis = store.x_axis()
+    if store.flags is not None:
+        warning_x = x_axis[(store.flags & WARNING_FLAGS) != 0]
+    else:
+        warning_x = np.array([point['x'] for point in store.warning_points()])
+    warning_regions = group_warning_regions(warning_x)
     equilibrium_points = []
-    
-    # Pre-processing
-    for i, result in enumerate(results):
-        if 'warning' in result and result['warning']['array_count'] > 0:
-            warning_points.append({
-                'x': x_axis[i],
-                'warnings': result['warning']['data']
-            })
-        
-        for array in result['summary']['data']:
-            current = array['current']['total_battery_input_current']
-            if current < constants["EPSILON"]:
-                equilibrium_points.append(x_axis[i])
-        
-        # Filter out negative terminal    
-        for battery in result.get('battery_result', {}).get('data', []):
-            to_remove = []
-            for key, value in battery['voltage'].items():
-                if '_negative' in key:
-                    to_remove.append(key)
-            for key in to_remove:
-                battery['voltage'].pop(key)
-            
-            to_remove = []
-            for key, value in battery['current'].items():
-                if '_negative' in key:
-                    to_remove.append(key)
-            for key in to_remove:
-                battery['current'].pop(key)
+    for key in store.keys('summary', 'current'):
+        if key[3] == 'total_battery_input_current':
+            equilibrium_points += list(x_axis[store.column(*key) < constants["EPSILON"]])
     
     # Color cycles for different traces
     colors = plt.cm.tab10(np.linspace(0, 1, 10))
@@ -84,16 +74,15 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         color_idx = 0
         
         for category in voltage_display_choice:
-            voltages = extract_traces(results, category, 'voltage')
+            voltages = extract_traces(store, category, 'voltage')
             
             for label, values in voltages.items():
                 """ if 'battery' in label:
                     print(sum(values) / len(values))
                     if sum(values) / len(values) < EPSILON:
                         continue """
-                ax.plot(x_axis, values, marker=MARKER_STYLE, markersize=MARKER_SIZE, 
-                       label=f"{category} - {label}", 
-                       color=colors[color_idx % len(colors)])
+                plot_trace(ax, x_axis, values, label=f"{category} - {label}",
+                           color=colors[color_idx % len(colors)])
                 color_idx += 1
         
         ax.set_xlabel(x_label)
@@ -102,7 +91,7 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         ax.grid(True, alpha=0.3)
         
-        draw_warning_points(warning_points, ax)
+        draw_warning_regions(warning_regions, ax)
         draw_equilibrium_points(equilibrium_points, ax)
         
         plot_idx += 1
@@ -113,11 +102,10 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         color_idx = 0
         
         for category in current_display_choice:
-            currents = extract_traces(results, category, 'current')
+            currents = extract_traces(store, category, 'current')
             for label, values in currents.items():
-                ax.plot(x_axis, values, marker=MARKER_STYLE, markersize=MARKER_SIZE,
-                       label=f"{category} - {label}",
-                       color=colors[color_idx % len(colors)])
+                plot_trace(ax, x_axis, values, label=f"{category} - {label}",
+                           color=colors[color_idx % len(colors)])
                 color_idx += 1
         
         ax.set_xlabel(x_label)
@@ -126,7 +114,7 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         ax.grid(True, alpha=0.3)
         
-        draw_warning_points(warning_points, ax)
+        draw_warning_regions(warning_regions, ax)
         draw_equilibrium_points(equilibrium_points, ax) 
         
         plot_idx += 1
@@ -137,12 +125,11 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         color_idx = 0
         
         for category in power_display_choice:
-            power_traces = extract_power_traces(results, category)
+            power_traces = extract_power_traces(store, category)
 
             for label, values in power_traces.items():
-                ax.plot(x_axis, values, marker=MARKER_STYLE, markersize=MARKER_SIZE,
-                       label=f"{category} - {label}",
-                       color=colors[color_idx % len(colors)])
+                plot_trace(ax, x_axis, values, label=f"{category} - {label}",
+                           color=colors[color_idx % len(colors)])
                 color_idx += 1
         
         ax.set_xlabel(x_label)
@@ -151,14 +138,13 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         ax.grid(True, alpha=0.3)
         
-        draw_warning_points(warning_points, ax)
+        draw_warning_regions(warning_regions, ax)
         draw_equilibrium_points(equilibrium_points, ax)
         plot_idx += 1
 
     if battery_capacity:
         ax = axes[plot_idx]
-        ax.plot(x_axis, battery_capacity, marker=MARKER_STYLE, markersize=MARKER_SIZE,
-               label="Battery Capacity (Ah)", color='orange')
+        plot_trace(ax, x_axis, store.series_values("battery_capacity"), label="Battery Capacity (Ah)", color='orange')
         ax.set_xlabel(x_label)
         ax.set_ylabel('Battery Capacity (Ah)')
         ax.set_title(f'Battery Capacity vs {x_label}')
@@ -166,7 +152,7 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
         ax.grid(True, alpha=0.3)
         
         draw_equilibrium_points(equilibrium_points, ax)
-        draw_warning_points(warning_points, ax)
+        draw_warning_regions(warning_regions, ax)
     
     plt.tight_layout(rect=[0, 0.05, 1, 1])  # Leave space at bottom for warnings
 
@@ -182,7 +168,7 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
             
             ax_single.plot(x, y, label=line.get_label())
             
-        draw_warning_points(warning_points, ax_single)
+        draw_warning_regions(warning_regions, ax_single)
         draw_equilibrium_points(equilibrium_points, ax_single)
         
         color_idx += 1
@@ -193,59 +179,207 @@ def generate_graph(results: list, x_axis: list, x_label: str = "",
 
         ax_single.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
         ax_single.grid(True, alpha=0.3)
-        save_file = save_path + "." + f"{ax.get_title()}.png"
-        fig_single.savefig(save_file, bbox_inches="tight")
+        if save_path:
+            save_file = save_path + "." + f"{ax.get_title()}.png"
+            fig_single.savefig(save_file, bbox_inches="tight")
         plt.close(fig_single)
     
     if save_path:
-        with open(save_path + "." + WARNING_FILE_NAME, 'w') as f:
-            """ to_delete = []
-            for i in range(1, len(warning_points)):
-                if warning_points[i-1]['x'] == warning_points[i]['x']:
-                    to_delete.insert(0, i)
-            for idx in to_delete:
-                warning_points.pop(idx) """
-                
-            json.dump(warning_points, f, indent=4)
-            print(f"\n({len(warning_points)})\tWarning points saved to {save_path}.{WARNING_FILE_NAME}")
-            
-        with open(save_path + "." + ERROR_FILE_NAME, 'w') as f:
-            errors = []
-            for result in results:
-                for err in result['error']['data']:
-                    if err not in errors:
-                        errors.append(err)
-            json.dump(errors, f, indent=4)
-            print(f"({len(errors)})\tErrors saved to {save_path}.{ERROR_FILE_NAME}")
-                
-            
         save_file = save_path + "." + IMG_FILE_NAME
-        plt.savefig(save_file, dpi=300, bbox_inches='tight')
+        plt.savefig(save_file, dpi=SAVE_DPI, bbox_inches='tight')
         print(f"Graph saved to {save_file}")
     
     if display_graph:
-        plt.show()     
-
-def draw_warning_points(warning_points: list, ax):
-    if warning_points:
-        # Group consecutive warning x-values into contiguous regions
-        x_values = sorted(set(wp['x'] for wp in warning_points))
-        if not x_values:
-            return
-        
-        regions = []
-        start = x_values[0]
-        end = x_values[0]
-        for x in x_values[1:]:
-            if x - end <= (x_values[-1] - x_values[0]) / max(len(x_values), 1) * 1.5:
-                end = x
-            else:
-                regions.append((start, end))
-                start = x
-                end = x
-        regions.append((start, end))
+        plt.show()
+    plt.close()
+
+def plot_trace(ax, x, y, **kwargs):
+    """Plot one trace downsampled to DOWNSAMPLE_POINTS, with markers only while it is sparse."""
+    indices = lttb_indices(x, y, DOWNSAMPLE_POINTS)
+    x, y = np.asarray(x)[indices], np.asarray(y)[indices]
+    marker = MARKER_STYLE if len(x) <= MARKER_MAX_POINTS else None
+    return ax.plot(x, y, marker=marker, markersize=MARKER_SIZE, **kwargs)
+
+def lttb_indices(x, y, threshold: int):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps to draw x, y with threshold points.
+
+    The first and last points are kept; every bucket in between keeps the point spanning the largest
+    triangle with the means of the buckets on either side, so peaks and limit transitions survive.
+    (Classic LTTB uses the previously kept point instead of the left mean, which needs a Python loop
+    over the buckets; with means all buckets are chosen at once.) NaN points are left out of the
+    buckets, but one is kept wherever kept points straddle them, so gaps (e.g. failed points) stay
+    gaps; while there are fewer gaps than threshold the points on either side of each are kept too.
+    Returns every index if there are no more than threshold.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    is_finite = np.isfinite(x) & np.isfinite(y)
+    finite = np.flatnonzero(is_finite)
+    if len(finite) <= threshold or threshold < 3:
+        return np.arange(len(x))
+
+    fx, fy = x[finite], y[finite]
+    starts = np.linspace(1, len(finite) - 1, threshold - 1).astype(int)[:-1]
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(finite) - 1)))
+    inner = slice(1, len(finite) - 1)
+    counts = np.bincount(bucket)
+    mean_x = np.bincount(bucket, fx[inner]) / counts
+    mean_y = np.bincount(bucket, fy[inner]) / counts
+    # Neighbour means, with the first and last points beyond the outer buckets
+    left_x, left_y = np.append(fx[0], mean_x[:-1])[bucket], np.append(fy[0], mean_y[:-1])[bucket]
+    right_x, right_y = np.append(mean_x[1:], fx[-1])[bucket], np.append(mean_y[1:], fy[-1])[bucket]
+
+    area = np.abs((left_x - right_x) * (fy[inner] - left_y) - (left_x - fx[inner]) * (right_y - left_y))
+    largest = area == np.maximum.reduceat(area, starts - 1)[bucket]
+    candidates = np.flatnonzero(largest)
+    _, first = np.unique(bucket[candidates], return_index=True)
+    kept = finite[np.concatenate([[0], candidates[first] + 1, [len(finite) - 1]])]
+
+    gaps = np.flatnonzero(~is_finite)
+    if len(gaps) == 0:
+        return kept
+    edges = np.flatnonzero(np.diff(is_finite.astype(int)))      # last index before every finite/NaN change
+    if len(edges) < threshold:
+        sides = np.concatenate([edges, edges + 1])
+        kept = np.union1d(kept, sides[is_finite[sides]])
+    # First NaN point after every kept point that is followed by a gap before the next kept point
+    after = np.searchsorted(gaps, kept[:-1])
+    straddled = (after < len(gaps)) & (gaps[np.minimum(after, len(gaps) - 1)] < kept[1:])
+    return np.union1d(kept, gaps[after[straddled]])
+
+def generate_map_graph(maps: dict, throttle_range, panel_power_range,
+                       save_path: str = None,
+                       show_plot: bool = False,
+                       constants=None):
+    """Contour of battery net current over throttle and panel power, with heat maps of the other map arrays.
+
+    The zero contour of battery current is the energy-neutral line: above it the battery drains, below it charges.
+    """
+    x = np.asarray(panel_power_range) * 100
+    y = np.asarray(throttle_range) * 100
+    battery_current = maps["battery_current"]
+    
+    fig, axes = plt.subplots(2, 2, figsize=(14, 11))
+    plt.subplots_adjust(hspace=0.3, wspace=0.3)
+    
+    draw_battery_current_contour(axes[0][0], x, y, battery_current, maps["warning"])
+    
+    heat_maps = [("bus_voltage", "DC Bus Voltage (V)", "viridis"),
+                 ("warning", "Warning Region", "Reds"),
+                 ("kirchhoff_residual", "Kirchhoff Residual (A)", "coolwarm")]
+    for ax, (key, title, cmap) in zip([axes[0][1], axes[1][0], axes[1][1]], heat_maps):
+        mesh = ax.pcolormesh(x, y, maps[key].astype(float), cmap=cmap, shading='auto')
+        fig.colorbar(mesh, ax=ax)
+        draw_energy_neutral_line(ax, x, y, battery_current)
+        ax.set_title(title)
+        ax.set_xlabel("Panel Power (%)")
+        ax.set_ylabel("Throttle Input (%)")
+    
+    if save_path:
+        save_file = save_path + "." + MAP_IMG_FILE_NAME
+        fig.savefig(save_file, dpi=300, bbox_inches='tight')
+        print(f"Graph saved to {save_file}")
         
-        for (r_start, r_end) in regions:
+        fig_single, ax_single = plt.subplots(figsize=(10, 8))
+        draw_battery_current_contour(ax_single, x, y, battery_current, maps["warning"])
+        save_file = save_path + "." + MAP_CONTOUR_FILE_NAME
+        fig_single.savefig(save_file, dpi=300, bbox_inches='tight')
+        plt.close(fig_single)
+        print(f"Graph saved to {save_file}")
+    
+    if show_plot:
+        plt.show()
+    plt.close(fig)
+
+def generate_ensemble_graph(summary: dict, save_path: str = None, show_plot: bool = False):
+    """Histograms of final SOC and of time-to-empty (members that ran flat) from an ensemble summary."""
+    fig, axes = plt.subplots(1, 2, figsize=(14, 5))
+    
+    histograms = [(axes[0], summary['final_soc'], "Final SOC", 'tab:green'),
+                  (axes[1], summary['time_to_empty_min'], "Time to Empty (minutes)", 'tab:red')]
+    for ax, distribution, label, color in histograms:
+        if distribution is not None:
+            edges = np.array(distribution['histogram']['edges'])
+            ax.bar(edges[:-1], distribution['histogram']['counts'], width=np.diff(edges), align='edge', color=color, alpha=0.7)
+        ax.set_xlabel(label)
+        ax.set_ylabel("Members")
+        ax.grid(True, alpha=0.3)
+    
+    axes[0].set_title(f"Final SOC ({summary['members']} members)")
+    probability_flat = summary['probability_flat'] or 0.0
+    axes[1].set_title(f"Time to Empty (P(flat) = {probability_flat*100:.1f}%)")
+    
+    if save_path:
+        save_file = save_path + "." + ENSEMBLE_IMG_FILE_NAME
+        fig.savefig(save_file, dpi=300, bbox_inches='tight')
+        print(f"Graph saved to {save_file}")
+    
+    if show_plot:
+        plt.show()
+    plt.close(fig)
+
+def generate_transient_graph(envelope: dict, limits: dict, save_path: str = None, show_plot: bool = False):
+    """Currents and bus voltage of a transient as min/max bands per time bucket (see waveform_envelope),
+    with the current limits as dotted lines."""
+    fig, axes = plt.subplots(2, 1, figsize=(FIGURE_WIDTH, PANEL_HEIGHT * 2), sharex=True)
+    plt.subplots_adjust(hspace=PANEL_HSPACE, bottom=0.1)
+    colors = plt.cm.tab10(np.linspace(0, 1, 10))
+
+    panels = [(axes[0], ["battery_current", "mppt_current", "load_current"], "Current (A)"),
+              (axes[1], ["bus_voltage"], "Voltage (V)")]
+    for ax, signals, label in panels:
+        for color_idx, signal in enumerate(signals):
+            low, high = envelope[signal]
+            ax.fill_between(envelope["time"], low, high, color=colors[color_idx % 10], alpha=0.6, linewidth=0.5,
+                            label=signal)
+        ax.set_ylabel(label)
+        ax.grid(True, alpha=0.3)
+    for color_idx, (name, limit) in enumerate(limits.items()):
+        axes[0].axhline(limit["limit_a"], color=colors[(color_idx + 3) % 10], linestyle=DOTTED_STYLE,
+                        label=f"{name} limit")
+    axes[0].set_title("current_vs_time")
+    axes[1].set_title("voltage_vs_time")
+    axes[1].set_xlabel("Time (s)")
+    for ax in axes:
+        ax.legend(bbox_to_anchor=(1.05, 1), loc='upper left')
+
+    if save_path:
+        save_file = save_path + "." + TRANSIENT_IMG_FILE_NAME
+        fig.savefig(save_file, dpi=SAVE_DPI, bbox_inches='tight')
+        print(f"Graph saved to {save_file}")
+
+    if show_plot:
+        plt.show()
+    plt.close(fig)
+
+def draw_battery_current_contour(ax, x, y, battery_current, warning):
+    contour = ax.contourf(x, y, battery_current, levels=MAP_CONTOUR_LEVELS, cmap='RdYlGn')
+    ax.figure.colorbar(contour, ax=ax, label="Battery Net Current (A)")
+    if np.any(warning):
+        ax.contourf(x, y, warning.astype(float), levels=[0.5, 1.5], colors='none', hatches=['//'])
+    draw_energy_neutral_line(ax, x, y, battery_current)
+    ax.set_title("Battery Net Current")
+    ax.set_xlabel("Panel Power (%)")
+    ax.set_ylabel("Throttle Input (%)")
+
+def draw_energy_neutral_line(ax, x, y, battery_current):
+    finite = battery_current[np.isfinite(battery_current)]
+    if finite.size and finite.min() < 0 < finite.max():
+        lines = ax.contour(x, y, battery_current, levels=[0.0], colors='black', linewidths=2)
+        ax.clabel(lines, fmt="energy neutral")
+
+def group_warning_regions(x_values):
+    """Contiguous (start, end) x ranges of the warning points, joining points closer than 1.5 average spacings."""
+    x_values = np.unique(np.asarray(x_values, dtype=float))
+    if len(x_values) == 0:
+        return []
+    spacing = (x_values[-1] - x_values[0]) / len(x_values) * 1.5
+    breaks = np.flatnonzero(np.diff(x_values) > spacing)
+    return list(zip(x_values[np.append(0, breaks + 1)], x_values[np.append(breaks, len(x_values) - 1)]))
+
+def draw_warning_regions(warning_regions: list, ax):
+    if warning_regions:
+        for (r_start, r_end) in warning_regions:
             ax.axvspan(r_start, r_end, color='red', alpha=0.15, zorder=0)
         
         ax.relim()
@@ -257,79 +391,46 @@ def draw_equilibrium_points(equilibrium_points: list, ax):
         ax.relim()
         ax.autoscale_view()
         
-def extract_traces(results: list, category: str, data_type: str) -> Dict[str, List[float]]:
+def extract_traces(store: Result_Store, category: str, data_type: str) -> Dict[str, np.ndarray]:
     """
-    Extract voltage or current traces from results.
+    Extract voltage or current traces from the result store.
     
-    Returns a dictionary where keys are trace names and values are lists of measurements.
+    Returns a dictionary where keys are trace names and values are arrays of measurements.
     """
     traces = {}
     
-    for result in results:
-        if category not in result:
+    for key in store.keys(category, data_type):
+        _, array_index, _, name = key
+        if __negative_terminal(category, name):
             continue
-        
-        category_data = result[category]
-        # Handle different data structures
-        if 'data' in category_data:
-            for array_item in category_data['data']:
-                if data_type not in array_item:
-                    continue
-                
-                for key, value in array_item[data_type].items():
-                    # Skip metadata keys
-                    if key in ['array_index']:
-                        continue
-                    
-                    # Create trace name
-                    trace_name = key
-                    if 'array_index' in array_item:
-                        trace_name = f"Arr{array_item['array_index']}_{key}"
-                    
-                    # Initialize trace if needed
-                    if trace_name not in traces:
-                        traces[trace_name] = []
-                        
-                    # Append value
-                    traces[trace_name].append(value)
+        traces[f"Arr{array_index}_{name}"] = store.column(*key)
     return traces
 
 
-def extract_power_traces(results: list, category: str) -> Dict[str, List[float]]:
+def extract_power_traces(store: Result_Store, category: str) -> Dict[str, np.ndarray]:
     """
-    Extract power traces (P = V * I) from results.
+    Extract power traces (P = V * I) from the result store.
     """
     power_traces = {}
     
-    for result in results:
-        if category not in result:
+    for _, array_index, _, v_key in store.keys(category, 'voltage'):
+        if __negative_terminal(category, v_key):
             continue
-        
-        category_data = result[category]
-        
-        if 'data' in category_data:
-            for array_item in category_data['data']:
-                voltages = array_item.get('voltage', {})
-                currents = array_item.get('current', {})
-                #{'array_index': 1, 'voltage': {'load_load_torqeedo_cruise_6.0_positive': 40.94714341880578}, 'current': {'load_load_torqeedo_cruise_6.0_current': 44.619053880758926}}
-                # Match voltage and current keys to compute power
-                for v_key, v_value in voltages.items():
-                    # Try to find matching current key
-                    c_key = v_key.rstrip('_positive').rstrip('_negative')
-
-                    if c_key in currents or c_key + "_current" in currents:
-                        if "_current" in c_key:
-                            c_key = c_key.replace("_current", "")
-                            
-                        trace_name = v_key
-                        if 'array_index' in array_item:
-                            trace_name = f"Arr{array_item['array_index']}_{v_key}"
-                        
-                        if trace_name not in power_traces:
-                            power_traces[trace_name] = []
-                        
-                        power = v_value * currents[c_key]
-                        power_traces[trace_name].append(power)
-                        
+        currents = [key[3] for key in store.keys(category, 'current')
+                    if key[1] == array_index and not __negative_terminal(category, key[3])]
+        #{'array_index': 1, 'voltage': {'load_load_torqeedo_cruise_6.0_positive': 40.94714341880578}, 'current': {'load_load_torqeedo_cruise_6.0_current': 44.619053880758926}}
+        # Match voltage and current keys to compute power
+        c_key = v_key.rstrip('_positive').rstrip('_negative')
+
+        if c_key in currents or c_key + "_current" in currents:
+            if "_current" in c_key:
+                c_key = c_key.replace("_current", "")
+            
+            power_traces[f"Arr{array_index}_{v_key}"] = (store.column(category, array_index, 'voltage', v_key) *
+                                                         store.column(category, array_index, 'current', c_key))
     
-    return power_traces
\ No newline at end of file
+    return power_traces
+
+def __negative_terminal(category: str, key: str):
+    # Battery negative terminals are left out of the plots
+    return category == 'battery_result' and '_negative' in key
@@ -0,0 +1,266 @@
+import json
+import os
+import time
+from copy import deepcopy
+
+import numpy as np
+
+from .circuit_constructor import evaluate_components, get_alterations
+from .dc_bus_solver import solve_dc_bus
+from .netlist_template import CONVERGENCE_RETRIES, netlist_template, run_deck
+
+TRANSIENT_FILE_NAME = "transient_results.json"
+WAVEFORM_FILE_NAME = "transient_waveforms.npy"
+# Columns of the waveform file
+TRANSIENT_SIGNALS = ["time", "battery_current", "mppt_current", "load_current", "bus_voltage"]
+TRANSIENT_CHUNK_SAMPLES = 1 << 16   # samples solved (one NgSpice .tran window), written and summarised at a time
+RAMP_KNOTS = 8                      # waveform knots along every throttle or solar power ramp
+INRUSH_KNOTS = 16                   # waveform knots along every inrush decay
+INRUSH_DECAY_SPAN = 5               # inrush decays are followed for this many time constants
+LIMIT_TOLERANCE = 1e-3              # currents within this fraction of a limit count as at the limit
+ENVELOPE_POINTS = 3000              # min/max buckets kept per signal for plotting
+
+
+def start_transient(circuit_setup: json, transient_config_loc: str, save_path: str, ngspice_available: bool,
+                    constants=None, solver="spice", plot=True, show_plot=False):
+    """Transient of a throttle / solar power scenario, with motor inrush on every throttle rise.
+
+    The waveforms go straight to a memory-mapped .npy file (TRANSIENT_SIGNALS columns, one row per
+    time_step_s) and the statistics are read back from it in chunks, so only TRANSIENT_CHUNK_SAMPLES
+    rows are held in memory. The SOC stays at battery_soc for the whole (seconds long) scenario.
+    """
+    if solver == "spice" and not ngspice_available:
+        raise RuntimeError("NgSpice is not available. Use --solver closed_form for transient simulations without it.")
+    with open(transient_config_loc, 'r') as f:
+        data = json.load(f)
+
+    start = time.perf_counter()
+    snapshot = deepcopy(circuit_setup)
+    step = data['time_step_s']
+    samples = int(round(data['duration_s'] / step)) + 1
+    soc = data.get('battery_soc', snapshot['battery'].get('current_soc', 1.0))
+    knots = transient_waveforms(data)
+
+    waveform_file = save_path + "." + WAVEFORM_FILE_NAME
+    waveforms = np.lib.format.open_memmap(waveform_file, mode="w+", dtype=np.float64,
+                                          shape=(samples, len(TRANSIENT_SIGNALS)))
+    chunks = (__spice_chunks(snapshot, knots, soc, step, samples, constants) if solver == "spice" else
+              __closed_form_chunks(snapshot, knots, soc, step, samples, constants))
+    for first, columns in chunks:
+        waveforms[first:first + len(columns)] = columns
+    waveforms.flush()
+    del waveforms
+
+    waveforms = np.load(waveform_file, mmap_mode="r")
+    results = {
+        "transient_info": data.get("transient_info", {}),
+        "solver": solver,
+        "samples": samples,
+        "time_step_s": step,
+        "battery_soc": soc,
+        "signals": TRANSIENT_SIGNALS,
+        "waveform_file": os.path.basename(waveform_file),
+    }
+    results.update(transient_statistics(waveforms, transient_limits(snapshot, data, soc, constants), step))
+    results["elapsed_s"] = time.perf_counter() - start
+    __print_results(results, constants)
+
+    save_file = save_path + "." + TRANSIENT_FILE_NAME
+    with open(save_file, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Transient results saved to {save_file}")
+    print(f"Transient waveforms saved to {waveform_file}")
+
+    if plot:
+        from .sweep_graph_generation import generate_transient_graph
+        generate_transient_graph(waveform_envelope(waveforms), results["limits"], save_path=save_path,
+                                 show_plot=show_plot)
+    return results
+
+def transient_waveforms(data: json):
+    """Knot times of the scenario with the throttle (including inrush) and panel power setting at each knot.
+
+    Settings start at throttle and solar_power and every event ramps them to its values over ramp_s
+    (at least one time step). A throttle rise of d overshoots the motor demand by
+    d * (factor - 1), growing over the ramp and decaying with time_constant_s after it. Settings
+    are linear between knots, for the closed-form solver as for the NgSpice PWL sources.
+    """
+    step = data['time_step_s']
+    duration = data['duration_s']
+    events = sorted(data.get('events', []), key=lambda event: event['time_s'])
+    inrush = data.get('inrush', {"factor": 1.0, "time_constant_s": step})
+
+    settings = {}
+    rises = []
+    for key in ('throttle', 'solar_power'):
+        times, values = [0.0], [float(data.get(key, 0.0 if key == 'throttle' else 1.0))]
+        for event in events:
+            if key not in event:
+                continue
+            begin = max(event['time_s'], times[-1])
+            end = begin + max(event.get('ramp_s', 0.0), step)
+            ramp_times = np.linspace(begin, end, RAMP_KNOTS)
+            ramp_values = np.linspace(values[-1], event[key], RAMP_KNOTS)
+            if key == 'throttle' and event[key] > values[-1]:
+                rises.append((begin, end, event[key] - values[-1]))
+            keep = ramp_times > times[-1]
+            times += list(ramp_times[keep])
+            values += list(ramp_values[keep])
+        settings[key] = (np.array(times), np.array(values))
+
+    knot_times = [np.array([0.0, duration])] + [settings[key][0] for key in settings]
+    for _, end, _ in rises:
+        knot_times.append(end + inrush['time_constant_s'] * np.linspace(0, INRUSH_DECAY_SPAN, INRUSH_KNOTS))
+    knot_times = np.unique(np.concatenate(knot_times))
+    knot_times = knot_times[knot_times <= duration]
+
+    throttle = np.interp(knot_times, *settings['throttle'])
+    for begin, end, rise in rises:
+        overshoot = np.where(knot_times < end, (knot_times - begin) / (end - begin),
+                             np.exp(-(knot_times - end) / inrush['time_constant_s']))
+        throttle = throttle + rise * (inrush['factor'] - 1) * np.where(knot_times < begin, 0.0, overshoot)
+    return {"time": knot_times,
+            "throttle_setting": throttle,
+            "panel_power_setting": np.interp(knot_times, *settings['solar_power'])}
+
+def transient_limits(circuit_setup: json, data: json, soc: float, constants=None):
+    """Limit checks as name -> (signal, direction, limit in A): battery discharge and charge limits,
+    combined MPPT output limit and, with fuse_rating_a, the load (motor feed) fuse."""
+    component_object, _ = evaluate_components(circuit_setup, {'current_soc': soc}, constants=constants)
+    battery_array = component_object["battery_array"]
+    limits = {
+        "battery_discharge": ("battery_current", -1, battery_array.get_discharge_limit()),
+        "battery_charge": ("battery_current", 1, battery_array.get_charge_limit()),
+        "mppt_output": ("mppt_current", 1, sum(mppt.get_output_limit() for mppt in component_object.get("mppt", []))),
+    }
+    if data.get('fuse_rating_a') is not None:
+        limits["fuse"] = ("load_current", 1, data['fuse_rating_a'])
+    return limits
+
+def transient_statistics(waveforms, limits: dict, step: float):
+    """Minimum and maximum (with their time) of every signal and the time spent at or over every limit,
+    reading waveforms TRANSIENT_CHUNK_SAMPLES rows at a time."""
+    extremes = {signal: {"min": {"value": np.inf, "time_s": None}, "max": {"value": -np.inf, "time_s": None}}
+                for signal in TRANSIENT_SIGNALS[1:]}
+    over = {name: 0 for name in limits}
+    for first in range(0, len(waveforms), TRANSIENT_CHUNK_SAMPLES):
+        chunk = np.asarray(waveforms[first:first + TRANSIENT_CHUNK_SAMPLES])
+        for column, signal in enumerate(TRANSIENT_SIGNALS[1:], start=1):
+            for kind, index in (("min", np.argmin(chunk[:, column])), ("max", np.argmax(chunk[:, column]))):
+                value = float(chunk[index, column])
+                if (value < extremes[signal][kind]["value"]) if kind == "min" else (value > extremes[signal][kind]["value"]):
+                    extremes[signal][kind] = {"value": value, "time_s": float(chunk[index, 0])}
+        for name, (signal, direction, limit) in limits.items():
+            values = direction * chunk[:, TRANSIENT_SIGNALS.index(signal)]
+            over[name] += int(np.count_nonzero(values >= limit * (1 - LIMIT_TOLERANCE)))
+
+    return {
+        "extremes": extremes,
+        "limits": {name: {"signal": signal, "limit_a": direction * limit, "time_over_s": over[name] * step}
+                   for name, (signal, direction, limit) in limits.items()},
+    }
+
+def waveform_envelope(waveforms, points=ENVELOPE_POINTS):
+    """Bucket times with the minimum and maximum of every signal per bucket (peaks survive), read in chunks."""
+    bucket_size = max(1, -(-len(waveforms) // points))
+    chunk_size = bucket_size * max(1, TRANSIENT_CHUNK_SAMPLES // bucket_size)
+    times, lows, highs = [], [], []
+    for first in range(0, len(waveforms), chunk_size):
+        chunk = np.asarray(waveforms[first:first + chunk_size])
+        starts = np.arange(0, len(chunk), bucket_size)
+        times.append(chunk[starts, 0])
+        lows.append(np.minimum.reduceat(chunk[:, 1:], starts))
+        highs.append(np.maximum.reduceat(chunk[:, 1:], starts))
+    lows, highs = np.concatenate(lows), np.concatenate(highs)
+    return {"time": np.concatenate(times),
+            **{signal: (lows[:, column], highs[:, column]) for column, signal in enumerate(TRANSIENT_SIGNALS[1:])}}
+
+def __closed_form_chunks(circuit_setup, knots, soc, step, samples, constants):
+    """(first row, rows) of the waveforms, TRANSIENT_CHUNK_SAMPLES at a time, each chunk solved at once."""
+    loads = __load_probes(circuit_setup, constants)
+    for first in range(0, samples, TRANSIENT_CHUNK_SAMPLES):
+        times = np.arange(first, min(first + TRANSIENT_CHUNK_SAMPLES, samples)) * step
+        modifications = {key: np.interp(times, knots['time'], knots[key])
+                         for key in ('throttle_setting', 'panel_power_setting')}
+        nodes, branches = solve_dc_bus(circuit_setup, dict(modifications, current_soc=soc), constants=constants)
+        yield first, __columns(times, lambda name, branch: (branches if branch else nodes)[name], loads)
+
+def __spice_chunks(circuit_setup, knots, soc, step, samples, constants):
+    """(first row, rows) of the waveforms from one NgSpice .tran window per TRANSIENT_CHUNK_SAMPLES rows.
+
+    The circuit holds no charge, so windows are independent: every window is a fresh deck with the
+    PWL sources cut to its span, and NgSpice keeps no more than one window in memory.
+    """
+    template = netlist_template(circuit_setup, constants=constants)
+    ngspice = template.ngspice_shared
+    if ngspice is None:
+        from PySpice.Spice.NgSpice.Shared import NgSpiceShared # type: ignore
+        ngspice = template.ngspice_shared = NgSpiceShared.new_instance()
+
+    # Device values at every knot; they are linear between knots like the settings
+    values = {}
+    for index in range(len(knots['time'])):
+        component_object, _ = evaluate_components(circuit_setup, {
+            'throttle_setting': float(knots['throttle_setting'][index]),
+            'panel_power_setting': float(knots['panel_power_setting'][index]),
+            'current_soc': soc}, constants=constants)
+        for device, (_, value) in get_alterations(component_object).items():
+            values.setdefault(device.lower(), []).append(value)
+    loads = __load_probes(circuit_setup, constants)
+    saved = ["total_dc_bus_voltage", "vtotal_battery_input_current#branch",
+             "vtotal_mppt_output_current#branch"] + [f"{load}#branch" for load in loads]
+
+    for first in range(0, samples, TRANSIENT_CHUNK_SAMPLES):
+        last = min(first + TRANSIENT_CHUNK_SAMPLES, samples) - 1
+        times = np.arange(first, last + 1) * step
+        begin, end = times[0], max(times[-1], times[0] + step)
+        inside = knots['time'][(knots['time'] > begin) & (knots['time'] < end)]
+        window = np.concatenate([[begin], inside, [end]])
+        window_values = {device: np.interp(window, knots['time'], series) for device, series in values.items()}
+        analysis = f".tran {float(step)!r} {float(end - begin)!r} 0 {float(step)!r}\n.save {' '.join(saved)}"
+
+        plot = None
+        for options in [""] + list(CONVERGENCE_RETRIES.values()):
+            plot = run_deck(ngspice, template.render_waveforms(window - begin, window_values, options + "\n" + analysis),
+                            to_analysis=False)
+            if plot is not None:
+                break
+        if plot is None:
+            raise NameError(f"Transient simulation failed between {begin:.6g} s and {end:.6g} s")
+
+        plot_time = __vector(plot, "time", False) + begin
+        yield first, __columns(times, lambda name, branch: np.interp(times, plot_time, __vector(plot, name, branch)), loads)
+    ngspice.destroy()
+
+def __load_probes(circuit_setup, constants):
+    # Current probe of every load, as named in Load_Array
+    component_object, _ = evaluate_components(circuit_setup, {}, constants=constants)
+    return [f"v{load.name()}".lower() for load in component_object["load"]]
+
+def __columns(times, vector, loads):
+    """Waveform rows in TRANSIENT_SIGNALS order; vector(name, branch) returns a node voltage or branch current."""
+    return np.column_stack([
+        times,
+        vector("vtotal_battery_input_current", True),
+        vector("vtotal_mppt_output_current", True),
+        sum((vector(load, True) for load in loads), np.zeros(len(times))),
+        vector("total_dc_bus_voltage", False),
+    ])
+
+def __vector(plot, name, branch):
+    """Values of one NgSpice vector, whichever way it is named in the plot."""
+    for key in ([f"{name}#branch", f"i({name})"] if branch else [name, f"v({name})"]):
+        if key in plot:
+            return np.asarray(plot[key].to_waveform(to_real=True), dtype=float)
+    raise KeyError(f"NgSpice vector {name} missing from transient plot {plot.plot_name}")
+
+def __print_results(results, constants):
+    print(f"{constants['BARF']}Transient: {results['transient_info'].get('name', '')}{constants['BARE']}")
+    print(f"\t{results['samples']} samples at {results['time_step_s']} s ({results['solver']})")
+    for signal, extremes in results["extremes"].items():
+        unit = "V" if signal.endswith("voltage") else "A"
+        print(f"\t{signal}: min {extremes['min']['value']:.2f} {unit} at {extremes['min']['time_s']:.4f} s, "
+              f"max {extremes['max']['value']:.2f} {unit} at {extremes['max']['time_s']:.4f} s")
+    for name, limit in results["limits"].items():
+        print(f"\tTime at or over {name} limit ({limit['limit_a']:.1f} A): {limit['time_over_s']:.4f} s")
+    print(f"\tSolved in {results['elapsed_s']:.2f} s")
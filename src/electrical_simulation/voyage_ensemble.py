@@ -0,0 +1,242 @@
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from .dc_bus_solver import solve_dc_bus
+from .irradiance import irradiance_source
+from .simulation_over_time import SIMULATION_INTERVAL_MIN, simulate_step
+
+ENSEMBLE_MEMBERS = 1000
+ENSEMBLE_BATCH_SIZE = 250
+ENSEMBLE_HISTOGRAM_BINS = 50
+ENSEMBLE_FILE_NAME = "ensemble_results.json"
+
+# numpy Generator methods a sampled quantity may use, with their keyword parameters
+DISTRIBUTIONS = ["normal", "uniform", "triangular", "beta", "lognormal"]
+
+
+class Ensemble_Statistics:
+    """Running statistics of final SOC and time-to-empty, updated one batch at a time.
+
+    Only counts, moments and fixed-bin histograms are kept, so memory does not grow with the
+    number of members. Percentiles are read off the histograms.
+    """
+    def __init__(self, duration_min: float, bins=ENSEMBLE_HISTOGRAM_BINS):
+        self.duration_min = duration_min
+        self.members = 0
+        self.failed = 0
+        self.flat = 0
+        self.soc_edges = np.linspace(0.0, 1.0, bins + 1)
+        self.soc_counts = np.zeros(bins, dtype=int)
+        self.empty_edges = np.linspace(0.0, duration_min, bins + 1)
+        self.empty_counts = np.zeros(bins, dtype=int)
+        self.soc_moments = [0, 0.0, 0.0, np.inf, -np.inf]
+        self.empty_moments = [0, 0.0, 0.0, np.inf, -np.inf]
+
+    def add(self, final_soc, time_to_empty):
+        """Fold in one batch; time_to_empty is NaN for members that never ran flat, final_soc NaN for failed runs."""
+        failed = np.isnan(final_soc)
+        final_soc = final_soc[~failed]
+        time_to_empty = time_to_empty[~failed]
+        flat = time_to_empty[~np.isnan(time_to_empty)]
+
+        self.members += len(failed)
+        self.failed += int(failed.sum())
+        self.flat += len(flat)
+        self.soc_counts += np.histogram(final_soc, self.soc_edges)[0]
+        self.empty_counts += np.histogram(flat, self.empty_edges)[0]
+        self.__combine(self.soc_moments, final_soc)
+        self.__combine(self.empty_moments, flat)
+
+    def summary(self):
+        completed = self.members - self.failed
+        return {
+            "members": self.members,
+            "failed": self.failed,
+            "probability_flat": self.flat / completed if completed > 0 else None,
+            "final_soc": self.__distribution(self.soc_moments, self.soc_edges, self.soc_counts),
+            "time_to_empty_min": self.__distribution(self.empty_moments, self.empty_edges, self.empty_counts),
+        }
+
+    def __combine(self, moments, values):
+        # Chan et al. update of (count, mean, sum of squared deviations), plus min and max
+        count = len(values)
+        if count == 0:
+            return
+        moments[3] = min(moments[3], float(np.min(values)))
+        moments[4] = max(moments[4], float(np.max(values)))
+        mean = float(np.mean(values))
+        m2 = float(np.sum((values - mean) ** 2))
+        total = moments[0] + count
+        delta = mean - moments[1]
+        moments[2] += m2 + delta ** 2 * moments[0] * count / total
+        moments[1] += delta * count / total
+        moments[0] = total
+
+    def __distribution(self, moments, edges, counts):
+        count, mean, m2, minimum, maximum = moments
+        if count == 0:
+            return None
+        return {
+            "count": count,
+            "mean": mean,
+            "std": (m2 / (count - 1)) ** 0.5 if count > 1 else 0.0,
+            "min": minimum,
+            "max": maximum,
+            "p5": self.__percentile(edges, counts, 5, minimum, maximum),
+            "p50": self.__percentile(edges, counts, 50, minimum, maximum),
+            "p95": self.__percentile(edges, counts, 95, minimum, maximum),
+            "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+        }
+
+    def __percentile(self, edges, counts, percentile, minimum, maximum):
+        # Interpolated within the histogram bin, so only as fine as the bins
+        cumulative = np.concatenate([[0], np.cumsum(counts)]) / counts.sum()
+        return float(np.clip(np.interp(percentile / 100, cumulative, edges), minimum, maximum))
+
+
+def start_voyage_ensemble(circuit_setup: json, voyage_config_loc: str, save_path: str, ngspice_available: bool,
+                          constants=None, solver="spice", workers=1, show_plot=False, save_output=True,
+                          plot=True):
+    """Run the voyage for every member of the ensemble described in the voyage JSON and report
+    the distributions of final SOC and time-to-empty and the probability of running flat.
+
+    The optional "ensemble" block holds "members", "seed", "batch_size" and the sampled quantities:
+    "initial_battery_soc" (absolute SOC), "solar_power" (factor on each segment's solar_power) and
+    "throttle" (offset on each segment's throttle). Each is a number or a numpy distribution such as
+    {"distribution": "normal", "loc": 1.0, "scale": 0.2}, drawn per member and, for the segment
+    quantities, per segment. With an "irradiance" source the solar_power factor applies to the
+    streamed irradiance instead. Members within a batch are stepped together like step_voyage_fixed;
+    with the closed_form solver every step is one batched solve.
+    """
+    with open(voyage_config_loc, 'r') as f:
+        data = json.load(f)
+
+    segments = data['segments']
+    ensemble = data.get('ensemble', {})
+    members = ensemble.get('members', ENSEMBLE_MEMBERS)
+    batch_size = ensemble.get('batch_size', ENSEMBLE_BATCH_SIZE)
+    seed = ensemble.get('seed', 0)
+    sampling = {'initial_battery_soc': ensemble.get('initial_battery_soc', data['initial_battery_soc']),
+                'solar_power': ensemble.get('solar_power', 1.0),
+                'throttle': ensemble.get('throttle', 0.0)}
+    for spec in sampling.values():
+        __check_distribution(spec)
+
+    statistics = Ensemble_Statistics(sum(segment['duration_minutes'] for segment in segments))
+    batches = [(index, min(batch_size, members - start)) for index, start in enumerate(range(0, members, batch_size))]
+    irradiance = (data.get('irradiance'), os.path.dirname(voyage_config_loc))
+    arguments = [(circuit_setup, segments, irradiance, sampling, seed, index, count, ngspice_available, solver, constants)
+                 for index, count in batches]
+
+    if workers <= 1 or len(batches) <= 1:
+        for argument in arguments:
+            statistics.add(*run_ensemble_batch(argument))
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            for final_soc, time_to_empty in executor.map(run_ensemble_batch, arguments):
+                statistics.add(final_soc, time_to_empty)
+
+    summary = dict(voyage=data['voyage_info'].get('name'), **statistics.summary())
+    __print_summary(summary, constants)
+
+    if save_output:
+        save_file = save_path + "." + ENSEMBLE_FILE_NAME
+        with open(save_file, 'w') as f:
+            json.dump(summary, f, indent=4)
+        print(f"Ensemble results saved to {save_file}")
+
+    if plot:
+        from .sweep_graph_generation import generate_ensemble_graph
+        generate_ensemble_graph(summary, save_path=save_path if save_output else None, show_plot=show_plot)
+    return summary
+
+def run_ensemble_batch(arguments):
+    """Sample and run one batch of members, returning (final SOC, time-to-empty) arrays."""
+    circuit_setup, segments, irradiance, sampling, seed, batch_index, count, ngspice_available, solver, constants = arguments
+    rng = np.random.default_rng([seed, batch_index])
+    # Every batch streams its own copy of the irradiance series
+    irradiance = irradiance_source(*irradiance)
+
+    soc = np.clip(__sample(rng, sampling['initial_battery_soc'], (count,)), 0.0, 1.0)
+    solar_factor = __sample(rng, sampling['solar_power'], (count, len(segments)))
+    throttle = np.clip(np.array([segment['throttle'] for segment in segments]) +
+                       __sample(rng, sampling['throttle'], (count, len(segments))), 0.0, 1.0)
+
+    battery_info = circuit_setup['battery']
+    battery_capacity_Amin = battery_info['capacity_ah'] * battery_info['battery_in_parallel'] * 60
+    capacity_Amin = soc * battery_capacity_Amin
+    time_to_empty = np.full(count, np.nan)
+    time_min = 0.0
+
+    for segment_idx, segment in enumerate(segments):
+        duration_minutes = segment['duration_minutes']
+        elapsed = 0
+        while elapsed < duration_minutes:
+            step = min(SIMULATION_INTERVAL_MIN, duration_minutes - elapsed)
+            if irradiance is not None:
+                solar_power = irradiance.at(time_min)
+                step = irradiance.run_length(time_min, step)
+            else:
+                solar_power = segment['solar_power']
+            current = __battery_current(circuit_setup, capacity_Amin / battery_capacity_Amin, throttle[:, segment_idx],
+                                        np.clip(solar_power * solar_factor[:, segment_idx], 0.0, 1.0),
+                                        ngspice_available, solver, constants)
+            next_capacity_Amin = capacity_Amin + current * step
+
+            # A battery reaching full or empty is held there, as in step_voyage_fixed
+            emptied = np.isnan(time_to_empty) & (next_capacity_Amin < 0) & (capacity_Amin > constants["EPSILON"])
+            time_to_empty[emptied] = time_min + capacity_Amin[emptied] / -current[emptied]
+            capacity_Amin = np.clip(next_capacity_Amin, 0.0, battery_capacity_Amin)
+
+            time_min += step
+            elapsed += step
+
+    # Members starting empty count as flat from the start
+    time_to_empty[np.isnan(time_to_empty) & (soc * battery_capacity_Amin <= constants["EPSILON"])] = 0.0
+    return capacity_Amin / battery_capacity_Amin, time_to_empty
+
+def __battery_current(circuit_setup, soc, throttle, solar_power, ngspice_available, solver, constants):
+    if solver == "closed_form":
+        _, branches = solve_dc_bus(circuit_setup, {'current_soc': soc, 'throttle_setting': throttle,
+                                                   'panel_power_setting': solar_power}, constants=constants)
+        return np.array(branches["vtotal_battery_input_current"], dtype=float)
+
+    # Modifications are written into circuit_setup, so the configured limits are passed every time
+    battery_limits = {'max_charge_current': circuit_setup['battery']['max_charge_current'],
+                      'max_discharge_current': circuit_setup['battery']['max_discharge_current']}
+    current = np.full(len(soc), np.nan)
+    for member in range(len(soc)):
+        if np.isnan(soc[member]):
+            continue
+        modifications = dict(battery_limits, current_soc=float(soc[member]), throttle_setting=float(throttle[member]),
+                             panel_power_setting=float(solar_power[member]))
+        analysis, result = simulate_step(circuit_setup, modifications, ngspice_available, solver, constants)
+        if analysis is not None:
+            current[member] = result["summary"]["data"][0]["current"]["total_battery_input_current"]
+    return current
+
+def __sample(rng, spec, shape):
+    if type(spec) != dict:
+        return np.full(shape, float(spec))
+    parameters = {key: value for key, value in spec.items() if key != "distribution"}
+    return getattr(rng, spec["distribution"])(size=shape, **parameters)
+
+def __check_distribution(spec):
+    if type(spec) == dict and spec.get("distribution") not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown ensemble distribution {spec.get('distribution')}, expected one of {DISTRIBUTIONS}")
+
+def __print_summary(summary, constants):
+    print(f"{constants['BARF']}Voyage Ensemble: {summary['voyage']}{constants['BARE']}")
+    print(f"\t{summary['members']} members, {summary['failed']} failed")
+    if summary['probability_flat'] is not None:
+        print(f"\tProbability of running flat: {summary['probability_flat']*100:.1f}%")
+    final_soc = summary['final_soc']
+    if final_soc is not None:
+        print(f"\tFinal SOC: mean {final_soc['mean']:.3f}, p5 {final_soc['p5']:.3f}, p50 {final_soc['p50']:.3f}, p95 {final_soc['p95']:.3f}")
+    time_to_empty = summary['time_to_empty_min']
+    if time_to_empty is not None:
+        print(f"\tTime to empty (min): mean {time_to_empty['mean']:.1f}, p5 {time_to_empty['p5']:.1f}, p50 {time_to_empty['p50']:.1f}")